@@ -5,16 +5,16 @@
 import superglobal
 import os
 from datetime import datetime
-from smbus2 import SMBus
 import time
 import logging
 from logging.handlers import RotatingFileHandler
 from Oled.lib_oled96 import ssd1306
 from PIL import Image
-from sensors.sensor_utilities import get_smbus
+from sensors.i2c_bus import get_bus
 
 from read_settings import get_defaults, get_settings
 from utilities import scriptsFolder, get_default_gateway_linux, get_interface_upstatus_linux, get_pi_model, get_rpiscripts_version, check_undervoltage, get_ip_address, check_internet_connection, get_cpu_temp, get_ntp_status, sync_time_ntp, get_interfacelist, offlinedata_prepare
+from readings_store import channel_readings
 #from Oled.diag_onOLED import diag_onOLED
 
 logger = logging.getLogger('HoneyPi.OLed')
@@ -25,7 +25,7 @@ superglobal = superglobal.SuperGlobal()
 def oled_init():
     global i2cbus, oled, draw
     try:
-        i2cbus = SMBus(get_smbus())  # 0 = Raspberry Pi 1, 1 = Raspberry Pi > 1
+        i2cbus = get_bus()  # 0 = Raspberry Pi 1, 1 = Raspberry Pi > 1
         oled = ssd1306(i2cbus)
         draw = oled.canvas
         oled.onoff(1)
@@ -356,7 +356,10 @@ def main():
         oled_interface_data()
         oled_measurement_data()
         time.sleep(4)
-        oled_view_channels(offlinedata_prepare(ts_channels))
+        channeldata = channel_readings(ts_channels)
+        if channeldata is None:
+            channeldata = offlinedata_prepare(ts_channels)
+        oled_view_channels(channeldata)
         #time.sleep()
         oled_off()
     except Exception as ex:
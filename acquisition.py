@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Bus aware acquisition engine.
+# Every sensor read is a task which belongs to a physical resource (I2C bus, 1-wire master,
+# GPIO pins of a bit-banged sensor). Each resource gets its own thread, so different resources
+# are read at the same time while the tasks of one resource are run one after another.
+# Tasks can depend on the ts_fields of other tasks (e.g. HX711 temperature compensation),
+# which makes a measurement cycle a small DAG.
+# Exclusive tasks (timing critical bit-banging like HX711) run while no other task is running,
+# because a thread switch of the GIL while the clock pin is high can power down the chip.
+# Every task has a time budget. A task which exceeds it is cancelled: its thread is left behind,
+# the following tasks on the same resource are skipped and the cycle returns the fields of all
+# other tasks together with a status naming the missing sensors.
+
+import threading
+import time
+import logging
+
+logger = logging.getLogger('HoneyPi.acquisition')
+
+_local = threading.local() # task of the current acquisition thread
+
+def cancelled():
+    """ True if the task running in this thread exceeded its budget. Long running loops (retries) should stop then. """
+    task = getattr(_local, 'task', None)
+    return task is not None and task.cancel.is_set()
+
+class Task:
+    def __init__(self, name, resource, function, args=(), produces=(), requires=(), exclusive=False, order=0, expected=None, budget=None):
+        self.name = name
+        self.resource = resource # tasks with the same resource are never run at the same time
+        self.function = function # called with (ts_fields of finished dependencies, *args), returns a dict of ts_fields
+        self.args = args
+        self.produces = set(produces) # ts_fields this task writes
+        self.requires = set(requires) # ts_fields this task needs from other tasks
+        self.exclusive = exclusive
+        self.order = order # order within the resource, lower runs first
+        self.expected = expected # expected duration in seconds
+        self.budget = budget # seconds until the task is cancelled, None for no limit
+        self.depends = set()
+        self.done = threading.Event()
+        self.cancel = threading.Event()
+        self.result = {}
+        self.duration = None
+        self.started = None
+        self.state = 'waiting' # waiting, running, finished, timeout, skipped
+        self.lock_held = False
+
+
+class ResourceLock:
+    """ Readers-writer lock: normal tasks share it, exclusive tasks run alone. Waiting writers are preferred. """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+        self._waiting_exclusive = 0
+
+    def acquire(self, exclusive=False):
+        with self._condition:
+            if exclusive:
+                self._waiting_exclusive += 1
+                while self._exclusive or self._shared > 0:
+                    self._condition.wait()
+                self._waiting_exclusive -= 1
+                self._exclusive = True
+            else:
+                while self._exclusive or self._waiting_exclusive > 0:
+                    self._condition.wait()
+                self._shared += 1
+
+    def release(self, exclusive=False):
+        with self._condition:
+            if exclusive:
+                self._exclusive = False
+            else:
+                self._shared -= 1
+            self._condition.notify_all()
+
+
+def resolve_dependencies(tasks):
+    """ Connect every task to the tasks which produce the fields it requires. Returns the tasks grouped by resource in run order. """
+    producers = {}
+    for task in tasks:
+        for field in task.produces:
+            producers.setdefault(field, []).append(task)
+
+    for task in tasks:
+        for field in task.requires:
+            if field not in producers:
+                logger.warning("Task '" + task.name + "' requires field '" + str(field) + "' which is not measured by any sensor.")
+                continue
+            for producer in producers[field]:
+                if producer is not task:
+                    task.depends.add(producer)
+
+    # drop dependencies which would lead to a cycle
+    for task in tasks:
+        for dependency in list(task.depends):
+            if _depends_on(dependency, task, set()):
+                logger.warning("Ignoring cyclic dependency of task '" + task.name + "' on '" + dependency.name + "'.")
+                task.depends.discard(dependency)
+
+    resources = {}
+    for task in tasks:
+        resources.setdefault(task.resource, []).append(task)
+    for (resource, resource_tasks) in resources.items():
+        resources[resource] = _sort_resource(resource_tasks)
+    return resources
+
+def _depends_on(task, other, visited):
+    if task is other:
+        return True
+    visited.add(task)
+    for dependency in task.depends:
+        if dependency not in visited and _depends_on(dependency, other, visited):
+            return True
+    return False
+
+def _sort_resource(tasks):
+    # topological order within one resource (tasks wait for dependencies on the same thread otherwise forever)
+    # ties are broken by order and registration index
+    remaining = sorted(tasks, key=lambda task: task.order)
+    ordered = []
+    while remaining:
+        for task in remaining:
+            if not any(dependency in remaining for dependency in task.depends):
+                break
+        remaining.remove(task)
+        ordered.append(task)
+    return ordered
+
+
+class AcquisitionEngine:
+    def __init__(self, tasks):
+        self.tasks = list(tasks)
+        self.resources = resolve_dependencies(self.tasks)
+        self._lock = ResourceLock()
+        self._fields_lock = threading.Lock()
+        self._fields = {}
+        self._changed = threading.Event() # set whenever a task finished
+        self.duration = None
+
+    def run(self, budget=None):
+        """ Run all tasks and return the merged ts_fields. budget limits the whole acquisition in seconds. """
+        start = time.monotonic()
+        deadline = None
+        if budget:
+            deadline = start + budget
+        threads = []
+        for (resource, tasks) in self.resources.items():
+            thread = threading.Thread(target=self._run_resource, name='acquisition-' + str(resource), args=(tasks,))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        # wait for the threads and cancel tasks which exceed their budget
+        while any(thread.is_alive() for thread in threads):
+            self._changed.clear()
+            now = time.monotonic()
+            timeout = 1
+            for task in self.tasks:
+                if task.state != 'running':
+                    continue
+                task_deadline = deadline
+                if task.budget is not None:
+                    task_deadline = task.started + task.budget
+                    if deadline is not None:
+                        task_deadline = min(task_deadline, deadline)
+                if task_deadline is None:
+                    continue
+                if now >= task_deadline:
+                    self._cancel(task)
+                else:
+                    timeout = min(timeout, task_deadline - now)
+            if deadline is not None and now >= deadline:
+                for task in self.tasks:
+                    if task.state == 'waiting':
+                        self._skip(task, "acquisition budget of " + str(budget) + " seconds exceeded")
+            if all(task.state in ('finished', 'timeout', 'skipped') for task in self.tasks):
+                break
+            self._changed.wait(max(timeout, 0.01))
+        self.duration = time.monotonic() - start
+
+        # merge in registration order so the result is the same as with sequential reading
+        ts_fields = {}
+        for task in self.tasks:
+            if task.state == 'finished':
+                ts_fields.update(task.result)
+        # a sensor may report a quality note in 'status', it is added to the status of the engine
+        ts_fields.pop('status', None)
+        self.log_stats()
+        return ts_fields
+
+    def get_status(self):
+        """ Text for the ThingSpeak status field naming all sensors without result and the quality notes of the sensors, None if there is nothing to report. """
+        timeouts = [task.name for task in self.tasks if task.state == 'timeout']
+        skipped = [task.name for task in self.tasks if task.state == 'skipped']
+        status = []
+        if timeouts:
+            status.append("Timeout: " + ", ".join(timeouts))
+        if skipped:
+            status.append("Skipped: " + ", ".join(skipped))
+        for task in self.tasks:
+            if task.state == 'finished' and task.result.get('status'):
+                status.append(task.result['status'])
+        if status:
+            return "; ".join(status)
+        return None
+
+    def _cancel(self, task):
+        with self._fields_lock:
+            if task.state != 'running':
+                return
+            task.state = 'timeout'
+            task.duration = time.monotonic() - task.started
+        logger.error("Task '" + task.name + "' on " + str(task.resource) + " was cancelled after " + str(round(task.duration, 1)) + " seconds because it exceeded its time budget.")
+        task.cancel.set()
+        self._release(task)
+        # the resource thread is blocked, the remaining tasks of this resource are not read
+        for other in self.resources[task.resource]:
+            if other.state == 'waiting':
+                self._skip(other, "resource " + str(task.resource) + " is blocked by '" + task.name + "'")
+        task.done.set()
+
+    def _skip(self, task, reason):
+        with self._fields_lock:
+            if task.state != 'waiting':
+                return
+            task.state = 'skipped'
+        task.cancel.set()
+        logger.warning("Task '" + task.name + "' skipped because " + reason + ".")
+        task.done.set()
+
+    def _release(self, task):
+        # released either by the task itself or by _cancel, whatever happens first
+        with self._fields_lock:
+            if not task.lock_held:
+                return
+            task.lock_held = False
+        self._lock.release(task.exclusive)
+
+    def log_stats(self):
+        total = 0.0
+        for task in self.tasks:
+            if task.duration is not None:
+                total += task.duration
+                expected = ""
+                if task.expected is not None:
+                    expected = " (expected: " + str(task.expected) + " seconds)"
+                logger.debug("Task '" + task.name + "' on " + str(task.resource) + " took " + str(round(task.duration, 2)) + " seconds" + expected + ".")
+        if self.duration is not None:
+            logger.debug("Acquisition finished in " + str(round(self.duration, 2)) + " seconds (sequential: " + str(round(total, 2)) + " seconds) using " + str(len(self.resources)) + " resource(s).")
+
+    def _run_resource(self, tasks):
+        for task in tasks:
+            for dependency in task.depends:
+                dependency.done.wait()
+            with self._fields_lock:
+                if task.state != 'waiting':
+                    continue
+                ts_fields = dict(self._fields)
+            self._lock.acquire(task.exclusive)
+            with self._fields_lock:
+                if task.state != 'waiting':
+                    # skipped while waiting for the lock
+                    self._lock.release(task.exclusive)
+                    continue
+                task.lock_held = True
+                task.state = 'running'
+                task.started = time.monotonic()
+            _local.task = task
+            result = None
+            try:
+                result = task.function(ts_fields, *task.args)
+            except Exception as ex:
+                logger.exception("Unhandled Exception in acquisition task '" + task.name + "'")
+            finally:
+                _local.task = None
+                self._release(task)
+            with self._fields_lock:
+                if task.state != 'running':
+                    # cancelled, the result comes too late
+                    return
+                task.state = 'finished'
+                task.duration = time.monotonic() - task.started
+                if result:
+                    task.result = result
+                    self._fields.update(result)
+            task.done.set()
+            self._changed.set()
+        self._changed.set()
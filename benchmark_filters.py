@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Benchmark of the HX711 sample filters.
+# Compares the former list based outliers_filter with sensors/robust_stats.py (numpy if
+# installed, plain Python otherwise) on generated sample buffers with spikes and invalid reads.
+#
+# Usage: python3 benchmark_filters.py [--sizes 1000 10000 100000] [--repeat 5]
+
+import argparse
+import random
+import statistics as stat
+import time
+
+from sensors import robust_stats
+
+def outliers_filter_reference(data_list):
+    # HX711.outliers_filter before the switch to robust_stats
+    data = []
+    for num in data_list:
+        if num:
+            data.append(num)
+    m = 2.0
+    if len(data) != 0:
+        data_median = stat.median(data)
+        abs_distance = []
+        for num in data:
+            abs_distance.append(abs(num - data_median))
+        mdev = stat.median(abs_distance)
+        s = []
+        if mdev:
+            for num in abs_distance:
+                s.append(num / mdev)
+        else:
+            return data
+        filtered_data = []
+        for i in range(len(data)):
+            if s[i] < m:
+                filtered_data.append(data[i])
+        return filtered_data
+    else:
+        return data
+
+def generate_samples(size, seed=1):
+    # raw values around a weight with noise, 2 % spikes and 1 % invalid reads (False)
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(size):
+        value = int(rng.gauss(250000, 40))
+        if rng.random() < 0.02:
+            value += rng.choice((-1, 1)) * rng.randint(5000, 50000)
+        if rng.random() < 0.01:
+            value = False
+        samples.append(value)
+    return samples
+
+def best_time(function, data, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(data)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the HX711 sample filters.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print('numpy: ' + ('yes' if robust_stats.np is not None else 'no (plain Python fallback)'))
+    candidates = [
+        ('reference outliers_filter', lambda data: stat.mean(outliers_filter_reference(data))),
+        ('median_filter', lambda data: robust_stats.mean(robust_stats.median_filter(data))),
+        ('trimmed_mean_filter', lambda data: robust_stats.mean(robust_stats.trimmed_mean_filter(data))),
+        ('hampel_filter', lambda data: robust_stats.mean(robust_stats.hampel_filter(data))),
+    ]
+    for size in args.sizes:
+        data = generate_samples(size)
+        reference = stat.mean(outliers_filter_reference(data))
+        print(str(size) + ' samples:')
+        reference_time = None
+        for (name, function) in candidates:
+            elapsed = best_time(function, data, args.repeat)
+            if reference_time is None:
+                reference_time = elapsed
+            result = function(data)
+            print('    ' + name.ljust(28) + str(round(elapsed * 1000, 2)).rjust(10) + ' ms' + ('x' + str(round(reference_time / elapsed, 1))).rjust(9) + '   mean: ' + str(round(result, 1)) + ' (reference ' + str(round(reference, 1)) + ')')
+
+if __name__ == '__main__':
+    try:
+        main()
+    except (KeyboardInterrupt, SystemExit):
+        pass
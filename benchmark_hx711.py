@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Benchmark of the weight pipeline with simulated HX711 (sensors/gpio_backend.py).
+# Every scenario attaches a SimulatedHX711 with noise, spikes, dropped bits or a slow clock
+# and reports the samples per second and invalid reads of HX711.read_block, the reads aborted
+# because of the timing without and with realtime() and the latency and error of
+# read_hx711.measure_weight. Runs without a Raspberry Pi, with --pins a real HX711 is read.
+# With --levels a scale too noisy for the tolerance is read with the HX711 options of every
+# cycle policy level, a higher level has to take less time (exit code 1 otherwise).
+#
+# Usage: python3 benchmark_hx711.py [--sps 80] [--samples 400] [--repeat 3] [--scenario noise spikes]
+#        python3 benchmark_hx711.py --pins 5 6 [--samples 400]
+#        python3 benchmark_hx711.py --levels [--sps 80]
+
+import argparse
+import sys
+import time
+
+from sensors import gpio_backend
+from realtime import realtime
+
+SCENARIOS = {
+    'clean': {},
+    'noise': {'noise': 200},
+    'spikes': {'noise': 200, 'spike_rate': 0.05},
+    'dropped_bits': {'noise': 200, 'drop_rate': 0.002},
+    'slow_clock': {'noise': 200, 'slow_clock_rate': 0.002},
+    'all': {'noise': 200, 'spike_rate': 0.05, 'drop_rate': 0.002, 'slow_clock_rate': 0.002},
+}
+WEIGHT = 5000 # gram on the simulated scale
+REFERENCE_UNIT = 20
+OFFSET = 100000
+
+def benchmark_read_block(hx, samples, realtime_enabled=False):
+    hx.reset_read_statistics()
+    with realtime(enabled=realtime_enabled):
+        start = time.perf_counter()
+        block = hx.read_block(samples)
+        elapsed = time.perf_counter() - start
+    invalid = len([sample for sample in block if sample is False])
+    return samples / elapsed, invalid, hx.get_read_statistics()
+
+def benchmark_hardware(pin_dt, pin_sck, samples):
+    # timing violations of a real HX711 without and with realtime()
+    from sensors.HX711 import HX711
+    gpio_backend.GPIO.setmode(gpio_backend.GPIO.BCM)
+    hx = HX711(dout_pin=pin_dt, pd_sck_pin=pin_sck)
+    print('HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck))
+    for realtime_enabled in (False, True):
+        (rate, invalid, statistics) = benchmark_read_block(hx, samples, realtime_enabled)
+        print(('realtime' if realtime_enabled else 'normal').ljust(14) + str(round(rate, 1)).rjust(10) + ' samples/s' + (str(round(100.0 * invalid / samples, 1)) + '%').rjust(9) + ' invalid' + str(statistics['aborted']).rjust(6) + ' aborted')
+
+def benchmark_measure_weight(read_hx711, weight_sensor, repeat):
+    latencies = []
+    errors = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        weight = read_hx711.measure_weight(weight_sensor)
+        latencies.append(time.perf_counter() - start)
+        if weight is not None:
+            errors.append(abs(weight - WEIGHT))
+    return latencies, errors
+
+def benchmark_levels(read_hx711, simulation, sps):
+    # the noise keeps the confidence interval above the tolerance, every reading uses up its time budget
+    from cycle_policy import MAX_LEVEL, HX711_READINGS, HX711_BUDGET_FACTOR
+    pin_dt = 25
+    pin_sck = 26
+    simulation.attach(gpio_backend.SimulatedHX711(pin_dt, pin_sck, raw=OFFSET + WEIGHT * REFERENCE_UNIT, sps=sps, seed=0, noise=20000))
+    weight_sensor = {'pin_dt': pin_dt, 'pin_sck': pin_sck, 'channel': 'A', 'reference_unit': REFERENCE_UNIT, 'offset': OFFSET, 'time_budget': 4}
+    print('level'.ljust(14) + 'readings'.rjust(10) + 'budget'.rjust(9) + 'time'.rjust(9))
+    durations = []
+    for level in range(MAX_LEVEL + 1):
+        start = time.perf_counter()
+        read_hx711.measure_weight(weight_sensor, num_measurements=HX711_READINGS[level], budget_factor=HX711_BUDGET_FACTOR[level])
+        durations.append(time.perf_counter() - start)
+        print(str(level).ljust(14) + str(HX711_READINGS[level]).rjust(10) + str(HX711_BUDGET_FACTOR[level]).rjust(9) + (str(round(durations[-1], 2)) + 's').rjust(9))
+    # levels with the same options take about the same time
+    reduced = all(durations[level] < durations[level - 1] or (HX711_READINGS[level], HX711_BUDGET_FACTOR[level]) == (HX711_READINGS[level - 1], HX711_BUDGET_FACTOR[level - 1]) for level in range(1, MAX_LEVEL + 1))
+    print('HX711 time reduced by every level' if reduced else 'HX711 time NOT reduced by every level')
+    return reduced
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the weight pipeline with simulated HX711.')
+    parser.add_argument('--sps', type=int, default=80, choices=[10, 80], help='conversions per second of the simulated HX711')
+    parser.add_argument('--samples', type=int, default=400, help='samples read with read_block')
+    parser.add_argument('--repeat', type=int, default=3, help='measure_weight calls per scenario')
+    parser.add_argument('--scenario', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--pins', type=int, nargs=2, metavar=('DT', 'SCK'), help='read a real HX711 instead of the simulation')
+    parser.add_argument('--levels', action='store_true', help='check that the cycle policy levels reduce the HX711 time')
+    args = parser.parse_args()
+
+    if args.pins:
+        benchmark_hardware(args.pins[0], args.pins[1], args.samples)
+        return
+
+    simulation = gpio_backend.use_simulation()
+    # imported after the backend is selected, read_hx711 sets up the GPIO on import
+    import read_hx711
+    from sensors.HX711 import HX711
+
+    if args.levels:
+        if not benchmark_levels(read_hx711, simulation, args.sps):
+            sys.exit(1)
+        return
+
+    print('simulated HX711 with ' + str(args.sps) + ' SPS, ' + str(WEIGHT) + 'g')
+    print('scenario'.ljust(14) + 'samples/s'.rjust(10) + 'invalid'.rjust(9) + 'aborted'.rjust(9) + 'rt abort'.rjust(9) + 'first'.rjust(9) + 'best'.rjust(9) + 'error'.rjust(9))
+    for (i, name) in enumerate(args.scenario):
+        # every scenario gets its own pins, so the HX711 pool of read_hx711 initializes a new one
+        pin_dt = 2 * i + 5
+        pin_sck = 2 * i + 6
+        simulation.attach(gpio_backend.SimulatedHX711(pin_dt, pin_sck, raw=OFFSET + WEIGHT * REFERENCE_UNIT, sps=args.sps, seed=i, **SCENARIOS[name]))
+        hx = HX711(dout_pin=pin_dt, pd_sck_pin=pin_sck)
+        (rate, invalid, statistics) = benchmark_read_block(hx, args.samples)
+        (_, _, statistics_realtime) = benchmark_read_block(hx, args.samples, True)
+        weight_sensor = {'pin_dt': pin_dt, 'pin_sck': pin_sck, 'channel': 'A', 'reference_unit': REFERENCE_UNIT, 'offset': OFFSET}
+        (latencies, errors) = benchmark_measure_weight(read_hx711, weight_sensor, args.repeat)
+        error = (str(round(max(errors), 1)) + 'g') if errors else 'failed'
+        print(name.ljust(14) + str(round(rate, 1)).rjust(10) + (str(round(100.0 * invalid / args.samples, 1)) + '%').rjust(9) + str(statistics['aborted']).rjust(9) + str(statistics_realtime['aborted']).rjust(9)
+            + (str(round(latencies[0], 2)) + 's').rjust(9) + (str(round(min(latencies), 2)) + 's').rjust(9) + error.rjust(9))
+
+if __name__ == '__main__':
+    try:
+        main()
+    except (KeyboardInterrupt, SystemExit):
+        pass
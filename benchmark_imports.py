@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Import time report for the entry points of HoneyPi.
+# Every entry point is imported in a fresh interpreter with "python3 -X importtime",
+# the slowest modules are printed and the total is compared with a saved baseline.
+# Heavy sensor libraries must not be imported before a configured sensor needs them.
+#
+# Usage: python3 benchmark_imports.py [--save] [--top N] [entry point ...]
+#   --save    store the current times as new baseline (run this on the Raspberry Pi)
+# Returns exit code 1 if an entry point got slower than the baseline or imports a lazy module.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ENTRY_POINTS = ['measurement', 'read_and_upload_all', 'main']
+
+# modules which are only imported by the sensor drivers if a sensor of their type is configured
+LAZY_MODULES = ['numpy', 'bme680', 'adafruit_dht', 'Adafruit_DHT', 'psutil', 'pynmea2', 'timezonefinder', 'read_bme680', 'read_dht', 'read_gps', 'read_hx711', 'read_bh1750']
+
+TOLERANCE = 1.2 # allowed slowdown against the baseline
+REPEAT = 3 # the fastest of some runs is used, the first one also measures the file system cache
+
+baselineFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'import_benchmark.json')
+
+def measure_imports(module):
+    """ Import module in a new interpreter. Returns a dict module -> (self, cumulative) in microseconds. """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module], cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        name = parts[2].strip()
+        times[name] = (int(parts[0]), int(parts[1]))
+    if module not in times:
+        # last lines of the traceback
+        return None, '\n'.join(result.stderr.splitlines()[-3:])
+    return times, None
+
+def benchmark(module):
+    best = None
+    for i in range(REPEAT):
+        times, error = measure_imports(module)
+        if times is None:
+            return None, error
+        if best is None or times[module][1] < best[module][1]:
+            best = times
+    return best, None
+
+def load_baseline():
+    try:
+        with open(baselineFile, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_baseline(baseline):
+    with open(baselineFile, 'w') as f:
+        f.write(json.dumps(baseline, indent=4, sort_keys=True))
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time benchmark for HoneyPi entry points.')
+    parser.add_argument('--save', action='store_true', help='save current times as baseline')
+    parser.add_argument('--top', type=int, default=10, help='number of slowest modules to print')
+    parser.add_argument('modules', nargs='*', default=ENTRY_POINTS)
+    args = parser.parse_args()
+
+    baseline = load_baseline()
+    failed = False
+    for module in args.modules:
+        times, error = benchmark(module)
+        if times is None:
+            print(module + ': import failed\n' + error)
+            failed = True
+            continue
+
+        total = times[module][1]
+        print(module + ': ' + str(round(total / 1000, 1)) + ' ms')
+        for (name, (self_time, cumulative)) in sorted(times.items(), key=lambda item: item[1][0], reverse=True)[:args.top]:
+            print('    ' + name.ljust(40) + ' self: ' + str(round(self_time / 1000, 1)).rjust(7) + ' ms  cumulative: ' + str(round(cumulative / 1000, 1)).rjust(7) + ' ms')
+
+        lazy = [name for name in LAZY_MODULES if name in times and name != module]
+        if lazy:
+            print('    imports lazy module(s): ' + ', '.join(lazy))
+            failed = True
+
+        if module in baseline and not args.save:
+            allowed = baseline[module] * TOLERANCE
+            if total > allowed:
+                print('    slower than baseline: ' + str(round(baseline[module] / 1000, 1)) + ' ms')
+                failed = True
+        if args.save:
+            baseline[module] = total
+
+    if args.save:
+        save_baseline(baseline)
+        print('Baseline saved to ' + baselineFile)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,6 +12,10 @@ scriptsFolder = honeypiFolder + '/rpi-scripts'
 backendFolder = '/var/www/html/backend'
 settingsFile = backendFolder + '/settings.json'
 logfile = scriptsFolder + '/error.log'
+metricsFile = scriptsFolder + '/metrics.json'
+timelineFile = scriptsFolder + '/oneshot_timeline.json'
+readingsFile = '/dev/shm/honeypi_readings' # shared memory, lost on reboot
+lockFolder = '/run/lock/honeypi' # resource_lock.py
 wittypi_scheduleFileName = "/schedule.wpi"
 wittypi_scheduleFile = backendFolder + wittypi_scheduleFileName
 GPIO_BTN = 16
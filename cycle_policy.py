@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Adaptive cycle policy.
+# Learns the duration of the measurement cycles (exponentially weighted moving average) and
+# reacts if the measurements do not fit into the interval anymore instead of losing data points:
+#   level 1: fewer HX711 readings per average and a shorter HX711 time budget
+#   level 2: slow sensors (GPS) are only read every DEFER_EVERY cycles
+#   level 3: an overrun measurement shifts the start phase instead of being skipped
+# The level goes back down after some cycles with enough headroom.
+
+import logging
+
+logger = logging.getLogger('HoneyPi.cycle_policy')
+
+MAX_LEVEL = 3
+ALPHA = 0.3 # weight of the latest cycle duration in the moving average
+ESCALATE_RATIO = 0.8 # escalate if the average needs more than this part of the interval
+DEESCALATE_RATIO = 0.5 # go back if the average needs less than this part of the interval ...
+DEESCALATE_CYCLES = 5 # ... for this number of cycles in a row
+COOLDOWN_CYCLES = 3 # cycles to wait after a change until the average is used to escalate again
+HX711_READINGS = {0: 41, 1: 21, 2: 21, 3: 11} # readings per HX711 average by level
+HX711_BUDGET_FACTOR = {0: 1.0, 1: 0.5, 2: 0.5, 3: 0.25} # part of the HX711 time budget by level, a noisy scale stops sampling earlier
+DEFER_EVERY = 4 # slow sensors are read every Nth cycle from level 2 on
+DEFERRABLE = ['gps'] # drivers which may be skipped
+UPLOAD_RESERVE = 60 # seconds of the watchdog timeout kept free for CSV and upload
+
+class CyclePolicy:
+    def __init__(self, interval):
+        self.interval = interval
+        self.level = 0
+        self.average = None # seconds
+        self.cycle = 0
+        self.overruns = 0
+        self._good_cycles = 0
+        self._cooldown = 0
+
+    def set_interval(self, interval):
+        self.interval = interval
+
+    def update(self, duration):
+        """ Learn from a finished measurement. """
+        if duration is None:
+            return
+        if self.average is None:
+            self.average = duration
+        else:
+            self.average = ALPHA * duration + (1 - ALPHA) * self.average
+        if not self.interval or self.interval <= 1:
+            return
+        if self._cooldown > 0:
+            self._cooldown -= 1
+        if self.average > ESCALATE_RATIO * self.interval:
+            if self._cooldown > 0:
+                return
+            self._good_cycles = 0
+            self._escalate("Average measurement duration of " + str(round(self.average, 1)) + " seconds is close to the interval of " + str(self.interval) + " seconds.")
+        elif self.average < DEESCALATE_RATIO * self.interval:
+            self._good_cycles += 1
+            if self._good_cycles >= DEESCALATE_CYCLES and self.level > 0:
+                self._good_cycles = 0
+                self.level -= 1
+                logger.info("Measurements fit into the interval again, cycle policy level decreased to " + str(self.level) + ".")
+        else:
+            self._good_cycles = 0
+
+    def overrun(self):
+        """ The previous measurement was not finished when the next one was due. """
+        self.overruns += 1
+        self._good_cycles = 0
+        self._escalate("Measurement did not finish within the interval of " + str(self.interval) + " seconds (" + str(self.overruns) + " overruns).")
+
+    def _escalate(self, reason):
+        if self.level < MAX_LEVEL:
+            self.level += 1
+            self._cooldown = COOLDOWN_CYCLES
+            logger.warning(reason + " Cycle policy level increased to " + str(self.level) + ".")
+
+    def next_cycle(self):
+        """ Options for the next measurement, passed to the drivers. """
+        self.cycle += 1
+        options = {'hx711_readings': HX711_READINGS[self.level], 'hx711_budget_factor': HX711_BUDGET_FACTOR[self.level], 'defer': [], 'budget': self.acquisition_budget()}
+        if self.level >= 2 and self.cycle % DEFER_EVERY != 0:
+            options['defer'] = list(DEFERRABLE)
+        return options
+
+    def shift_phase(self, busy_since):
+        """ Seconds to delay the overrun measurement, None if it should be skipped. """
+        if self.level < 3 or not self.interval or self.interval <= 1:
+            return None
+        remaining = 1
+        if self.average is not None:
+            remaining = max(1, self.average - busy_since)
+        return min(remaining, self.interval / 2)
+
+    def acquisition_budget(self):
+        # the sensors are cancelled early enough that the values can still be uploaded before the watchdog restarts the worker
+        if not self.interval or self.interval <= 1:
+            return None
+        timeout = self.watchdog_timeout()
+        return max(timeout - UPLOAD_RESERVE, timeout / 2)
+
+    def watchdog_timeout(self):
+        # with phase shifting the measurement may take up to one and a half interval
+        if self.level >= 3:
+            return max(int(self.interval * 1.5) - 1, 1)
+        return max(self.interval - 1, 1)
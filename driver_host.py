@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Own processes for the timing critical bit-banged drivers (HX711, DHT, MAX6675/MAX31855).
+# HostedDriver starts a minimal Python process (this file, not a fork of the measurement process)
+# which only imports the driver and its read_* module. The driver is initialized there and the
+# tasks of the acquisition engine call it over a pipe, so threads of the measurement process
+# (other tasks, timers, samplers of other drivers) cannot stretch a clock pulse.
+# The host process runs worker_loop of measurement_worker.py, its metrics are sent back with the result.
+
+import functools
+import importlib
+import os
+import socket
+import subprocess
+import sys
+import threading
+import logging
+from multiprocessing.connection import Connection
+
+import metrics
+from acquisition import cancelled
+from measurement_worker import MeasurementWorker, worker_loop
+
+logger = logging.getLogger('HoneyPi.driver_host')
+
+POLL_INTERVAL = 0.2 # seconds between the checks if a task was cancelled
+
+def host_init(module, name, sensors):
+    driver = getattr(importlib.import_module(module), name)(sensors)
+    driver.init()
+    return driver
+
+def host_call(driver, method, args):
+    cycle = metrics.start_cycle()
+    result = getattr(driver, method)(*args)
+    return (result, dict(cycle))
+
+def host_close(driver):
+    if driver is not None:
+        driver.close()
+
+def log_levels():
+    # levels of the file and console handler of the HoneyPi logger for the host process
+    levels = {}
+    for handler in logging.getLogger('HoneyPi').handlers:
+        if isinstance(handler, logging.FileHandler):
+            levels['file'] = (handler.baseFilename, handler.level)
+        elif isinstance(handler, logging.StreamHandler):
+            levels['console'] = handler.level
+    return levels
+
+
+class DriverHost(MeasurementWorker):
+    """ MeasurementWorker running the driver in a new Python process instead of a fork. """
+    def __init__(self, driver):
+        MeasurementWorker.__init__(self, None, None, None, name='HoneyPi-' + driver.name)
+        self._driver = driver
+
+    def start(self):
+        (parent_socket, child_socket) = socket.socketpair()
+        script = os.path.abspath(__file__)
+        self._process = subprocess.Popen([sys.executable, script, str(child_socket.fileno())], pass_fds=(child_socket.fileno(),), cwd=os.path.dirname(script))
+        child_socket.close()
+        self._conn = Connection(parent_socket.detach())
+        self._conn.send((type(self._driver).__module__, type(self._driver).__name__, self._driver.sensors, log_levels()))
+        self._busy = False
+        logger.debug("Driver host " + self._name + " started with PID " + str(self._process.pid))
+
+    def is_alive(self):
+        return self._process is not None and self._process.poll() is None
+
+    def stop(self, timeout=5):
+        if self._process is None:
+            return
+        try:
+            if self.is_alive():
+                self._conn.send(('stop',))
+                self._process.wait(timeout)
+        except (BrokenPipeError, OSError, subprocess.TimeoutExpired):
+            pass
+        self._kill()
+        logger.debug("Driver host " + self._name + " stopped.")
+
+    def kill(self):
+        """ Stop a hanging host without waiting, HostedDriver.call starts it again. """
+        self.restarts += 1
+        self._kill()
+
+    def _kill(self):
+        if self.is_alive():
+            self._process.terminate()
+            try:
+                self._process.wait(1)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        if self._conn is not None:
+            self._conn.close()
+        self._process = None
+        self._conn = None
+        self._busy = False
+
+
+class HostedDriver:
+    """ Driver whose sensors are initialized and read in a DriverHost, all other attributes are the ones of driver. """
+    def __init__(self, driver):
+        self.driver = driver
+        self.host = None
+        self._lock = threading.Lock() # tasks of several resources (e.g. DHT pins) share the host
+
+    def __getattr__(self, name):
+        return getattr(self.driver, name)
+
+    def init(self):
+        self.host = DriverHost(self.driver)
+        self.host.start()
+
+    def tasks(self, cycle_data):
+        tasks = self.driver.tasks(cycle_data)
+        for task in tasks:
+            task.function = functools.partial(self.call, task.function.__name__)
+            # threads of this process cannot disturb the host process
+            task.exclusive = False
+        return tasks
+
+    def call(self, method, *args):
+        with self._lock:
+            host = self.host
+            if not host.is_alive():
+                # killed after a cancelled task, the init runs within this task instead of the cancelled one
+                logger.info("Starting driver host " + self.name + " again.")
+                host.start()
+            host.last_result = None
+            if not host.measure(method, args):
+                logger.warning("Driver host " + self.name + " is still busy.")
+                return None
+            while not host.wait(POLL_INTERVAL):
+                if cancelled():
+                    # the task exceeded its budget, the host may hang in a read. It is started again with the next call.
+                    logger.warning("Driver host " + self.name + " did not finish " + method + " within the budget, stopping it.")
+                    host.kill()
+                    return None
+            if host.last_result is None:
+                logger.error("Driver host " + self.name + " returned no result.")
+                return None
+            (result, cycle_metrics) = host.last_result
+            for (name, value) in cycle_metrics.items():
+                metrics.record(name, value)
+            return result
+
+    def close(self):
+        if self.host is not None:
+            self.host.stop()
+            self.host = None
+
+
+def setup_logging(levels):
+    honeypi_logger = logging.getLogger('HoneyPi')
+    honeypi_logger.setLevel(logging.DEBUG)
+    formatter = logging.Formatter('%(asctime)s | %(levelname)s | %(name)s | %(message)s')
+    handlers = []
+    if 'file' in levels:
+        # the measurement process rotates the file
+        handler = logging.FileHandler(levels['file'][0])
+        handler.setLevel(levels['file'][1])
+        handlers.append(handler)
+    if 'console' in levels:
+        handler = logging.StreamHandler()
+        handler.setLevel(levels['console'])
+        handlers.append(handler)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        honeypi_logger.addHandler(handler)
+
+def main():
+    conn = Connection(int(sys.argv[1]))
+    (module, name, sensors, levels) = conn.recv()
+    setup_logging(levels)
+    worker_loop(conn, host_init, (module, name, sensors), host_call, host_close)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    except Exception as ex:
+        logger.exception("Unhandled Exception in driver host")
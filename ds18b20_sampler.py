@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Background sampling of the Ds18b20 sensors.
+# A sampler thread reads all sensors every SAMPLING_INTERVAL seconds (one bulk conversion, see
+# read_ds18b20.measure_temperatures) into a fixed size ring buffer per sensor. A measurement only
+# takes the estimate: the mean of the last WINDOW values without the values beyond std_factor
+# standard deviations (the filter of read_ds18b20.filter_values), calculated with numpy if installed.
+
+import math
+import threading
+import time
+import logging
+from array import array
+
+from read_ds18b20 import measure_temperatures, filter_values, init_resolutions
+
+logger = logging.getLogger('HoneyPi.ds18b20_sampler')
+
+SAMPLING_INTERVAL = 6 # seconds between two Ds18b20 values
+WINDOW = 5 # values filtered for an estimate
+MIN_SAMPLES = 5 # values required for an estimate, otherwise the sensor is read directly
+MAX_AGE = 60 # seconds, older values are not used for an estimate
+CAPACITY = 50 # values kept per sensor
+
+class RingBuffer:
+    """ Fixed size buffer of (time, value), appending overwrites the oldest value. """
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self._times = array('d', [0.0] * capacity)
+        self._values = array('d', [math.nan] * capacity)
+        self._count = 0 # values appended since start
+
+    def append(self, timestamp, value):
+        index = self._count % self.capacity
+        self._times[index] = timestamp
+        self._values[index] = value
+        self._count += 1
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def last(self, n, since=None):
+        """ Last n values (oldest first) not older than since. """
+        n = min(n, len(self))
+        indexes = [index % self.capacity for index in range(self._count - n, self._count)]
+        return [self._values[index] for index in indexes if since is None or self._times[index] >= since]
+
+def filtered_mean(values, std_factor=2):
+    # mean of the values within std_factor population standard deviations of their mean
+    from sensors.robust_stats import np # numpy is only imported with the first estimate
+    if np is not None:
+        data = np.asarray(values, dtype=np.float64)
+        mean = data.mean()
+        standard_deviation = data.std()
+        if standard_deviation == 0:
+            return float(mean)
+        kept = data[np.abs(data - mean) < std_factor * standard_deviation]
+        return float(kept.mean()) if kept.size else float(mean)
+    kept = filter_values(values, std_factor)
+    if not kept:
+        return math.fsum(values) / len(values)
+    return math.fsum(kept) / len(kept)
+
+class DS18B20Sampler(threading.Thread):
+    def __init__(self, sensors, interval=SAMPLING_INTERVAL):
+        threading.Thread.__init__(self, name='ds18b20-sampler', daemon=True)
+        self.sensors = sensors
+        self.interval = interval
+        self.buffers = [RingBuffer() for _ in sensors]
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.pass_duration = None # seconds of the last sampling pass, for the metrics
+
+    def stop(self, timeout=2):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def sample(self):
+        indexes = [sensorIndex for (sensorIndex, sensor) in enumerate(self.sensors) if 'device_id' in sensor]
+        start = time.monotonic()
+        temperatures = measure_temperatures([self.sensors[sensorIndex] for sensorIndex in indexes])
+        now = time.monotonic()
+        self.pass_duration = now - start
+        with self._lock:
+            for (sensorIndex, temperature) in zip(indexes, temperatures):
+                if temperature is not None and not math.isnan(temperature):
+                    logger.debug("temperature for device '" + str(self.sensors[sensorIndex]["device_id"]) + "': " + str(temperature))
+                    self.buffers[sensorIndex].append(now, temperature)
+
+    def run(self):
+        logger.debug('Ds18b20 sampler started for ' + str(len(self.sensors)) + ' sensor(s)')
+        try:
+            init_resolutions(self.sensors)
+        except Exception as ex:
+            logger.exception("Unhandled Exception while setting the Ds18b20 resolutions")
+        next_sample = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+            except Exception as ex:
+                logger.exception("Unhandled Exception in Ds18b20 sampler")
+            # fixed rate, a slow pass does not shift the following ones
+            next_sample = max(next_sample + self.interval, time.monotonic())
+            self._stop_event.wait(max(next_sample - time.monotonic(), 0))
+        logger.debug('Ds18b20 sampler stopped')
+
+    def estimate(self, sensorIndex):
+        """ Filtered temperature of a sensor, None if there are not enough recent values. """
+        with self._lock:
+            values = self.buffers[sensorIndex].last(WINDOW, time.monotonic() - MAX_AGE)
+        if len(values) < MIN_SAMPLES:
+            return None
+        return filtered_mean(values)
+
+    def estimates(self):
+        """ Filtered temperatures of all sensors (None for sensors to read directly). """
+        estimates = []
+        for sensorIndex in range(len(self.sensors)):
+            try:
+                estimates.append(self.estimate(sensorIndex))
+            except Exception as ex:
+                logger.exception("Unhandled Exception in Ds18b20 sampler estimate")
+                estimates.append(None)
+        return estimates
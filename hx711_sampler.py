@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Continuous HX711 sampling.
+# A sampler thread per scale reads every conversion of the HX711 (10 or 80 SPS) into a ring
+# buffer with timestamps. A weight measurement then only calculates a robust estimate of the
+# last seconds instead of reading hundreds of conversions. The HX711 stays powered all the
+# time, so the sampler is only started for weight sensors with "sampler": true in settings.json.
+# The sampler locks the clock line (resource_lock.py) for every block. While another process has
+# locked it (start_single, e.g. maintenance) the sampler waits in flock and continues on release.
+
+import threading
+import time
+import logging
+
+import metrics
+from realtime import realtime
+from resource_lock import hx711_locks, lock_all, release_all, POLL_MAX
+
+logger = logging.getLogger('HoneyPi.hx711_sampler')
+
+BUFFER_SIZE = 1200 # samples kept, 2 minutes at 10 SPS
+BLOCK = 4 # samples read at once
+WINDOW = 10 # seconds used for a weight estimate
+MIN_SAMPLES = 20 # samples required within the window, otherwise the weight is read the usual way
+ERROR_PAUSE = 5 # seconds to wait after a block without any valid sample
+LOCK_WAIT = 30 # seconds waiting for a locked clock line before checking if the sampler was stopped
+
+class HX711Sampler(threading.Thread):
+    def __init__(self, hx, weight_sensor, size=BUFFER_SIZE):
+        threading.Thread.__init__(self, name='hx711-sampler-' + str(weight_sensor.get('pin_dt')), daemon=True)
+        self.hx = hx
+        self.weight_sensor = weight_sensor
+        self.size = size
+        self._times = [0.0] * size
+        self._values = [0] * size
+        self._count = 0 # samples written since start
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._hold = threading.Event() # set while a blocking measurement uses the HX711
+        self._bus_lock = threading.Lock() # held while the sampler reads a block
+        self.paused = False
+        self._discard = False # first block after a pause may be a conversion of another channel
+
+    def stop(self, timeout=2):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def pause(self):
+        """ Stop sampling after the current block, e.g. to read the HX711 the usual way. """
+        self._hold.set()
+        self._bus_lock.acquire()
+
+    def resume(self):
+        self._discard = True
+        self._hold.clear()
+        self._bus_lock.release()
+
+    def run(self):
+        pin_dt = str(self.weight_sensor.get('pin_dt'))
+        locks = hx711_locks([self.weight_sensor])
+        logger.debug('HX711 DT: ' + pin_dt + ' sampler started')
+        while not self._stop_event.is_set():
+            try:
+                if self._hold.is_set():
+                    self._stop_event.wait(0.1)
+                    continue
+                if not lock_all(locks):
+                    # another process (e.g. maintenance) reads a HX711, the sampler continues shortly after the release
+                    self.paused = True
+                    self._discard = True
+                    # the waiting process tries again within POLL_MAX, it gets the lock before the sampler waits itself
+                    self._stop_event.wait(2 * POLL_MAX)
+                    if not lock_all(locks, LOCK_WAIT):
+                        continue
+                self.paused = False
+                try:
+                    with self._bus_lock, realtime(enabled=self.weight_sensor.get('realtime', True)):
+                        samples = self.hx.read_block(BLOCK)
+                finally:
+                    release_all(locks)
+                now = time.monotonic()
+                if self._discard:
+                    self._discard = False
+                    continue
+                valid = [sample for sample in samples if sample is not False]
+                if not valid:
+                    metrics.count('hx711.' + pin_dt + '.sampler_errors')
+                    self._stop_event.wait(ERROR_PAUSE)
+                    continue
+                with self._lock:
+                    for sample in valid:
+                        index = self._count % self.size
+                        self._times[index] = now
+                        self._values[index] = sample
+                        self._count += 1
+            except Exception as ex:
+                logger.exception('HX711 DT: ' + pin_dt + ' Exception in sampler')
+                self._stop_event.wait(ERROR_PAUSE)
+        logger.debug('HX711 DT: ' + pin_dt + ' sampler stopped')
+
+    def samples(self, seconds=None):
+        """ Raw samples of the last seconds (all buffered samples if None), oldest first. """
+        with self._lock:
+            count = min(self._count, self.size)
+            start = self._count - count
+            indexes = [index % self.size for index in range(start, self._count)]
+            times = [self._times[index] for index in indexes]
+            values = [self._values[index] for index in indexes]
+        if seconds is None:
+            return values
+        since = time.monotonic() - seconds
+        return [value for (timestamp, value) in zip(times, values) if timestamp >= since]
+
+    def estimate(self, seconds=WINDOW, min_samples=MIN_SAMPLES):
+        """ Weight in gram of the last seconds, None if there are not enough samples. """
+        from sensors import robust_stats
+        values = self.samples(seconds)
+        if len(values) < min_samples:
+            return None
+        data_filter = self.hx.get_data_filter()
+        if data_filter:
+            filtered = data_filter(values)
+        else:
+            filtered = values
+        if len(filtered) == 0:
+            return None
+        raw = robust_stats.mean(filtered)
+        return float((raw - self.hx.get_current_offset()) / self.hx.get_current_scale_ratio())
+
+_samplers = {} # sck pin -> sampler, one sampler per clock line
+
+def start_sampler(weight_sensor, hx):
+    """ Start sampling weight_sensor with the initialized hx, returns the sampler or None. """
+    try:
+        pin_sck = int(weight_sensor["pin_sck"])
+        if pin_sck in _samplers:
+            logger.warning('HX711 DT: ' + str(weight_sensor.get('pin_dt')) + ' SCK: ' + str(pin_sck) + ' shares the clock with another sampled HX711 and is read the usual way.')
+            return None
+        if 'reference_unit' in weight_sensor:
+            hx.set_scale_ratio(scale_ratio=float(weight_sensor["reference_unit"]))
+        if 'offset' in weight_sensor:
+            hx.set_offset(offset=int(weight_sensor["offset"]))
+        hx.power_up()
+        sampler = HX711Sampler(hx, weight_sensor)
+        sampler.start()
+        _samplers[pin_sck] = sampler
+        return sampler
+    except Exception as ex:
+        logger.exception("Exception in start_sampler")
+    return None
+
+def pause_samplers():
+    for sampler in _samplers.values():
+        sampler.pause()
+
+def resume_samplers():
+    for sampler in _samplers.values():
+        sampler.resume()
+
+def stop_samplers():
+    for sampler in _samplers.values():
+        sampler.stop()
+    _samplers.clear()
@@ -21,7 +21,8 @@ def convert_lorawan(ts_fields):
         mumbytespervalue=3
         numfiledsmissingnew = 0
         numfiledsmissing = 0
-        for (fieldIndex, field) in enumerate (sorted(ts_fields)):
+        # only fieldN can be encoded (no status or GPS position)
+        for (fieldIndex, field) in enumerate (sorted(field for field in ts_fields if field.startswith('field'))):
             hexstr = ""
             fieldNumber = int(field.replace('field',''))
             numfiledsmissing = fieldNumber - (fieldIndex + 1 + numfiledsmissing)
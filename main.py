@@ -12,6 +12,8 @@ from logging.handlers import RotatingFileHandler
 import RPi.GPIO as GPIO
 
 from read_and_upload_all import start_measurement
+from oneshot import OneShot, is_oneshot
+from readings_store import channel_readings
 from maintenance import maintenance
 from read_settings import get_settings, get_sensors
 from utilities import stop_tv, stop_led, toggle_blink_led, start_led, stop_hdd_led, start_hdd_led, reboot, client_to_ap_mode, ap_to_client_mode, blink_led, miliseconds, shutdown, delete_settings, getStateFromStorage, setStateToStorage, connect_internet_modem, get_default_gateway_linux, get_interface_upstatus_linux, get_pi_model, get_rpiscripts_version, runpostupgradescript, check_undervoltage, sync_time_ntp, offlinedata_prepare, fix_fileaccess, whoami, is_system_datetime_valid
@@ -20,7 +22,6 @@ from wittypiutilities import check_wittypi, set_wittypi_rtc, update_wittypi_sche
 
 from multiprocessing import Process, Queue, Value
 from OLed import oled_off, oled_start_honeypi,oled_diag_data,oled_interface_data, oled_init, main, oled_measurement_data, oled_maintenance_data, oled_view_channels
-from read_gps import init_gps, timesync_gps
 
 from datetime import datetime
 from datetime import timedelta
@@ -54,7 +55,10 @@ def oled():
     time.sleep(4)
     oled_interface_data()
     ts_channels = settings["ts_channels"]
-    oled_view_channels(offlinedata_prepare(ts_channels))
+    channeldata = channel_readings(ts_channels)
+    if channeldata is None:
+        channeldata = offlinedata_prepare(ts_channels)
+    oled_view_channels(channeldata)
     time.sleep(4)
     oled_maintenance_data(settings)
     if not superglobal.isMaintenanceActive:
@@ -92,6 +96,7 @@ def timesync(settings, wittypi_status, loggername='HoneyPi.main'): # TODO outsou
 
 def gpstimesync(gpsSensor, blank=None): # TODO outsource to utilities bc not related to main
     try:
+        from read_gps import timesync_gps
         timesync_gps(gpsSensor)
     except Exception as ex:
         logger.exception("Exception in gpstimesync")
@@ -295,6 +300,13 @@ def main():
         else:
             debug = False # flag to enable debug mode (HDMI output enabled and no rebooting)
 
+        # single measurement with shutdown afterwards: sensors and network are started right away
+        oneshot = None
+        if is_oneshot(settings):
+            logger.info('Single measurement mode: measuring while starting up.')
+            oneshot = OneShot(settings, debug)
+            oneshot.start()
+
         # check if wittypi or other RTC is connected and if RTC time is valid
         wittypi_status = check_wittypi(settings, False)
         if ('rtc_time_is_valid' in wittypi_status) and ('rtc_time_local' in wittypi_status) and wittypi_status['rtc_time_is_valid'] and (wittypi_status['rtc_time_local'] is not None):
@@ -321,8 +333,12 @@ def main():
         remove_wittypi_internet_timesync()
 
         # check if GPS is configured and start background thread to sync time to GPS if required.
-        gpsSensors = get_sensors(settings, 99)
+        # in single measurement mode the GPS time is synchronized by the measurement itself
+        gpsSensors = []
+        if oneshot is None:
+            gpsSensors = get_sensors(settings, 99)
         for (sensorIndex, gpsSensor) in enumerate(gpsSensors):
+            from read_gps import init_gps # only imported if GPS is configured
             init_gps(gpsSensor)
             tgpstimesync = threading.Thread(target=gpstimesync, args=(gpsSensor, None))
             tgpstimesync.start()
@@ -356,8 +372,9 @@ def main():
             logger.debug("Set initial state of isMaintenanceActive: '" + str(superglobal.isMaintenanceActive) + "'")
         #measurement_stop = threading.Event() '''Required here? already in global definition!'''# create event to stop measurement
 
-        # Call wvdial for surfsticks
-        connect_internet_modem(settings)
+        # Call wvdial for surfsticks (in single measurement mode already started by the network thread)
+        if oneshot is None:
+            connect_internet_modem(settings)
 
         # check undervoltage for since system start
         check_undervoltage()
@@ -383,35 +400,39 @@ def main():
         tblink = threading.Thread(target=blink_led, args = (GPIO_LED,))
         tblink.start()
 
-        # Reading time from GPS if connected and configured
-        if len(gpsSensors) >= 1:
-            tgpstimesync.join(timeout=25)
-            if tgpstimesync.is_alive():
-                logger.warning("Thread to syncronize time with GPS is still not finished!")
-
-        # Reading time from NTP Servers if connected to network
-        if settings["offline"] != 3:
-            ttimesync.join(timeout=25)
-            if ttimesync.is_alive():
-                logger.warning("Thread to syncronize time with NTP Server is still not finished!")
-
-        if (not is_system_datetime_valid()):
-            if len(gpsSensors) >= 1 and tgpstimesync.is_alive():
-                logger.critical("Systemtime is still invalid! Waiting another 35 seconds for Thread to syncronize time with GPS")
-                tgpstimesync.join(timeout=35)
+        # in single measurement mode the upload waits for the time synchronisation itself, only if required
+        if oneshot is None:
+            # Reading time from GPS if connected and configured
+            if len(gpsSensors) >= 1:
+                tgpstimesync.join(timeout=25)
                 if tgpstimesync.is_alive():
                     logger.warning("Thread to syncronize time with GPS is still not finished!")
-            elif settings["offline"] != 3 and ttimesync.is_alive():
-                logger.critical("Systemtime is still invalid! Waiting another 35 seconds for Thread to syncronize time with NTP Servers")
-                ttimesync.join(timeout=35)
+
+            # Reading time from NTP Servers if connected to network
+            if settings["offline"] != 3:
+                ttimesync.join(timeout=25)
                 if ttimesync.is_alive():
                     logger.warning("Thread to syncronize time with NTP Server is still not finished!")
-            else:
-                logger.critical("All options to synchonize time failed and systemtime is still invalid")
 
-        # start as seperate background thread
-        # because Taster pressing was not recognised
-        measurement = threading.Thread(target=start_measurement, args=(measurement_stop,))
+            if (not is_system_datetime_valid()):
+                if len(gpsSensors) >= 1 and tgpstimesync.is_alive():
+                    logger.critical("Systemtime is still invalid! Waiting another 35 seconds for Thread to syncronize time with GPS")
+                    tgpstimesync.join(timeout=35)
+                    if tgpstimesync.is_alive():
+                        logger.warning("Thread to syncronize time with GPS is still not finished!")
+                elif settings["offline"] != 3 and ttimesync.is_alive():
+                    logger.critical("Systemtime is still invalid! Waiting another 35 seconds for Thread to syncronize time with NTP Servers")
+                    ttimesync.join(timeout=35)
+                    if ttimesync.is_alive():
+                        logger.warning("Thread to syncronize time with NTP Server is still not finished!")
+                else:
+                    logger.critical("All options to synchonize time failed and systemtime is still invalid")
+
+            # start as seperate background thread
+            # because Taster pressing was not recognised
+            measurement = threading.Thread(target=start_measurement, args=(measurement_stop,))
+        else:
+            measurement = threading.Thread(target=oneshot.run, args=(measurement_stop, ttimesync if settings["offline"] != 3 else None))
         measurement.start() # start measurement
 
         # Main Lopp: Cancel with STRG+C
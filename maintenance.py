@@ -42,7 +42,7 @@ def maintenance(maintenance_stop, measurement_stop):
         logger.debug('Now we measure the hx to determine start values')
         #weightbefore = []
         #weightafter = []
-        start_single()
+        start_single(weightSensors)
         for (i, weight_sensor) in enumerate(weightSensors):
             weight=measure_weight(weight_sensor)
             weight_sensor["weightbefore"] = weight
@@ -66,8 +66,8 @@ def maintenance(maintenance_stop, measurement_stop):
             time.sleep(1)
 
         logger.debug('Now we measure the hx again to determine end values')
-        start_single()
         settings = get_settings()
+        start_single(get_sensors(settings, 2))
         #weightSensors = get_sensors(settings, 2)
         #for (i, weight_sensor) in enumerate(weightSensors):
         sensors = []
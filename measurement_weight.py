@@ -13,7 +13,7 @@ logger = logging.getLogger('HoneyPi.measurement_weight')
 @blockPrinting
 def get_weight(sensor):
     try:
-        start_single()
+        start_single([sensor])
         weight = measure_weight(sensor)
         stop_single()
 
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Long-lived measurement process.
+# The worker initializes the sensors once and keeps the handles (HX711, BME680 incl. gas baseline, GPS)
+# for its whole lifetime. Measurements are requested over a pipe. If a measurement hangs,
+# only the worker is restarted, the measurement routine in the main process keeps running.
+
+import time
+import logging
+from multiprocessing import Process, Pipe
+
+logger = logging.getLogger('HoneyPi.measurement_worker')
+
+def worker_loop(conn, init_function, init_args, measure_function, close_function=None):
+    context = None
+    try:
+        context = init_function(*init_args)
+    except Exception as ex:
+        logger.exception("Unhandled Exception while initializing measurement worker")
+    conn.send(('ready',))
+
+    while True:
+        try:
+            command = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if command[0] == 'measure':
+            start = time.monotonic()
+            result = None
+            try:
+                result = measure_function(context, *command[1])
+            except Exception as ex:
+                logger.exception("Unhandled Exception in measurement worker")
+            conn.send(('done', time.monotonic() - start, result))
+        elif command[0] == 'stop':
+            break
+    if close_function is not None:
+        try:
+            close_function(context)
+        except Exception as ex:
+            logger.exception("Unhandled Exception while closing measurement worker")
+    conn.close()
+
+
+class MeasurementWorker:
+    def __init__(self, init_function, init_args, measure_function, close_function=None, name='HoneyPi-measurement'):
+        self._init_function = init_function
+        self._init_args = init_args
+        self._measure_function = measure_function
+        self._close_function = close_function
+        self._name = name
+        self._process = None
+        self._conn = None
+        self._busy = False
+        self._started = None
+        self.restarts = 0
+        self.measurements = 0 # finished measurements
+        self.last_duration = None
+        self.last_result = None
+
+    def start(self):
+        parent_conn, child_conn = Pipe()
+        self._process = Process(target=worker_loop, name=self._name, args=(child_conn, self._init_function, self._init_args, self._measure_function, self._close_function))
+        self._process.daemon = True
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        self._busy = False
+        logger.debug("Measurement worker started with PID " + str(self._process.pid))
+
+    def is_alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def is_busy(self):
+        self.poll()
+        return self._busy
+
+    def busy_since(self):
+        if self._busy and self._started is not None:
+            return time.monotonic() - self._started
+        return 0
+
+    def measure(self, *args):
+        """ Request a new measurement. Returns False if the previous one is still running. """
+        if not self.is_alive():
+            logger.warning("Measurement worker is not running, starting it again.")
+            self.start()
+        if self.is_busy():
+            return False
+        self._conn.send(('measure', args))
+        self._busy = True
+        self._started = time.monotonic()
+        return True
+
+    def poll(self, timeout=0):
+        """ Process all messages from the worker. Returns True if no measurement is pending anymore. """
+        try:
+            while self._conn is not None and self._conn.poll(timeout):
+                message = self._conn.recv()
+                if message[0] == 'ready':
+                    logger.debug("Measurement worker finished initializing sensors.")
+                elif message[0] == 'done':
+                    self._busy = False
+                    self.measurements += 1
+                    self.last_duration = message[1]
+                    self.last_result = message[2]
+                    logger.debug("Measurement worker finished measurement in " + str(round(self.last_duration, 2)) + " seconds.")
+                    return True
+        except (EOFError, OSError):
+            logger.error("Connection to measurement worker lost.")
+            self._busy = False
+        return not self._busy
+
+    def wait(self, timeout):
+        """ Wait until a pending measurement finished. Returns False on timeout. """
+        end = time.monotonic() + timeout
+        while self._busy:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return False
+            if not self.is_alive():
+                self._busy = False
+                break
+            self.poll(min(remaining, 1))
+        return True
+
+    def restart(self):
+        """ Watchdog: kill the hanging worker and start a new one. """
+        logger.warning("Measurement is still not finished after " + str(round(self.busy_since())) + " seconds. Restarting measurement worker.")
+        self.restarts += 1
+        self._kill()
+        self.start()
+
+    def stop(self, timeout=5):
+        if self._process is None:
+            return
+        try:
+            if self.is_alive():
+                self._conn.send(('stop',))
+                self._process.join(timeout)
+        except (BrokenPipeError, OSError):
+            pass
+        self._kill()
+        logger.debug("Measurement worker stopped.")
+
+    def _kill(self):
+        if self._process is not None and self._process.is_alive():
+            self._process.terminate()
+            self._process.join(1)
+        if self._conn is not None:
+            self._conn.close()
+        self._process = None
+        self._conn = None
+        self._busy = False
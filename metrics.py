@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Timing metrics of the measurement cycles.
+# During a cycle the durations (seconds) and counters (e.g. retries) are collected with
+# timer(), record() and count(). finish_cycle() adds them to a small json file which keeps
+# the last WINDOW values of every metric, so p50/p95/max can be shown without DEBUG logging.
+#
+# Usage: python3 metrics.py [filter] [--json] [--reset]
+
+import argparse
+import json
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+from constant import metricsFile
+
+logger = logging.getLogger('HoneyPi.metrics')
+
+WINDOW = 288 # values kept per metric, one day with an interval of 5 minutes
+
+_current = None # metrics of the running cycle
+_lock = threading.Lock()
+
+def start_cycle():
+    global _current
+    with _lock:
+        _current = {}
+    return _current
+
+def record(name, seconds):
+    """ Add a duration to the running cycle. Values with the same name are summed up. """
+    with _lock:
+        if _current is not None:
+            _current[name] = _current.get(name, 0) + seconds
+
+def count(name, value=1):
+    record(name, value)
+
+@contextmanager
+def timer(name):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        record(name, time.monotonic() - start)
+
+def finish_cycle(file=metricsFile):
+    """ Store the metrics of the running cycle. """
+    global _current
+    with _lock:
+        cycle = _current
+        _current = None
+    if not cycle:
+        return
+    try:
+        data = load_metrics(file)
+        data['cycles'] = data.get('cycles', 0) + 1
+        data['updated'] = int(time.time())
+        for (name, value) in cycle.items():
+            values = data['metrics'].setdefault(name, [])
+            values.append(round(value, 3))
+            del values[:-WINDOW]
+        save_metrics(data, file)
+    except Exception as ex:
+        logger.exception("Exception in finish_cycle")
+
+def load_metrics(file=metricsFile):
+    try:
+        with open(file, 'r') as f:
+            data = json.load(f)
+        if 'metrics' in data:
+            return data
+    except FileNotFoundError:
+        pass
+    except ValueError:
+        logger.warning("Metrics file '" + file + "' is corrupt and will be reset.")
+    return {'cycles': 0, 'metrics': {}}
+
+def save_metrics(data, file=metricsFile):
+    # write to a temporary file first, so a power cut does not leave a half written file
+    tmp = file + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write(json.dumps(data, separators=(',', ':')))
+    os.replace(tmp, file)
+
+def percentile(values, p):
+    # nearest rank
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def summary(data, name_filter=None):
+    """ Returns a dict metric -> {count, last, p50, p95, max}. """
+    result = {}
+    for (name, values) in sorted(data['metrics'].items()):
+        if not values or (name_filter and name_filter not in name):
+            continue
+        result[name] = {'count': len(values), 'last': values[-1], 'p50': percentile(values, 50), 'p95': percentile(values, 95), 'max': max(values)}
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Show timing metrics of the last measurement cycles.')
+    parser.add_argument('filter', nargs='?', help='only show metrics containing this text, e.g. dht or sensor.hx711')
+    parser.add_argument('--json', action='store_true', help='print as json')
+    parser.add_argument('--reset', action='store_true', help='delete all stored metrics')
+    parser.add_argument('--file', default=metricsFile)
+    args = parser.parse_args()
+
+    if args.reset:
+        if os.path.exists(args.file):
+            os.remove(args.file)
+        print('Metrics deleted.')
+        return
+
+    data = load_metrics(args.file)
+    result = summary(data, args.filter)
+    if args.json:
+        print(json.dumps(result, indent=4))
+        return
+    print(str(data.get('cycles', 0)) + ' cycles, last update: ' + (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(data['updated'])) if 'updated' in data else '-'))
+    print('metric'.ljust(32) + 'count'.rjust(7) + 'last'.rjust(10) + 'p50'.rjust(10) + 'p95'.rjust(10) + 'max'.rjust(10))
+    for (name, stats) in result.items():
+        print(name.ljust(32) + str(stats['count']).rjust(7) + ''.join(str(stats[key]).rjust(10) for key in ('last', 'p50', 'p95', 'max')))
+
+if __name__ == '__main__':
+    try:
+        main()
+    except (KeyboardInterrupt, SystemExit):
+        pass
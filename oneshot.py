@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Single measurement after boot for WittyPi duty cycling (interval 1 with shutdown after transfer).
+# Sensor init and measurement, time sync and network bring-up run at the same time, every sensor
+# type is measured as soon as it is initialized (no Ds18b20 warm-up, no measurement worker).
+# After the upload the Raspberry Pi is shut down immediately. The time of every step since
+# kernel boot is written to the timeline file to follow the awake time per wakeup.
+
+import json
+import os
+import threading
+import time
+import logging
+from multiprocessing import Value
+
+import superglobal
+import metrics
+from acquisition import Task, AcquisitionEngine
+from sensor_drivers import create_drivers, close_drivers
+from utilities import connect_internet_modem, wait_for_internet_connection, is_system_datetime_valid, shutdown, check_undervoltage
+from constant import timelineFile
+
+logger = logging.getLogger('HoneyPi.oneshot')
+superglobal = superglobal.SuperGlobal()
+
+INIT_BUDGET = 30 # seconds for the init of a sensor type in addition to its measurement budget
+TIMESYNC_TIMEOUT = 60 # seconds to wait for a valid system time before the upload
+NETWORK_TIMEOUT = 60 # seconds to wait for the internet connection
+TIMELINE_RUNS = 20 # number of boots kept in the timeline file
+
+def uptime():
+    # seconds since kernel boot
+    try:
+        with open('/proc/uptime', 'r') as f:
+            return float(f.readline().split()[0])
+    except Exception as ex:
+        return None
+
+def is_oneshot(settings):
+    from read_and_upload_all import get_measurement_mode
+    isLowVoltage, interval, shutdownAfterTransfer = get_measurement_mode(settings)
+    return interval == 1 and bool(shutdownAfterTransfer)
+
+
+class Timeline:
+    def __init__(self):
+        self._start = time.monotonic()
+        self._offset = uptime() # kernel boot until this process started
+        if self._offset is None:
+            self._offset = 0.0
+        self._lock = threading.Lock()
+        self.events = []
+        self.mark('start')
+
+    def mark(self, name):
+        seconds = round(self._offset + time.monotonic() - self._start, 2)
+        with self._lock:
+            self.events.append([name, seconds])
+        logger.debug("Timeline: '" + name + "' after " + str(seconds) + " seconds since boot.")
+
+    def save(self, file=timelineFile):
+        try:
+            runs = []
+            if os.path.exists(file):
+                with open(file, 'r') as f:
+                    runs = json.load(f)
+            runs.append({'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'events': self.events})
+            del runs[:-TIMELINE_RUNS]
+            with open(file, 'w') as f:
+                f.write(json.dumps(runs, indent=1))
+        except Exception as ex:
+            logger.exception("Exception while saving timeline")
+
+
+class OneShot:
+    def __init__(self, settings, debug):
+        self.settings = settings
+        self.debug = debug
+        self.timeline = Timeline()
+        self.ts_fields = {}
+        self._sensors = None
+        self._network = None
+
+    def start(self):
+        """ Start measuring and bringing up the network in the background. """
+        self._sensors = threading.Thread(target=self._measure, name='oneshot-sensors')
+        self._sensors.start()
+        self._network = threading.Thread(target=self._connect, name='oneshot-network')
+        self._network.start()
+
+    def _connect(self):
+        if self.settings["offline"] == 3:
+            return
+        connect_internet_modem(self.settings)
+        if wait_for_internet_connection(NETWORK_TIMEOUT):
+            self.timeline.mark('network up')
+        else:
+            self.timeline.mark('network timeout')
+
+    def _measure(self):
+        try:
+            metrics.start_cycle()
+            drivers = create_drivers(self.settings, isolate=False)
+            cycle_data = {'ds18b20_estimates': None}
+            # one task per sensor type: init and measure right after, other sensor types run at the same time
+            tasks = []
+            for driver in drivers:
+                budget = INIT_BUDGET + driver.budget * len(driver.sensors)
+                if driver.name == 'gps':
+                    budget += sum(driver.get_budget(sensor) for sensor in driver.sensors)
+                tasks.append(Task(driver.name, driver.resource(driver.sensors[0]), self._init_and_measure, (driver, cycle_data), driver.all_produces(), driver.all_requires(), driver.exclusive, driver.order, budget=budget))
+            engine = AcquisitionEngine(tasks)
+            self.ts_fields = engine.run()
+            status = engine.get_status()
+            if status:
+                self.ts_fields['status'] = status
+            metrics.record('acquisition', engine.duration)
+            close_drivers(drivers)
+        except Exception as ex:
+            logger.exception("Unhandled Exception in oneshot measurement")
+        self.timeline.mark('sensors measured')
+
+    def _init_and_measure(self, ts_fields, driver, cycle_data):
+        driver.init()
+        if driver.name == 'pcf8591':
+            from read_pcf8591 import get_raw_voltage
+            for pcf8591Sensor in driver.sensors:
+                get_raw_voltage(pcf8591Sensor) # initial measurement as first measurement is always wrong
+        self.timeline.mark('init ' + driver.name)
+        if driver.name == 'gps':
+            # the GPS is also used to set the time, which runs on the same bus before the position is read
+            from read_gps import timesync_gps
+            for gpsSensor in driver.sensors:
+                timesync_gps(gpsSensor)
+            self.timeline.mark('gps timesync')
+        fields = {}
+        for task in driver.tasks(cycle_data):
+            start = time.monotonic()
+            result = task.function(dict(ts_fields, **fields), *task.args)
+            metrics.record('sensor.' + task.name, time.monotonic() - start)
+            if result:
+                fields.update(result)
+        self.timeline.mark('measured ' + driver.name)
+        return fields
+
+    def run(self, measurement_stop, timesync_thread=None):
+        """ Wait for the measurement, time and network, upload and shut down. """
+        from read_and_upload_all import upload_fields, check_wittypi_voltage, get_measurement_mode
+        try:
+            self._sensors.join()
+
+            # the timestamp of the upload needs a valid system time (RTC, NTP or GPS)
+            if timesync_thread is not None and not is_system_datetime_valid():
+                logger.warning("Waiting up to " + str(TIMESYNC_TIMEOUT) + " seconds for time synchronisation before upload.")
+                timesync_thread.join(timeout=TIMESYNC_TIMEOUT)
+            self.timeline.mark('time valid' if is_system_datetime_valid() else 'time invalid')
+
+            self._network.join()
+            if len(self.ts_fields) > 0:
+                context = {'settings': self.settings, 'debug': self.debug, 'connectionErrors': Value('i', 0)}
+                upload_fields(context, self.ts_fields)
+                self.timeline.mark('uploaded')
+            else:
+                logger.warning("No measurement data to send.")
+            metrics.finish_cycle()
+            check_undervoltage('0x7')
+
+            # switch between normal and low voltage mode for the next wakeup
+            wittyPi = self.settings["wittyPi"]
+            if wittyPi["voltagecheck_enabled"] and wittyPi["enabled"]:
+                isLowVoltage, interval, shutdownAfterTransfer = get_measurement_mode(self.settings)
+                pcf8591Sensors = [sensor for sensor in self.settings.get("sensors", []) if sensor.get("type") == 6]
+                check_wittypi_voltage(wittyPi, pcf8591Sensors, isLowVoltage, interval, shutdownAfterTransfer)
+        except Exception as ex:
+            logger.exception("Unhandled Exception in oneshot")
+
+        measurement_stop.set()
+        if superglobal.isMaintenanceActive is None:
+            superglobal.isMaintenanceActive = False
+        while superglobal.isMaintenanceActive:
+            logger.info("Shutting down was set but Maintenance mode is active, delaying shutdown!")
+            time.sleep(10)
+        self.timeline.mark('shutdown')
+        self.timeline.save()
+        logger.info("Single measurement finished => shutdown.")
+        shutdown(self.settings)
@@ -2,17 +2,16 @@
 #!/usr/bin/python3
 #  Based on: https://github.com/gejanssen/aht10-python
 
-import smbus
 import time
 import logging
-from sensors.sensor_utilities import get_smbus
+from sensors.i2c_bus import get_bus
 
 logger = logging.getLogger('HoneyPi.read_aht10')
 
 DEVICE = 0x38 # Default device I2C address
 
 def read_aht10(addr=DEVICE):
-    bus = smbus.SMBus(get_smbus())
+    bus = get_bus()
     # init & read
     config = [0x08, 0x00]
     MeasureCmd = [0x33, 0x00]
@@ -12,28 +12,34 @@ from datetime import datetime, timedelta
 import logging
 
 from pprint import pprint
-from multiprocessing import Process, Queue, Value
+from multiprocessing import Value
 
 import RPi.GPIO as GPIO
 import requests
 import json
 
 from read_pcf8591 import get_raw_voltage
-from read_bme680 import initBME680FromMain, burn_in_bme680, burn_in_time
-from read_ds18b20 import read_unfiltered_temperatur_values, filtered_temperature, checkIfSensorExistsInArray
-from read_hx711 import init_hx711
-from read_gps import init_gps
+from ds18b20_sampler import DS18B20Sampler, SAMPLING_INTERVAL as DS18B20_SAMPLING_INTERVAL
 
-from read_settings import get_settings, get_sensors
+from read_settings import get_settings
+from sensor_drivers import partition_sensors, create_drivers, init_drivers, close_drivers
 from utilities import reboot, shutdown, start_single, stop_single, clean_fields, getStateFromStorage, setStateToStorage, blink_led, check_undervoltage, thingspeak_datetime
 from wittypiutilities import update_wittypi_schedule
 from write_csv import write_csv
 from measurement import measure_all_sensors
 from thingspeak import transfer_all_channels_to_ts
+from scheduler import Scheduler
+from measurement_worker import MeasurementWorker
+from cycle_policy import CyclePolicy
+from readings_store import store_readings
+import metrics
 
 logger = logging.getLogger('HoneyPi.read_and_upload_all')
 superglobal = superglobal.SuperGlobal()
 
+DS18B20_WARMUP_SAMPLES = 6 # we want to get 6 values before we can filter some out
+VOLTAGE_CHECK_INTERVAL = 60 # seconds
+
 def manage_transfer_to_ts(ts_channels, ts_fields, server_url, offline, debug, ts_datetime):
     try:
         # update ThingSpeak / transfer values
@@ -50,134 +56,170 @@ def manage_transfer_to_ts(ts_channels, ts_fields, server_url, offline, debug, ts
     except Exception as ex:
         logger.exception("Exception during manage_transfer_to_ts")
 
-def measure(q, offline, debug, ts_channels, ts_server_url, filtered_temperature, ds18b20Sensors, bme680Sensors, bme680Inits, dhtSensors, aht10Sensors, sht31Sensors, sht25Sensors, hdc1008Sensors, bh1750Sensors, tcSensors, bme280Sensors, pcf8591Sensors, ee895Sensors, gpsSensors, weightSensors, hxInits, connectionErrors, measurementIsRunning, settings):
-    measurementIsRunning.value = 1 # set flag
+def init_sensors(settings, debug, connectionErrors, partitions=None):
+    # runs once within the measurement worker, the returned context is kept for the lifetime of the worker
+    context = {}
+    context['settings'] = settings
+    context['debug'] = debug
+    context['connectionErrors'] = connectionErrors
+    # create and initialize only the configured sensors (BME680 burn-in, GPS, HX711)
+    context['drivers'] = init_drivers(create_drivers(settings, partitions))
+    return context
+
+def close_sensors(context):
+    if context is not None:
+        close_drivers(context['drivers'])
+
+def measure(context, ds18b20_estimates, isMaintenanceActive, cycle_options=None):
+    # runs within the measurement worker for every measurement
+    debug = context['debug']
+    superglobal.isMaintenanceActive = isMaintenanceActive # the worker process has its own copy of the superglobals
     ts_fields = {}
+    cycle_start = time.monotonic()
+    metrics.start_cycle()
     try:
-        ts_fields, bme680Inits = measure_all_sensors(debug, filtered_temperature, ds18b20Sensors, bme680Sensors, bme680Inits, dhtSensors, aht10Sensors, sht31Sensors, sht25Sensors, hdc1008Sensors, bh1750Sensors, tcSensors, bme280Sensors, pcf8591Sensors, ee895Sensors, gpsSensors, weightSensors, hxInits)
+        ts_fields = measure_all_sensors(debug, context['drivers'], ds18b20_estimates, cycle_options)
         if len(ts_fields) > 0:
-            ts_datetime=thingspeak_datetime()
-            if offline == 1 or offline == 3:
-                try:
-                    s = write_csv(ts_fields, ts_channels, ts_datetime)
-                    if s and debug:
-                        logger.info("Data succesfully saved to CSV-File.")
-                except Exception as ex:
-                    logger.exception("Exception in measure / write_csv")
-
-            # if transfer to thingspeak is set
-            if (offline == 0 or offline == 1 or offline == 2) and ts_channels:
-                # update ThingSpeak / transfer values
-                connectionErrorHappened = manage_transfer_to_ts(ts_channels, ts_fields, ts_server_url, offline, debug, ts_datetime)
-
-                if connectionErrorHappened:
-                    MAX_RETRIES_IN_A_ROW = 3
-                    # Do Rebooting if to many connectionErrors in a row
-                    connectionErrors.value +=1
-                    logger.error("Failed internet connection. Count: " + str(connectionErrors.value) + "/" + str(MAX_RETRIES_IN_A_ROW))
-                    if connectionErrors.value >= MAX_RETRIES_IN_A_ROW:
-                        if not debug:
-                            logger.critical("Too many Connection Errors in a row => Rebooting Raspberry")
-                            time.sleep(4)
-                            if superglobal.isMaintenanceActive is None:
-                                superglobal.isMaintenanceActive = False
-                                logger.warning("Set initial state of isMaintenanceActive in read and uplodd: '" + str(superglobal.isMaintenanceActive) + "'")
-                            logger.debug("Value of 'isMaintenanceActive' is: " + str(superglobal.isMaintenanceActive))
-                            while superglobal.isMaintenanceActive:
-                                logger.info("Too many Connection Errors in a row but rebooting delayed due to maintenance mode is active!")
-                                logger.debug("Value of 'isMaintenanceActive' is: " + str(superglobal.isMaintenanceActive))
-                                time.sleep(10)
-                            reboot(settings)
-                        else:
-                            logger.critical("Too many Connection Errors in a row but did not reboot because console debug mode is enabled.")
-                else:
-                    if connectionErrors.value > 0:
-                        if debug:
-                            logger.warning("Connection Errors (" + str(connectionErrors.value) + ") Counting resetet because transfer succeded.")
-                        # reset connectionErrors because transfer succeded
-                        connectionErrors.value = 0
-
+            upload_fields(context, ts_fields)
         elif debug:
             logger.info("No measurement data to send.")
 
     except Exception as ex:
         logger.exception("Exception during measure (outer).")
-    measurementIsRunning.value = 0 # clear flag
+    metrics.record('cycle', time.monotonic() - cycle_start)
+    metrics.finish_cycle()
+    return len(ts_fields)
+
+def upload_fields(context, ts_fields):
+    # save measured values to CSV and transfer them to ThingSpeak
+    settings = context['settings']
+    debug = context['debug']
+    connectionErrors = context['connectionErrors']
+    offline = settings["offline"] # flag to enable offline csv storage
+    ts_channels = settings["ts_channels"] # ThingSpeak data (ts_channel_id, ts_write_key)
+    ts_server_url = settings["ts_server_url"]
+    ts_datetime=thingspeak_datetime()
+    # latest values for OLed, webinterface and CLI
+    store_readings(ts_fields)
+    if offline == 1 or offline == 3:
+        try:
+            with metrics.timer('csv'):
+                s = write_csv(ts_fields, ts_channels, ts_datetime)
+            if s and debug:
+                logger.info("Data succesfully saved to CSV-File.")
+        except Exception as ex:
+            logger.exception("Exception in measure / write_csv")
 
+    # if transfer to thingspeak is set
+    if (offline == 0 or offline == 1 or offline == 2) and ts_channels:
+        # update ThingSpeak / transfer values
+        with metrics.timer('upload'):
+            connectionErrorHappened = manage_transfer_to_ts(ts_channels, ts_fields, ts_server_url, offline, debug, ts_datetime)
 
-def check_wittypi_voltage(time_measured_Voltage, wittyPi, pcf8591Sensors, isLowVoltage, interval, shutdownAfterTransfer, pcf8591Sensorforvoltagecheck=0):
+        if connectionErrorHappened:
+            MAX_RETRIES_IN_A_ROW = 3
+            # Do Rebooting if to many connectionErrors in a row
+            connectionErrors.value +=1
+            logger.error("Failed internet connection. Count: " + str(connectionErrors.value) + "/" + str(MAX_RETRIES_IN_A_ROW))
+            if connectionErrors.value >= MAX_RETRIES_IN_A_ROW:
+                if not debug:
+                    logger.critical("Too many Connection Errors in a row => Rebooting Raspberry")
+                    time.sleep(4)
+                    if superglobal.isMaintenanceActive is None:
+                        superglobal.isMaintenanceActive = False
+                        logger.warning("Set initial state of isMaintenanceActive in read and uplodd: '" + str(superglobal.isMaintenanceActive) + "'")
+                    logger.debug("Value of 'isMaintenanceActive' is: " + str(superglobal.isMaintenanceActive))
+                    while superglobal.isMaintenanceActive:
+                        logger.info("Too many Connection Errors in a row but rebooting delayed due to maintenance mode is active!")
+                        logger.debug("Value of 'isMaintenanceActive' is: " + str(superglobal.isMaintenanceActive))
+                        time.sleep(10)
+                    metrics.finish_cycle()
+                    reboot(settings)
+                else:
+                    logger.critical("Too many Connection Errors in a row but did not reboot because console debug mode is enabled.")
+        else:
+            if connectionErrors.value > 0:
+                if debug:
+                    logger.warning("Connection Errors (" + str(connectionErrors.value) + ") Counting resetet because transfer succeded.")
+                # reset connectionErrors because transfer succeded
+                connectionErrors.value = 0
+
+def check_wittypi_voltage(wittyPi, pcf8591Sensors, isLowVoltage, interval, shutdownAfterTransfer, pcf8591Sensorforvoltagecheck=0):
     try:
         if wittyPi["voltagecheck_enabled"] and wittyPi["enabled"]:
-            intervalVoltageCheck = 60
             time_now = time.time()
-            isTimeToCheckVoltage = (time_now-time_measured_Voltage >= intervalVoltageCheck)
-            if isTimeToCheckVoltage:
-                if pcf8591Sensors and len(pcf8591Sensors) > 0:
-                    logger.debug(str(pcf8591Sensors[pcf8591Sensorforvoltagecheck]))
-                    voltage = get_raw_voltage(pcf8591Sensors[pcf8591Sensorforvoltagecheck])
-                    if voltage is not None:
-                        now = time.strftime("%H:%M", time.localtime(time_now))
-                        logger.debug("Voltage Check at " + str(now) + ": " + str(voltage) + " Volt")
-                        if voltage <= wittyPi["low"]["voltage"]:
-                            if (isLowVoltage == False) or (isLowVoltage is None):
-                                logger.debug("Running on low voltage, was above low voltage last measurement!")
-                                if wittyPi["low"]["enabled"]:
-                                    logger.info("Enable wittyPi low voltage settings!")
-                                    update_wittypi_schedule(wittyPi["low"]["schedule"])
-                                else:
-                                    logger.warning("Low voltage but wittyPi disabled!")
-                                    update_wittypi_schedule("")
-                                interval = wittyPi["low"]["interval"]
-                                shutdownAfterTransfer = wittyPi["low"]["shutdownAfterTransfer"]
-                                isLowVoltage = setStateToStorage('isLowVoltage', True)
-                                logger.info("New Interval: '" + str(interval) + "', Shutdown after transfer is '" + str(shutdownAfterTransfer)  +"'")
-                            else:
-                                logger.debug("Running on low voltage, was on low voltage last measurement!")
-                        elif voltage < wittyPi["normal"]["voltage"]:
-                            if (isLowVoltage == False) or (isLowVoltage is None):
-                                logger.debug("Not yet low voltage but below recovery voltage")
+            if pcf8591Sensors and len(pcf8591Sensors) > 0:
+                logger.debug(str(pcf8591Sensors[pcf8591Sensorforvoltagecheck]))
+                voltage = get_raw_voltage(pcf8591Sensors[pcf8591Sensorforvoltagecheck])
+                if voltage is not None:
+                    now = time.strftime("%H:%M", time.localtime(time_now))
+                    logger.debug("Voltage Check at " + str(now) + ": " + str(voltage) + " Volt")
+                    if voltage <= wittyPi["low"]["voltage"]:
+                        if (isLowVoltage == False) or (isLowVoltage is None):
+                            logger.debug("Running on low voltage, was above low voltage last measurement!")
+                            if wittyPi["low"]["enabled"]:
+                                logger.info("Enable wittyPi low voltage settings!")
+                                update_wittypi_schedule(wittyPi["low"]["schedule"])
                             else:
-                                logger.debug("No longer low voltage but recovery / normal voltage not reached")
-                        elif voltage >= wittyPi["normal"]["voltage"]:
-                            if (isLowVoltage == True) or (isLowVoltage is None):
-                                logger.debug("Running on normal voltage, was below recovery / normal voltage last measurement!")
-                                if wittyPi["normal"]["enabled"]:
-                                    logger.info("Enable wittyPi normal voltage settings!")
-                                    update_wittypi_schedule(wittyPi["normal"]["schedule"])
-                                else:
-                                    logger.info("Normal voltage but wittyPi disabled!")
-                                    update_wittypi_schedule("")
-                                    interval = wittyPi["normal"]["interval"]
-                                    shutdownAfterTransfer = wittyPi["normal"]["shutdownAfterTransfer"]
-                                isLowVoltage = setStateToStorage('isLowVoltage', False)
-                                logger.info("New Interval: '" + str(interval) + "', Shutdown after transfer is '" + str(shutdownAfterTransfer)  +"'")
+                                logger.warning("Low voltage but wittyPi disabled!")
+                                update_wittypi_schedule("")
+                            interval = wittyPi["low"]["interval"]
+                            shutdownAfterTransfer = wittyPi["low"]["shutdownAfterTransfer"]
+                            isLowVoltage = setStateToStorage('isLowVoltage', True)
+                            logger.info("New Interval: '" + str(interval) + "', Shutdown after transfer is '" + str(shutdownAfterTransfer)  +"'")
+                        else:
+                            logger.debug("Running on low voltage, was on low voltage last measurement!")
+                    elif voltage < wittyPi["normal"]["voltage"]:
+                        if (isLowVoltage == False) or (isLowVoltage is None):
+                            logger.debug("Not yet low voltage but below recovery voltage")
+                        else:
+                            logger.debug("No longer low voltage but recovery / normal voltage not reached")
+                    elif voltage >= wittyPi["normal"]["voltage"]:
+                        if (isLowVoltage == True) or (isLowVoltage is None):
+                            logger.debug("Running on normal voltage, was below recovery / normal voltage last measurement!")
+                            if wittyPi["normal"]["enabled"]:
+                                logger.info("Enable wittyPi normal voltage settings!")
+                                update_wittypi_schedule(wittyPi["normal"]["schedule"])
                             else:
-                                logger.debug("Running on normal voltage, was on normal voltage last measurement!")
+                                logger.info("Normal voltage but wittyPi disabled!")
+                                update_wittypi_schedule("")
+                                interval = wittyPi["normal"]["interval"]
+                                shutdownAfterTransfer = wittyPi["normal"]["shutdownAfterTransfer"]
+                            isLowVoltage = setStateToStorage('isLowVoltage', False)
+                            logger.info("New Interval: '" + str(interval) + "', Shutdown after transfer is '" + str(shutdownAfterTransfer)  +"'")
                         else:
-                            logger.error("Choosen WittyPi Voltage settings irregular Voltage Normal should be higher than Undervoltage")
+                            logger.debug("Running on normal voltage, was on normal voltage last measurement!")
                     else:
-                        logger.error("Voltagesensor did not return a value!")
+                        logger.error("Choosen WittyPi Voltage settings irregular Voltage Normal should be higher than Undervoltage")
                 else:
-                    logger.error("WittyPi Voltage checks enabled but no pcf8591Sensors configured")
-                    time_measured_Voltage = time.time()
+                    logger.error("Voltagesensor did not return a value!")
             else:
-                logger.debug("No Voltage Check due")
+                logger.error("WittyPi Voltage checks enabled but no pcf8591Sensors configured")
 
-        return (time_measured_Voltage, interval, shutdownAfterTransfer, isLowVoltage)
     except Exception as ex:
         logger.exception("Exception during check_wittypi_voltage")
-        measurementIsRunning.value = 0 # clear flag
+    return (interval, shutdownAfterTransfer, isLowVoltage)
+
+def undervoltage_interval(interval):
+    # check undervoltage together with every measurement, only once if there is only one measurement
+    if interval == 1:
+        return None
+    return interval
+
+def get_measurement_mode(settings):
+    # interval and shutdown of the normal or low voltage mode of the WittyPi settings
+    wittyPi = settings["wittyPi"]
+    isLowVoltage = getStateFromStorage('isLowVoltage', False)
+    if isLowVoltage == True:
+        return isLowVoltage, wittyPi["low"]["interval"], wittyPi["low"]["shutdownAfterTransfer"]
+    return isLowVoltage, wittyPi["normal"]["interval"], wittyPi["normal"]["shutdownAfterTransfer"]
 
 def start_measurement(measurement_stop):
     settings = get_settings()
     try:
-        global burn_in_time
         start_time = time.time()
 
         # load settings
-
-        ts_channels = settings["ts_channels"] # ThingSpeak data (ts_channel_id, ts_write_key)
-        ts_server_url = settings["ts_server_url"]
         debuglevel = settings["debuglevel"]
         if debuglevel <= 10:
             debug = True # flag to enable debug mode (HDMI output enabled and no rebooting)
@@ -185,165 +227,156 @@ def start_measurement(measurement_stop):
             debug = False # flag to enable debug mode (HDMI output enabled and no rebooting)
 
         wittyPi = settings["wittyPi"]
-        offline = settings["offline"] # flag to enable offline csv storage
 
-        isLowVoltage = getStateFromStorage('isLowVoltage', False)
-        if isLowVoltage == True:
-            interval = wittyPi["low"]["interval"]
-            shutdownAfterTransfer = wittyPi["low"]["shutdownAfterTransfer"]
-        else:
-            interval = wittyPi["normal"]["interval"]
-            shutdownAfterTransfer = wittyPi["normal"]["shutdownAfterTransfer"]
+        isLowVoltage, interval, shutdownAfterTransfer = get_measurement_mode(settings)
 
         if debug:
             logger.info("The measurements have started.")
 
         # with process shared variables
         connectionErrors = Value('i',0)
-        measurementIsRunning = Value('i',0)
 
         if interval and not isinstance(interval, int) or interval == 0:
             interval = 0
             logger.info("Stop measurement because interval is null.")
             measurement_stop.set()
 
-        # read configured sensors from settings.json
-        gpsSensors = get_sensors(settings, 99)
-        ds18b20Sensors = get_sensors(settings, 0)
-        bme680Sensors = get_sensors(settings, 1)
-        weightSensors = get_sensors(settings, 2)
-        dhtSensors = get_sensors(settings, 3)
-        tcSensors = get_sensors(settings, 4)
-        bme280Sensors = get_sensors(settings, 5)
-        pcf8591Sensors = get_sensors(settings, 6)
-        ee895Sensors = get_sensors(settings, 7)
-        hdc1008Sensors = get_sensors(settings, 8)
-        sht31Sensors = get_sensors(settings, 9)
-        aht10Sensors = get_sensors(settings, 10)
-        bh1750Sensors = get_sensors(settings, 11)
-        sht25Sensors = get_sensors(settings, 12)
-        bme680Inits = []
-
-        # -- Run Pre Configuration --
-        # if bme680 is configured
-        for (sensorIndex, bme680Sensor) in enumerate(bme680Sensors):
-            bme680Init = {}
-            if 'burn_in_time' in bme680Sensor:
-                burn_in_time = bme680Sensor["burn_in_time"]
-            sensor = initBME680FromMain(bme680Sensor)
-            bme680Init['sensor'] = sensor
-            if 'ts_field_air_quality' in bme680Sensor:
-                gas_baseline = burn_in_bme680(sensor, burn_in_time)
-            else:
-                gas_baseline = None
-            bme680Init['gas_baseline'] = gas_baseline
-            bme680Inits.append(bme680Init)
-
-        # if GPS PA1010D is configured
-        if gpsSensors and len(gpsSensors) == 1:
-            init_gps(gpsSensors[0])
-
-        # if hx711 is set
-        hxInits = []
-        for (i, sensor) in enumerate(weightSensors):
-            _hx = init_hx711(sensor)
-            hxInits.append(_hx)
+        # read configured sensors from settings.json which are used within this process
+        partitions = partition_sensors(settings)
+        ds18b20Sensors = partitions.get(0, [])
+        pcf8591Sensors = partitions.get(6, [])
 
         # PCF8591
         for (i, pcf8591Sensor) in enumerate(pcf8591Sensors):
             voltage = get_raw_voltage(pcf8591Sensor) # initial measurement as first measurement is always wrong
 
-        # -- End Pre Configuration --
-
-        # start at -6 because we want to get 6 values before we can filter some out
-        counter = -6
-        time_measured = 0
-        time_measured_Voltage = 0
-
-        # Main loop which checks every second
-        while not measurement_stop.is_set():
-            counter += 1
-            time_now = time.time()
-
-            for (sensorIndex, sensor) in enumerate(ds18b20Sensors):
-                checkIfSensorExistsInArray(sensorIndex)
-                if 'device_id' in sensor:
-                    read_unfiltered_temperatur_values(sensorIndex, sensor)
-
-            time_measured_Voltage, interval, shutdownAfterTransfer, isLowVoltage = check_wittypi_voltage(time_measured_Voltage, wittyPi, pcf8591Sensors, isLowVoltage, interval, shutdownAfterTransfer)
-
-            # wait seconds of interval before next check
-            # free ThingSpeak account has an upload limit of 15 seconds
-            isTimeToMeasure = ((time_now-time_measured >= interval) or (interval == 1)) and counter > 0
-            if isTimeToMeasure:
-                now = datetime.now()
-                if time_measured == 0:
-                    logger.info("First time doing a measurement. Time is now: " + str(now.strftime('%Y-%m-%d %H:%M')))
-                else:
-                    logger.debug("Last measurement was at " + str(superglobal.lastmeasurement.strftime('%Y-%m-%d %H:%M')))
-                    logger.info("Time over for a new measurement. Time is now: " + str(now.strftime('%Y-%m-%d %H:%M')))
-
-                # Decide if Thread finished and new measurement can be run
-                startNewMeasurement = False
-                if measurementIsRunning.value == 0:
-                    startNewMeasurement = True
-                #if measurementIsRunning.value == 1 and time_measured-interval >= time_now-10*60: #untested
-                #    logger.warning("A previous measurement is still not finished! A measurement propaply cancelled somehow. But we keep measuring because the previous, canceled measurement was 10 minutes ago.")
-                #    startNewMeasurement = True
-
-                # update variables with new timestamps of this new meassurement
-                time_measured = time.time()
-                superglobal.lastmeasurement = now
-                superglobal.nextmeasurement = now + timedelta(seconds=1) * interval
-
-                # TODO Add description what and why this is checked here. What means 0x7?
-                check_undervoltage('0x7')
-
-                if startNewMeasurement:
-                    q = Queue()
-                    p = Process(target=measure, args=(q, offline, debug, ts_channels, ts_server_url, filtered_temperature, ds18b20Sensors, bme680Sensors, bme680Inits, dhtSensors, aht10Sensors, sht31Sensors, sht25Sensors, hdc1008Sensors, bh1750Sensors, tcSensors, bme280Sensors, pcf8591Sensors, ee895Sensors, gpsSensors, weightSensors, hxInits, connectionErrors, measurementIsRunning, settings))
-                    p.start()
-
-                    # determine timeout value for Process.join()
-                    if interval == 1:
-                        timeouttime=timedelta(seconds=300)
-                    else:
-                        timeouttime=superglobal.nextmeasurement - now
-                    logger.debug("Remaining time for measure Process: " + str(timeouttime.total_seconds()) + " seconds")
-                    # Wait at least [300 OR interval seconds] or wait until Process finished but continue with Process. If Process takes longer than timeout, continue but keep Process alive.
-                    p.join(timeout=timeouttime.total_seconds())
-
-                    # kill unfinished Process (e.g. when new DHT lib breaks with print("Unable to set line 4 to input"))
-                    if p.is_alive():
-                        logger.warning("Measurement is still not finished. Killing unfinished measurement process.")
-                        p.terminate()
-                        measurementIsRunning.value = 0
-                        time.sleep(0.1)
-
-                else:
-                    logger.warning("Forerun measurement is not finished yet. Consider increasing interval.")
-
-                # stop measurements after uploading once
+        # the worker initializes all other sensors once and keeps them until the measurement is stopped
+        worker = MeasurementWorker(init_sensors, (settings, debug, connectionErrors, partitions), measure, close_sensors)
+        if interval:
+            worker.start()
+
+        # Ds18b20 are sampled in the background, a measurement takes the filtered values
+        ds18b20_sampler = None
+        if ds18b20Sensors:
+            ds18b20_sampler = DS18B20Sampler(ds18b20Sensors)
+
+        state = {'interval': interval, 'shutdownAfterTransfer': shutdownAfterTransfer, 'isLowVoltage': isLowVoltage, 'first_measurement': True, 'measurements': 0, 'overrun': False}
+        scheduler = Scheduler(measurement_stop)
+        policy = CyclePolicy(interval)
+
+        def check_voltage():
+            interval, state['shutdownAfterTransfer'], state['isLowVoltage'] = check_wittypi_voltage(wittyPi, pcf8591Sensors, state['isLowVoltage'], state['interval'], state['shutdownAfterTransfer'])
+            if interval != state['interval']:
+                state['interval'] = interval
+                policy.set_interval(interval)
+                if interval and isinstance(interval, int):
+                    scheduler.set_interval('measurement', interval)
+                    scheduler.set_interval('undervoltage', undervoltage_interval(interval))
+
+        def check_undervoltage_since_last_check():
+            # TODO Add description what and why this is checked here. What means 0x7?
+            check_undervoltage('0x7')
+
+        def count_overrun():
+            # the watchdog and the next due measurement may both find the same measurement unfinished
+            if not state['overrun']:
+                state['overrun'] = True
+                policy.overrun()
+
+        def check_unfinished_measurement():
+            # kill unfinished worker (e.g. when new DHT lib breaks with print("Unable to set line 4 to input"))
+            if worker.is_busy():
+                count_overrun()
+                worker.restart()
+
+        def run_measurement():
+            interval = state['interval']
+            now = datetime.now()
+            if state['first_measurement']:
+                state['first_measurement'] = False
+                logger.info("First time doing a measurement. Time is now: " + str(now.strftime('%Y-%m-%d %H:%M')))
+            else:
+                logger.debug("Last measurement was at " + str(superglobal.lastmeasurement.strftime('%Y-%m-%d %H:%M')))
+                logger.info("Time over for a new measurement. Time is now: " + str(now.strftime('%Y-%m-%d %H:%M')))
+
+            # update variables with new timestamps of this new meassurement
+            superglobal.lastmeasurement = now
+            superglobal.nextmeasurement = now + timedelta(seconds=1) * interval
+
+            # learn the duration of the last finished measurement
+            busy = worker.is_busy()
+            if worker.measurements > state['measurements']:
+                state['measurements'] = worker.measurements
+                policy.update(worker.last_duration)
+
+            # Start a new measurement if the worker finished the previous one
+            ds18b20_estimates = None
+            cycle_options = policy.next_cycle()
+            if ds18b20_sampler:
+                ds18b20_estimates = ds18b20_sampler.estimates()
+                # sampling happens in this process, the worker adds it to the metrics of the cycle
+                cycle_options['ds18b20_pass'] = ds18b20_sampler.pass_duration
+            if not busy and worker.measure(ds18b20_estimates, superglobal.isMaintenanceActive, cycle_options):
+                state['overrun'] = False
                 if interval == 1:
-                    logger.debug("Only one measurement was set => stop measurements.")
-                    measurement_stop.set()
+                    # Wait at most 300 seconds for the single measurement before shutting down
+                    if not worker.wait(300):
+                        check_unfinished_measurement()
+                else:
+                    # The measurement may run until shortly before the next measurement is due
+                    timeouttime = policy.watchdog_timeout()
+                    logger.debug("Remaining time for measurement: " + str(timeouttime) + " seconds")
+                    scheduler.call_later('measurement_watchdog', timeouttime, check_unfinished_measurement)
 
-                    if shutdownAfterTransfer:
-                        if superglobal.isMaintenanceActive is None:
-                            superglobal.isMaintenanceActive = False
-                            logger.warning("Set initial state of isMaintenanceActive in read and uplodd: '" + str(superglobal.isMaintenanceActive) + "'")
+            else:
+                count_overrun()
+                shift = policy.shift_phase(worker.busy_since())
+                if shift:
+                    # keep the data point and move the following measurements by the same time
+                    logger.warning("Forerun measurement is not finished yet. Shifting measurement by " + str(round(shift, 1)) + " seconds.")
+                    scheduler.reschedule('measurement', shift)
+                    return
+                logger.warning("Forerun measurement is not finished yet. Consider increasing interval.")
+
+            scheduler.log_stats()
+
+            # stop measurements after uploading once
+            if interval == 1:
+                logger.debug("Only one measurement was set => stop measurements.")
+                measurement_stop.set()
+
+                if state['shutdownAfterTransfer']:
+                    if superglobal.isMaintenanceActive is None:
+                        superglobal.isMaintenanceActive = False
+                        logger.warning("Set initial state of isMaintenanceActive in read and uplodd: '" + str(superglobal.isMaintenanceActive) + "'")
+                    logger.debug("Value of 'isMaintenanceActive' is: " + str(superglobal.isMaintenanceActive))
+                    while superglobal.isMaintenanceActive:
+                        logger.info("Shutting down was set but Maintenance mode is active, delaying shutdown!")
                         logger.debug("Value of 'isMaintenanceActive' is: " + str(superglobal.isMaintenanceActive))
-                        while superglobal.isMaintenanceActive:
-                            logger.info("Shutting down was set but Maintenance mode is active, delaying shutdown!")
-                            logger.debug("Value of 'isMaintenanceActive' is: " + str(superglobal.isMaintenanceActive))
-                            time.sleep(10)
-                        logger.info("Shutting down was set => Waiting 10seconds and then shutdown.")
-                        tblink = threading.Thread(target=blink_led, args = (settings["led_pin"], 0.25))
-                        tblink.start()
                         time.sleep(10)
-                        shutdown(settings)
-
-            time.sleep(6) # wait 6 seconds before next measurement check
+                    logger.info("Shutting down was set => Waiting 10seconds and then shutdown.")
+                    tblink = threading.Thread(target=blink_led, args = (settings["led_pin"], 0.25))
+                    tblink.start()
+                    time.sleep(10)
+                    shutdown(settings)
+
+        # Wait for enough Ds18b20 values before the first measurement, so we can filter some out
+        warmup = 0
+        if ds18b20Sensors:
+            warmup = DS18B20_WARMUP_SAMPLES * DS18B20_SAMPLING_INTERVAL
+            ds18b20_sampler.start()
+        if wittyPi["voltagecheck_enabled"] and wittyPi["enabled"]:
+            scheduler.add_job('voltage', check_voltage, VOLTAGE_CHECK_INTERVAL)
+        if interval:
+            # free ThingSpeak account has an upload limit of 15 seconds
+            scheduler.add_job('measurement', run_measurement, interval, delay=warmup)
+            scheduler.add_job('undervoltage', check_undervoltage_since_last_check, undervoltage_interval(interval), delay=warmup)
+
+        # Runs the jobs at their deadlines until measurement_stop is set
+        scheduler.run()
+        if ds18b20_sampler:
+            ds18b20_sampler.stop()
+        worker.stop()
 
         end_time = time.time()
         time_taken = end_time - start_time # time_taken is in seconds
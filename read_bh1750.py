@@ -3,9 +3,9 @@
 #  Based on an article at https://www.raspberry-pi-geek.de/
 #  Modified for HoneyPi
 
-import smbus
 import time
 import logging
+from sensors.i2c_bus import get_bus
 
 logger = logging.getLogger('HoneyPi.read_bh1750')
 
@@ -13,8 +13,6 @@ DEVICE     = 0x23 # 0x5C 
 power_down = 0x00
 power_on   = 0x01
 reset      = 0x07
-bus = smbus.SMBus(1)
-
 def convertToNumber(data):
     result=(data[1] + (256 * data[0])) / 1.2
     return (result)
@@ -32,9 +30,9 @@ def measure_bh1750(ts_sensor):
         #	0x21	 0b00100001 //OTH_2: One Time H-Resolution Mode2
         #	0x23	 0b00100011 //OTL: One Time L-Resolution Mode
         #   For the beginning, the one time high resolution mode (OTH) was chosen.
-        data = bus.read_i2c_block_data(DEVICE, 0x20)  # Start initial measurement
+        data = get_bus().read_i2c_block_data(DEVICE, 0x20)  # Start initial measurement
         time.sleep(0.200) # Measurement take ~120 ms / 200 ms was chosen as a safe value.
-        data = bus.read_i2c_block_data(DEVICE, 0x20) # Collecting the value
+        data = get_bus().read_i2c_block_data(DEVICE, 0x20) # Collecting the value
         # The address must be accessed a 2nd time so that the values are up-to-date.
 
         # ThingSpeak fields
@@ -51,10 +49,10 @@ def measure_bh1750(ts_sensor):
 
 if __name__ == '__main__':
    try:
-        lightLevel=convertToNumber(bus.read_i2c_block_data(DEVICE, 0x20))
+        lightLevel=convertToNumber(get_bus().read_i2c_block_data(DEVICE, 0x20))
         print (format(lightLevel,'.2f') + " lux")
         time.sleep(0.200)
-        lightLevel=convertToNumber(bus.read_i2c_block_data(DEVICE, 0x20))
+        lightLevel=convertToNumber(get_bus().read_i2c_block_data(DEVICE, 0x20))
         print (format(lightLevel,'.2f') + " lux")
 
    except (KeyboardInterrupt, SystemExit):
@@ -4,8 +4,8 @@
 
 import time
 import bme680
-import smbus
-from sensors.sensor_utilities import get_smbus, computeAbsoluteHumidity, isSMBusConnected
+from sensors.sensor_utilities import computeAbsoluteHumidity, isSMBusConnected
+from sensors.i2c_bus import get_bus
 import logging
 
 logger = logging.getLogger('HoneyPi.read_bme680')
@@ -22,13 +22,13 @@ def initBME680(ts_sensor):
                 i2c_addr = ts_sensor["i2c_addr"]
 
             if i2c_addr == "0x76":
-                sensor = bme680.BME680(bme680.I2C_ADDR_PRIMARY)
+                sensor = bme680.BME680(bme680.I2C_ADDR_PRIMARY, get_bus())
             elif i2c_addr == "0x77":
-                sensor = bme680.BME680(bme680.I2C_ADDR_SECONDARY)
+                sensor = bme680.BME680(bme680.I2C_ADDR_SECONDARY, get_bus())
             else:
                 logger.error("Invalid BME680 I2C Adress '" + i2c_addr + "' specified.")
                 # using default I2C address
-                sensor = bme680.BME680(bme680.I2C_ADDR_PRIMARY)
+                sensor = bme680.BME680(bme680.I2C_ADDR_PRIMARY, get_bus())
         except IOError as ex:
             if str(ex) == "[Errno 121] Remote I/O error":
                 logger.error("Initializing BME680 on I2C Adress '" + i2c_addr + "' failed: Most likely wrong Sensor Chip-ID or sensor not connected.")
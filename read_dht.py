@@ -9,6 +9,9 @@
 from utilities import blockPrinting
 import psutil # for process killing (sudo apt-get install python3-psutil)
 import logging
+import metrics
+from acquisition import cancelled
+from realtime import realtime
 logger = logging.getLogger('HoneyPi.read_dht')
 import time
 
@@ -64,7 +67,7 @@ def measure_dht(ts_sensor):
     except:
         logger.error("Exception occured while terminating libgpiod_pulsein. Likely the process was already killed.")
 
-    while timer <= max_timer:
+    while timer <= max_timer and not cancelled():
         try:
             # setup sensor
             if dht_type == 2302:
@@ -74,19 +77,22 @@ def measure_dht(ts_sensor):
             else:
                 dht = adafruit_dht.DHT22(SENSOR_PIN, use_pulseio=True)
 
-            temperature = dht.temperature
-            humidity = dht.humidity
+            with realtime(enabled=ts_sensor.get('realtime', True)):
+                temperature = dht.temperature
+                humidity = dht.humidity
             dht.exit()
             break # break while if no Exception occured
         except RuntimeError as error:
             # Errors happen fairly often, DHT's are hard to read, just keep going
             logger.debug("Failed reading DHT ("+str(timer)+"/"+str(max_timer)+"): " + error.args[0])
+            metrics.count('dht.' + str(pin) + '.retries')
             time.sleep(1)
             timer = timer + 1
             pass
         except:
             # Errors happen fairly often, DHT's are hard to read, just keep going
             logger.debug("Failed reading DHT ("+str(timer)+"/"+str(max_timer)+"): Unhandled Exception")
+            metrics.count('dht.' + str(pin) + '.retries')
             time.sleep(1)
             timer = timer + 1
 
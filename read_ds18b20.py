@@ -3,90 +3,271 @@
 # See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
 
 # read temperature from DS18b20 sensor
-import math
 import os
-import numpy as np
+import statistics
+import time
 from pprint import pprint
 import logging
 from read_gpio import setup_gpio, reset_ds18b20_3V
+from resource_lock import bus_lock, ONEWIRE
 
 logger = logging.getLogger('HoneyPi.read_ds18b12')
 
-unfiltered_values = [] # here we keep all the unfilteres values
-filtered_temperature = [] # here we keep the temperature values after removing outliers
+w1Folder = '/sys/bus/w1/devices/'
+bulk_read_supported = True # w1_therm therm_bulk_read (kernel 5.10 and later), disabled on the first failure
+RESOLUTIONS = (9, 10, 11, 12) # bits, conversion time 94, 188, 375 and 750 ms
+temperature_supported = True # w1_therm temperature attribute (kernel 5.9 and later), disabled if missing
+RESCAN_INTERVAL = 5*60 # seconds, w1Folder is scanned again afterwards
 
-def measure_temperature(sensor):
-    try:
-        try:
-            if 'device_id' not in sensor:
-                sensor["device_id"] = "undefined"
-        except Exception as ex:
-            logger.exception('Unhandled Exception in measure_temperature / device_id')
+# presence cache, a missing sensor is not looked up on every read
+_devices = None # device ids of the last scan, None to scan again
+_scanned_at = 0
+_masters = {} # device id -> bus master folder
+_powered_pins = set() # GPIOs set up as 3.3V power source
+_reset_at = {} # GPIO -> scan of the last power reset
+_resolution_checked = {} # device id -> scan of the last resolution check
 
+def scan_devices(force=False):
+    """ Device ids in w1Folder, scanned again after RESCAN_INTERVAL seconds, with force or after a failed read. """
+    global _devices, _scanned_at
+    now = time.monotonic()
+    if force or _devices is None or now - _scanned_at > RESCAN_INTERVAL:
         try:
-            if 'pin' in sensor:
-                gpio_3V = int(sensor["pin"])
-                if gpio_3V > 0:
+            _devices = set(os.listdir(w1Folder))
+        except FileNotFoundError:
+            _devices = set() # 1-wire is not enabled
+        _scanned_at = now
+        _masters.clear()
+    return _devices
+
+def device_present(device_id):
+    return device_id in scan_devices()
+
+def invalidate_devices():
+    # the next read scans the devices again
+    global _devices
+    _devices = None
 
+def prepare_sensor(sensor):
+    try:
+        if 'device_id' not in sensor:
+            sensor["device_id"] = "undefined"
+    except Exception as ex:
+        logger.exception('Unhandled Exception in measure_temperature / device_id')
+
+    try:
+        if 'pin' in sensor:
+            gpio_3V = int(sensor["pin"])
+            if gpio_3V > 0:
+                if gpio_3V not in _powered_pins:
                     logger.debug("GPIO" + str(gpio_3V) + " is defined as 3.3V power source for Ds18b20 '" + sensor["device_id"] + "'")
                     setup_gpio(gpio_3V)
+                    _powered_pins.add(gpio_3V)
 
-                    if not os.path.isdir("/sys/bus/w1/devices/" + sensor["device_id"]):
-                        logger.warning("Resetting 3.3V GPIO" + str(gpio_3V) + " because Ds18b20 with device-id '" + sensor["device_id"] + "' was missing.")
-                        reset_ds18b20_3V(gpio_3V)
-        except Exception as ex:
-            logger.exception('Unhandled Exception in measure_temperature / pin')
+                # a missing sensor is reset once per scan, not on every read
+                if not device_present(sensor["device_id"]) and _reset_at.get(gpio_3V) != _scanned_at:
+                    logger.warning("Resetting 3.3V GPIO" + str(gpio_3V) + " because Ds18b20 with device-id '" + sensor["device_id"] + "' was missing.")
+                    reset_ds18b20_3V(gpio_3V)
+                    scan_devices(True)
+                    _reset_at[gpio_3V] = _scanned_at
+    except Exception as ex:
+        logger.exception('Unhandled Exception in measure_temperature / pin')
 
+    try:
+        # the resolution is lost on a power cycle, the temperature attribute does not contain it
+        device_id = sensor["device_id"]
+        if device_id != "undefined" and _resolution_checked.get(device_id) != _scanned_at and device_present(device_id):
+            set_resolution(sensor)
+            _resolution_checked[device_id] = _scanned_at
+    except Exception as ex:
+        logger.exception('Unhandled Exception in measure_temperature / resolution')
+
+def read_temperature(sensor):
+    global temperature_supported
+    device_id = sensor["device_id"]
+    if device_id == "undefined":
+        return None
+    if not device_present(device_id):
+        logger.warning('Cannot find Device-ID from Ds18b20 Sensor ' + device_id)
+        return None
+    if temperature_supported:
+        # millidegrees, the kernel checks the CRC (EIO on failure) and converts negative temperatures
         try:
-            if sensor["device_id"] != "undefined":
-                # read 1-wire slave file
-                with open('/sys/bus/w1/devices/' + sensor["device_id"] + '/w1_slave', 'r') as file:
-                    file_content = file.read()
-                    file.close()
+            with open(w1Folder + device_id + '/temperature', 'r') as file:
+                temperature = round(int(file.read()) / 1000, 1)
+            check_resolution_attribute(sensor)
+            return temperature
+        except FileNotFoundError:
+            if not os.path.isdir(w1Folder + device_id):
+                invalidate_devices()
+                logger.warning('Cannot find Device-ID from Ds18b20 Sensor ' + device_id)
+                return None
+            logger.info('w1_therm temperature attribute is not supported by the kernel, reading w1_slave.')
+            temperature_supported = False
+        except Exception as ex:
+            logger.warning("Reading the temperature of Ds18b20 '" + device_id + "' failed, reading w1_slave: " + repr(ex))
+    return read_w1_slave(sensor)
 
-                    # read temperature and convert temperature
-                    string_value = file_content.split("\n")[1].split(" ")[9]
+def read_w1_slave(sensor):
+    try:
+        # read 1-wire slave file, after a bulk read the kernel returns the result of that conversion
+        with open(w1Folder + sensor["device_id"] + '/w1_slave', 'r') as file:
+            file_content = file.read()
+            file.close()
 
-                    # workaround for w1_therm.ko issue:
-                    check_neg = int(string_value[2:])         # Temperatur in milligrad Celsius
-                    if check_neg > 85000:                     # Temperatur kann nicht größer 85°C sein
-                        check_neg = check_neg - 4096000       # Umrechung in negative Temperatur
-                        string_value = 't='+str(check_neg)
+            if not file_content.split("\n")[0].strip().endswith('YES'):
+                logger.warning("CRC check of Ds18b20 '" + sensor["device_id"] + "' failed.")
+                return None
 
-                    temperature = float(string_value[2:]) / 1000
-                    temperature = round(temperature, 1)
+            check_resolution(sensor, file_content)
 
-                    return temperature
+            # read temperature and convert temperature
+            string_value = file_content.split("\n")[1].split(" ")[9]
 
-        except FileNotFoundError:
-            logger.warning('Cannot find Device-ID from Ds18b20 Sensor ' + sensor["device_id"])
-            return None
-        except IndexError:
-            logger.warning('Ds18b20 Sensor with Device-ID: ' + sensor["device_id"] + ' found, but no temperatures listed')
-            return None
-        except Exception as ex:
-            logger.exception('Unhandled Exception in measure_temperature read 1-wire slave file')
+            # workaround for w1_therm.ko issue:
+            check_neg = int(string_value[2:])         # Temperatur in milligrad Celsius
+            if check_neg > 85000:                     # Temperatur kann nicht größer 85°C sein
+                check_neg = check_neg - 4096000       # Umrechung in negative Temperatur
+                string_value = 't='+str(check_neg)
+
+            temperature = float(string_value[2:]) / 1000
+            temperature = round(temperature, 1)
+
+            return temperature
+
+    except FileNotFoundError:
+        invalidate_devices()
+        logger.warning('Cannot find Device-ID from Ds18b20 Sensor ' + sensor["device_id"])
+        return None
+    except IndexError:
+        logger.warning('Ds18b20 Sensor with Device-ID: ' + sensor["device_id"] + ' found, but no temperatures listed')
+        return None
     except Exception as ex:
-        logger.exception('Unhandled Exception in measure_temperature')
+        logger.exception('Unhandled Exception in measure_temperature read 1-wire slave file')
+    return None
 
+def get_resolution(sensor):
+    # configured resolution of a sensor, None to keep the resolution of the sensor
+    if sensor.get("resolution") in (None, ""):
+        return None
+    try:
+        resolution = int(sensor["resolution"])
+        if resolution in RESOLUTIONS:
+            return resolution
+    except (TypeError, ValueError):
+        pass
+    logger.warning("Invalid resolution '" + str(sensor["resolution"]) + "' for Ds18b20 '" + str(sensor.get("device_id")) + "', resolution has to be 9, 10, 11 or 12 bits.")
     return None
 
-# function for reading the value from sensor
-def read_unfiltered_temperatur_values(sensorIndex, sensor):
-    temperature = None
+def set_resolution(sensor):
+    """ Apply the configured resolution with the w1_therm resolution attribute (kernel 5.9 and later). """
+    resolution = get_resolution(sensor)
+    if resolution is None or sensor.get("device_id", "undefined") == "undefined":
+        return
+    file_path = w1Folder + sensor["device_id"] + '/resolution'
+    try:
+        with open(file_path, 'r') as file:
+            if int(file.read().strip()) == resolution:
+                return
+        # stored in the scratchpad of the sensor, lost on a power cycle
+        with open(file_path, 'w') as file:
+            file.write(str(resolution) + '\n')
+        logger.debug("Resolution of Ds18b20 '" + sensor["device_id"] + "' set to " + str(resolution) + " bits.")
+    except FileNotFoundError:
+        logger.info("Cannot set the resolution of Ds18b20 '" + sensor["device_id"] + "', the sensor is missing or the kernel does not support it.")
+    except Exception as ex:
+        logger.warning("Setting the resolution of Ds18b20 '" + sensor["device_id"] + "' failed: " + repr(ex))
+
+def init_resolutions(sensors):
+    # prepare_sensor applies the resolution with the first read after each scan
+    for sensor in sensors:
+        prepare_sensor(sensor)
+
+def check_resolution(sensor, file_content):
+    # the configuration register (5th byte of the scratchpad) contains the resolution of the conversion
+    resolution = get_resolution(sensor)
+    if resolution is None:
+        return
+    try:
+        configuration = int(file_content.split("\n")[0].split(" ")[4], 16)
+        actual = 9 + ((configuration >> 5) & 3)
+    except (IndexError, ValueError):
+        return
+    reapply_resolution(sensor, actual, resolution)
+
+def check_resolution_attribute(sensor):
+    # the temperature attribute does not contain the configuration register, the resolution attribute does
+    resolution = get_resolution(sensor)
+    if resolution is None:
+        return
     try:
-        temperature = measure_temperature(sensor)
+        with open(w1Folder + sensor["device_id"] + '/resolution', 'r') as file:
+            actual = int(file.read().strip())
+    except (OSError, ValueError):
+        return
+    reapply_resolution(sensor, actual, resolution)
+
+def reapply_resolution(sensor, actual, resolution):
+    if actual != resolution:
+        # e.g. after a power cycle of the sensor
+        logger.warning("Ds18b20 '" + sensor["device_id"] + "' converted with " + str(actual) + " instead of " + str(resolution) + " bits, setting the resolution again.")
+        set_resolution(sensor)
+
+def measure_temperature(sensor):
+    try:
+        prepare_sensor(sensor)
+        return read_temperature(sensor)
+    except Exception as ex:
+        logger.exception('Unhandled Exception in measure_temperature')
 
-        if temperature is not None and math.isnan(temperature) == False:
-            logger.debug("temperature for device '" + str(sensor["device_id"]) + "': " + str(temperature))
-            unfiltered_values[sensorIndex].append(temperature)
+    return None
+
+def bus_master(sensor):
+    # w1 bus master folder of a sensor, e.g. /sys/devices/w1_bus_master1
+    device_id = sensor.get("device_id", "undefined")
+    if not device_present(device_id):
+        return None
+    if device_id not in _masters:
+        _masters[device_id] = os.path.dirname(os.path.realpath(w1Folder + device_id))
+    return _masters[device_id]
 
-    except IOError as ex1:
-        logger.exception("IOError occurred in read_unfiltered_temperatur_values")
-    except TypeError as ex2:
-        logger.exception("TypeError occurred in read_unfiltered_temperatur_values")
+def trigger_bulk_read(master):
+    """ Start the conversion of all sensors on the bus of master, returns False if the kernel does not support it. """
+    global bulk_read_supported
+    try:
+        with open(master + '/therm_bulk_read', 'w') as file:
+            file.write('trigger\n')
+        return True
+    except FileNotFoundError:
+        if bulk_read_supported:
+            logger.info('1-wire bulk read is not supported by the kernel, reading Ds18b20 sensors one after another.')
     except Exception as ex:
-        logger.exception("Unhandled Exception in read_unfiltered_temperatur_values")
+        if bulk_read_supported:
+            logger.warning('1-wire bulk read failed, reading Ds18b20 sensors one after another: ' + repr(ex))
+    bulk_read_supported = False
+    return False
+
+def measure_temperatures(sensors):
+    """ Temperatures of all sensors (None if not readable) with one simultaneous conversion per 1-wire bus. """
+    # the sampler of the daemon and measurement.py of the webinterface may read at the same time
+    with bus_lock(ONEWIRE):
+        return _measure_temperatures(sensors)
+
+def _measure_temperatures(sensors):
+    for sensor in sensors:
+        prepare_sensor(sensor)
+    if bulk_read_supported:
+        masters = set()
+        for sensor in sensors:
+            master = bus_master(sensor)
+            if master is not None:
+                masters.add(master)
+        for master in masters:
+            if not trigger_bulk_read(master):
+                break
+    # the kernel waits for the conversion time on the first read of each sensor
+    return [read_temperature(sensor) for sensor in sensors]
+
 # function which eliminates the noise by using a statistical model
 # we determine the standard normal deviation and we exclude anything that goes beyond a threshold
 # think of a probability distribution plot - we remove the extremes
@@ -94,8 +275,8 @@ def read_unfiltered_temperatur_values(sensorIndex, sensor):
 
 def filter_values(unfiltered_values, std_factor=2):
     try:
-        mean = np.mean(unfiltered_values)
-        standard_deviation = np.std(unfiltered_values)
+        mean = statistics.mean(unfiltered_values)
+        standard_deviation = statistics.pstdev(unfiltered_values)
 
         if standard_deviation == 0:
             return unfiltered_values
@@ -106,29 +287,3 @@ def filter_values(unfiltered_values, std_factor=2):
         return final_values
     except Exception as ex:
         logger.exception("Unhandled Exception in filter_values")
-
-# function for appending the filter
-def filter_temperatur_values(sensorIndex):
-    try:
-        if sensorIndex in unfiltered_values and len(unfiltered_values[sensorIndex]) > 5:
-            # read the last 5 values and filter them
-            filtered_temperature[sensorIndex].append(np.mean(filter_values([x for x in unfiltered_values[sensorIndex][-5:]])))
-    except Exception as ex:
-        logger.exception("Unhandled Exception in filter_temperatur_values")
-
-def checkIfSensorExistsInArray(sensorIndex):
-    try:
-        try:
-            filtered_temperature[sensorIndex]
-        except IndexError:
-            # handle this
-            filtered_temperature.append([])
-            unfiltered_values.append([])
-
-        # prevent buffer overflow
-        if len(filtered_temperature[sensorIndex]) > 50:
-            filtered_temperature[sensorIndex] = filtered_temperature[sensorIndex][len(filtered_temperature[sensorIndex])-10:] # remove all but the last 10 elements
-        if len(unfiltered_values[sensorIndex]) > 50:
-            unfiltered_values[sensorIndex] = unfiltered_values[sensorIndex][len(unfiltered_values[sensorIndex])-10:] # remove all but the last 10 elements
-    except Exception as ex:
-        logger.exception("Unhandled Exception in checkIfSensorExistsInArray")
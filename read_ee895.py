@@ -2,9 +2,8 @@
 # This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
 # See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
 
-import smbus
 import time
-from sensors.sensor_utilities import get_smbus
+from sensors.i2c_bus import get_bus
 import logging
 logger = logging.getLogger('HoneyPi.read_ee895')
 
@@ -27,8 +26,8 @@ def _measure_all():
     address = 0x5e    #I2C-address of EE-895
 
     try:
-        # Create I2C instance and open the bus
-        EE895 = smbus.SMBus(get_smbus())
+        # shared I2C bus
+        EE895 = get_bus()
 
         _c = EE895.read_word_data(address,0x0) # co2
         _t = EE895.read_word_data(address,0x2) # temp
@@ -8,7 +8,6 @@ import datetime as dt
 import pytz
 import os
 from sensors.PA1010D import *
-from timezonefinder import TimezoneFinder
 from utilities import get_abs_timedifference
 import logging
 import inspect
@@ -105,6 +104,7 @@ def set_timezonefromcoordinates(latitude, longitude):
     try:
         assert (latitude != None)
         assert (longitude != None)
+        from timezonefinder import TimezoneFinder # loads its timezone database, only needed here
         tf = TimezoneFinder()
         strtimezone = tf.timezone_at(lng=longitude, lat=latitude)
         logger.info("Set timezone to '" + strtimezone + "' based on latitude: " + str(latitude) + " longitude: " + str(longitude))
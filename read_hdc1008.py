@@ -1,8 +1,7 @@
 #!/usr/bin/env python3
-import smbus
 import time
 import logging
-from sensors.sensor_utilities import get_smbus
+from sensors.i2c_bus import get_bus
 
 logger = logging.getLogger('HoneyPi.read_hdc1008')
 
@@ -14,7 +13,7 @@ logger = logging.getLogger('HoneyPi.read_hdc1008')
 DEVICE=0x40
 
 def read_hdc1008(addr=DEVICE):
-    bus = smbus.SMBus(get_smbus())
+    bus = get_bus()
 
     # set config register
     bus.write_byte_data(addr, 0x02, 0x00)
@@ -4,92 +4,35 @@
 
 from sensors.HX711 import HX711 # import the class HX711
 # Source: https://github.com/gandalf15/HX711
-import RPi.GPIO as GPIO # import GPIO
+from sensors.HX711Multi import HX711Multi
+from sensors import robust_stats
+from sensors.robust_stats import FILTERS
+from sensors.gpio_backend import GPIO # RPi.GPIO or the simulation
+import math
+import threading
 import time
 import logging
+import metrics
+from acquisition import cancelled
+from realtime import realtime
+from resource_lock import hx711_locks, acquire_all, release_all, LOCK_TIMEOUT
 
 logger = logging.getLogger('HoneyPi.read_hx711')
 
+TOLERANCE = 10 # gram, default half width of the 95 % confidence interval of a weight ("tolerance" in the settings)
+TIME_BUDGET = 10 # seconds, default maximum time to read a weight ("time_budget" in the settings)
+MAX_SAMPLES_FACTOR = 6 # at most this many times the readings per average of the cycle policy
+ESTIMATE_BLOCK = 10 # samples read between two checks of the confidence interval
+MIN_SAMPLES = 20 # valid samples before the confidence interval is checked
+Z_95 = 1.96
+
 # setup GPIO
 GPIO.setmode(GPIO.BCM) # set GPIO pin mode to BCM numbering
 
-def takeClosest(myList, myNumber):
-    # from list of integers, get number closest to a given value
-    try:
-        closest = myList[0]
-        for i in range(1, len(myList)):
-            if abs(myList[i] - myNumber) < closest:
-                closest = myList[i]
-        return closest
-    except Exception as e:
-        logger.exception('Error in takeClosest.')
-
-def average(myList):
-    # Finding the average of a list
-    try:
-        total = sum(myList)
-        return total / len(myList)
-    except Exception as e:
-        logger.exception('Error in average.')
-
-
-def findmax(myList):
-    # from list of integers, get number closest to a given value
-    try:
-        maximum = myList[0]
-        for i in range(1, len(myList)):
-            if (myList[i] > maximum):
-                maximum = myList[i]
-        return maximum
-    except Exception as e:
-        logger.exception('Error in findmax.')
-
-def findmin(myList):
-    # from list of integers, get number closest to a given value
-    try:
-        minimum = myList[0]
-        for i in range(1, len(myList)):
-            if (myList[i] < minimum):
-                minimum = myList[i]
-        return minimum
-    except Exception as e:
-        logger.exception('Error in findmin.')
-
-
-def easy_weight(weight_sensor):
-    pin_dt = 5
-    pin_sck = 6
-    channel = 'A'
-    reference_unit = 1
-    offset = 0
-
-    try:
-        pin_dt = int(weight_sensor["pin_dt"])
-        pin_sck = int(weight_sensor["pin_sck"])
-        channel = weight_sensor["channel"]
-        reference_unit = float(weight_sensor["reference_unit"])
-        offset = int(weight_sensor["offset"])
-    except Exception as e:
-        logger.error('HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' missing param: ' + str(e))
-
-    try:
-        GPIO.setmode(GPIO.BCM)  # set GPIO pin mode to BCM numbering
-        # Create an object hx which represents your real hx711 chip
-        hx = HX711(dout_pin=pin_dt, pd_sck_pin=pin_sck, select_channel=channel)
-        hx.set_scale_ratio(scale_ratio=reference_unit)
-        hx.set_offset(offset=offset)
-        # use outliers_filter and do average over 30 measurements
-        weight = hx.get_weight_mean(30)
-        if weight != False:
-            return round(weight, 1)
-
-    except Exception as e:
-        logger.error('HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' Fallback failed: ' + str(e))
-
-    finally:
-        pass
-
-    return None
+# initialized HX711 of this process by (pin_dt, pin_sck, channel)
+_pool = {}
+_pool_inits = {} # inits per key which are not yet counted in the metrics
+_pool_lock = threading.Lock()
 
 def get_temp(weight_sensor, ts_fields):
     try:
@@ -186,6 +129,9 @@ def init_hx711(weight_sensor):
                 # Create an object hx which represents your real hx711 chip
                 hx = HX711(dout_pin=pin_dt, pd_sck_pin=pin_sck, select_channel=channel)
                 hx.set_debug_mode(flag=debug)
+                if 'filter' in weight_sensor and weight_sensor['filter'] in FILTERS:
+                    # median (default), trimmed or hampel
+                    hx.set_data_filter(FILTERS[weight_sensor['filter']])
                 errorEncountered = hx.reset() # Before we start, reset the hx711 (not necessary)
                 if not errorEncountered:
                     logger.debug('HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' Init finished')
@@ -203,12 +149,105 @@ def init_hx711(weight_sensor):
         logger.exception("Unhandled Exception in init_hx711")
 
 
-def measure_weight(weight_sensor, hx=None):
+def pool_key(weight_sensor):
+    return (weight_sensor.get("pin_dt"), weight_sensor.get("pin_sck"), weight_sensor.get("channel", 'A'))
+
+def check_hx711(hx):
+    # cheap health check: one valid conversion instead of reset and init
+    try:
+        for sample in hx.read_block(2):
+            if sample is not False:
+                return True
+    except Exception as e:
+        logger.debug("HX711 health check failed: " + str(e))
+    return False
+
+def get_hx711(weight_sensor, reinit=False):
+    """ Initialized HX711 of this process, only initialized again if it fails the health check. """
+    key = pool_key(weight_sensor)
+    with _pool_lock:
+        hx = _pool.get(key)
+        if hx is not None and not reinit and check_hx711(hx):
+            return hx
+        hx = init_hx711(weight_sensor)
+        _pool_inits[key] = _pool_inits.get(key, 0) + 1
+        if hx:
+            _pool[key] = hx
+        else:
+            _pool.pop(key, None)
+        return hx
+
+def pop_pool_inits(weight_sensor):
+    # number of inits since the last call, for the metrics
+    with _pool_lock:
+        return _pool_inits.pop(pool_key(weight_sensor), 0)
+
+def confidence_estimate(samples, data_filter, offset, scale_ratio):
+    """
+    Weight (gram) of the filtered samples and the half width of its 95 % confidence interval,
+    None with less than MIN_SAMPLES filtered samples. The spread is the MAD of all valid
+    samples: the standard deviation of the filtered ones is too small after removing outliers.
+    """
+    filtered = data_filter(samples)
+    if len(filtered) < MIN_SAMPLES:
+        return None
+    sigma = robust_stats.mad_sigma(samples) or robust_stats.stdev(filtered)
+    uncertainty = Z_95 * sigma / math.sqrt(len(filtered)) / (abs(scale_ratio) or 1)
+    return {'weight': round((robust_stats.mean(filtered) - offset) / scale_ratio, 1), 'uncertainty': round(uncertainty, 1), 'samples': len(filtered), 'filtered_out': len(samples) - len(filtered)}
+
+def estimate_weight(hx, tolerance=TOLERANCE, time_budget=TIME_BUDGET, max_samples=None):
+    """
+    Reads blocks of samples until the 95 % confidence interval of the mean weight is
+    within +/- tolerance gram, the time budget is used up or max_samples were read.
+    Returns a dict with weight (gram, None without valid samples), uncertainty (half width
+    of the confidence interval in gram), samples, filtered_out and converged.
+    """
+    data_filter = hx.get_data_filter() or robust_stats.valid_samples
+    start = time.monotonic()
+    samples = []
+    result = {'weight': None, 'uncertainty': None, 'samples': 0, 'filtered_out': 0, 'converged': False}
+    while not cancelled():
+        samples.extend(hx.read_block(ESTIMATE_BLOCK))
+        estimate = confidence_estimate(samples, data_filter, hx.get_current_offset(), hx.get_current_scale_ratio())
+        if estimate is not None:
+            result.update(estimate)
+            if estimate['uncertainty'] <= tolerance:
+                result['converged'] = True
+                break
+        if time.monotonic() - start >= time_budget or (max_samples and len(samples) >= max_samples):
+            break
+    if result['weight'] is None:
+        result['samples'] = len(robust_stats.valid_samples(samples))
+    return result
+
+def measure_weight(weight_sensor, hx=None, num_measurements=None, sampler=None, quality=None, budget_factor=1):
     try:
         weight_sensor
     except Exception as e:
         logger.error("measure_hx711 is missing param weight_sensor: " + str(e))
 
+    if sampler is not None:
+        # continuously sampled HX711: robust estimate of the last seconds
+        weight = sampler.estimate()
+        if weight is not None:
+            if 'invert' in weight_sensor and weight_sensor['invert'] == True:
+                weight = weight*-1
+            logger.debug('measure HX711 DT: ' + str(weight_sensor.get("pin_dt")) + ' weight from sampler: ' + str(round(weight, 1)) + 'g')
+            return round(weight, 1)
+        logger.info('HX711 DT: ' + str(weight_sensor.get("pin_dt")) + ' not enough samples from sampler, reading HX711 the usual way.')
+        sampler.pause()
+        # the clock line is locked against other processes like in the reading of the sampler
+        locks = []
+        try:
+            try:
+                locks = acquire_all(hx711_locks([weight_sensor]), LOCK_TIMEOUT)
+            except OSError as ex:
+                logger.warning('HX711 DT: ' + str(weight_sensor.get("pin_dt")) + ' reading without lock: ' + repr(ex))
+            return measure_weight(weight_sensor, sampler.hx, num_measurements, budget_factor=budget_factor)
+        finally:
+            release_all(locks)
+            sampler.resume()
+
     if 'reference_unit' in weight_sensor:
         reference_unit = float(weight_sensor["reference_unit"])
     else:
@@ -230,76 +269,51 @@ def measure_weight(weight_sensor, hx=None):
         logger.error("HX711 missing param: " + str(e))
         pass
 
-    temp_reading = None
     weight = None
     try:
         logger.debug('measure HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' started')
         GPIO.setmode(GPIO.BCM) # set GPIO pin mode to BCM numbering
 
-        # init hx711
+        # initialized HX711 of the pool, initialized again only if it does not deliver data
         if not hx:
-            logger.debug('HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' no initialized HX711 received, initializing now.')
-            hx = init_hx711(weight_sensor)
-
-        if hx:
-            temp_reading = hx.get_raw_data_mean(6) # measure just for fun
-
-        if not isinstance(temp_reading, (int, float)): # always check if you get correct value or only False
+            hx = get_hx711(weight_sensor)
+        elif not check_hx711(hx):
             logger.debug('HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' bad data measured, initializing HX711 again.')
-            if hx:
-                hx.reset()
-            hx = init_hx711(weight_sensor)
+            hx = get_hx711(weight_sensor, reinit=True)
+        inits = pop_pool_inits(weight_sensor)
+        if inits:
+            metrics.count('hx711.' + str(pin_dt) + '.inits', inits)
 
         hx.power_up()
         hx.set_scale_ratio(scale_ratio=reference_unit)
         hx.set_offset(offset=offset)
 
-        count = 0
-        LOOP_TRYS = 6
-        while count < LOOP_TRYS:
-
-            count += 1
-            # improve weight measurement by doing LOOP_TIMES weight measurements
-            weightMeasures=[]
-            count_avg = 0
-            LOOP_AVG = 3
-            while count_avg < LOOP_AVG and count_avg < 6: # Break after max. 6 loops
-                count_avg += 1
-                num_measurements = 41
-                reading = hx.get_weight_mean(num_measurements) # use outliers_filter and do average over 41 measurements
-                if isinstance(reading, (int, float)): # always check if you get correct value or only False
-                    weightMeasures.append(reading)
-                    num_data_filtered_out = hx.get_num_data_filtered_out()
-                    percentage_filtered_out = round((num_data_filtered_out / num_measurements * 100),2)
-                    if percentage_filtered_out >= 40:
-                        logger.warning('HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' ' + str(percentage_filtered_out) + '%, in total ' + str(num_data_filtered_out) + ' of ' + str(num_measurements) + ' elements removed by filter within hx711. You might need to check your power supply or cabling setup.')
-                    else:
-                        logger.debug('HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' ' + str(percentage_filtered_out) + '%, in total ' + str(num_data_filtered_out) + ' of ' + str(num_measurements) + ' elements removed by filter within hx711')
-                else: # returned False
-                    LOOP_AVG += 1 # increase loops because of failured measurement (returned False)
-                    logger.error('HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' Failured measurement, you might need to check your hx711 setup')
-
-            # take "best" measure
-            average_weight = round(average(weightMeasures), 1)
-            maxweight = round(findmax(weightMeasures), 1)
-            minweight = round(findmin(weightMeasures), 1)
-            weight = round(takeClosest(weightMeasures, average_weight), 1)
-            logger.debug('HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' Max weight: ' + str(maxweight) + 'g, Min weight: ' + str(minweight) + 'g, Average weight: ' + str(average_weight) + 'g, Chosen weight: ' + str(weight) + 'g')
-
-            ALLOWED_DIVERGENCE = round((500/reference_unit), 1)
-            # bei reference_unit=25 soll ALLOWED_DIVERGENCE=20
-            # bei reference_unit=1 soll ALLOWED_DIVERGENCE=300
-            if abs(average_weight-weight) > ALLOWED_DIVERGENCE:
-                # if difference between avg weight and chosen weight is bigger than ALLOWED_DIVERGENCE
-                logger.warning('HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' Difference between average weight ('+ str(average_weight)+'g) and chosen weight (' + str(weight) + 'g) is more than ' + str(ALLOWED_DIVERGENCE) + 'g. => Try again ('+str(count)+'/'+str(LOOP_TRYS)+')')
-
-                if LOOP_TRYS == count: # last loop
-                    # 3 loops and still no chosen weight => fallback measurement
-                    weight = easy_weight(weight_sensor)
-                    logger.warning('HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' Difference between average weight ('+ str(average_weight)+'g) and chosen weight (' + str(weight) + 'g) is more than ' + str(ALLOWED_DIVERGENCE) + 'g. after ' +str(count) + ' loops, Fallback weight: ' + str(weight) + 'g')
+        if not num_measurements:
+            num_measurements = 41 # readings per average, may be reduced by the cycle policy
+        tolerance = float(weight_sensor.get('tolerance', TOLERANCE))
+        time_budget = float(weight_sensor.get('time_budget', TIME_BUDGET)) * budget_factor # reduced by the cycle policy
+        with realtime(enabled=weight_sensor.get('realtime', True)):
+            result = estimate_weight(hx, tolerance, time_budget, num_measurements * MAX_SAMPLES_FACTOR)
+        if quality is not None:
+            quality.update(result)
+        weight = result['weight']
+        if weight is None:
+            metrics.count('hx711.' + str(pin_dt) + '.failed')
+            logger.error('HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' Failured measurement, only ' + str(result['samples']) + ' valid samples, you might need to check your hx711 setup')
+        else:
+            metrics.record('hx711.' + str(pin_dt) + '.uncertainty', result['uncertainty'])
+            metrics.count('hx711.' + str(pin_dt) + '.samples', result['samples'])
+            if result['converged']:
+                logger.debug('HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' Weight: ' + str(weight) + 'g +/- ' + str(result['uncertainty']) + 'g after ' + str(result['samples']) + ' samples (' + str(result['filtered_out']) + ' removed by filter)')
             else:
-                # divergence is OK => skip
-                break
+                logger.warning('HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' Weight: ' + str(weight) + 'g +/- ' + str(result['uncertainty']) + 'g did not reach the tolerance of ' + str(tolerance) + 'g with ' + str(result['samples']) + ' samples (' + str(result['filtered_out']) + ' removed by filter). You might need to check your power supply or cabling setup.')
+
+        # samples thrown away by the HX711 class (slow clock, out of range or not ready)
+        for (name, value) in hx.get_read_statistics().items():
+            if value:
+                metrics.count('hx711.' + str(pin_dt) + '.' + name, value)
+                logger.debug('HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' ' + str(value) + ' reads ' + name)
+        hx.reset_read_statistics()
 
         # invert weight if flag is set
         if 'invert' in weight_sensor and weight_sensor['invert'] == True and isinstance(weight, (int, float)):
@@ -319,7 +333,28 @@ def measure_weight(weight_sensor, hx=None):
     return weight
 
 
-def measure_hx711(weight_sensor, ts_fields, hx=None):
+def weight_fields(weight_sensor, weight, ts_fields):
+    # ts fields of a measured weight, returns the fields and the compensated weight
+    fields = {}
+    if 'ts_field_uncompensated' in weight_sensor and type(weight) in (float, int):
+        fields[weight_sensor["ts_field_uncompensated"]] = float("{0:.3f}".format(weight/1000)) # float only 3 decimals
+    weight = compensate_temperature(weight_sensor, weight, ts_fields)
+
+    if 'filter_negative' in weight_sensor and weight_sensor['filter_negative'] and weight < -1: # filter negative measurements
+        weight = None
+
+    if 'ts_field' in weight_sensor and type(weight) in (float, int):
+        fields[weight_sensor["ts_field"]] = float("{0:.3f}".format(weight/1000)) # float only 3 decimals
+
+    if 'ts_field_offset2' in weight_sensor and 'offset2' in weight_sensor and type(weight_sensor["offset2"]) in (float, int):
+                fields[weight_sensor["ts_field_offset2"]] = float("{0:.3f}".format(weight_sensor["offset2"]/1000))
+
+    if 'ts_field_corrected' in weight_sensor and type(weight) in (float, int) and  'offset2' in weight_sensor and type(weight_sensor["offset2"]) in (float, int):
+        weight_corrected = weight - weight_sensor["offset2"]
+        fields[weight_sensor["ts_field_corrected"]] = float("{0:.3f}".format(weight_corrected/1000))
+    return fields, weight
+
+def measure_hx711(weight_sensor, ts_fields, hx=None, num_measurements=None, sampler=None, budget_factor=1):
     fields = {}
     pin_dt = 0
     pin_sck = 0
@@ -333,26 +368,132 @@ def measure_hx711(weight_sensor, ts_fields, hx=None):
         logger.error("HX711 missing param: " + str(e))
 
     try:
-        weight = measure_weight(weight_sensor, hx=None)
-
-        if 'ts_field_uncompensated' in weight_sensor and type(weight) in (float, int):
-            fields[weight_sensor["ts_field_uncompensated"]] = float("{0:.3f}".format(weight/1000)) # float only 3 decimals
-        weight = compensate_temperature(weight_sensor, weight, ts_fields)
+        quality = {}
+        weight = measure_weight(weight_sensor, hx=hx, num_measurements=num_measurements, sampler=sampler, quality=quality, budget_factor=budget_factor)
+        fields, weight = weight_fields(weight_sensor, weight, ts_fields)
+        if quality.get('uncertainty') is not None:
+            if 'ts_field_uncertainty' in weight_sensor:
+                fields[weight_sensor["ts_field_uncertainty"]] = float("{0:.3f}".format(quality['uncertainty']/1000))
+            if not quality['converged']:
+                # quality flag in the ThingSpeak status field
+                fields['status'] = 'Weight DT ' + str(pin_dt) + ' +/-' + str(quality['uncertainty']) + 'g'
 
-        if 'filter_negative' in weight_sensor and weight_sensor['filter_negative'] and weight < -1: # filter negative measurements
-            weight = None
-
-        if 'ts_field' in weight_sensor and type(weight) in (float, int):
-            fields[weight_sensor["ts_field"]] = float("{0:.3f}".format(weight/1000)) # float only 3 decimals
-
-        if 'ts_field_offset2' in weight_sensor and 'offset2' in weight_sensor and type(weight_sensor["offset2"]) in (float, int):
-                    fields[weight_sensor["ts_field_offset2"]] = float("{0:.3f}".format(weight_sensor["offset2"]/1000))
+    except Exception as e:
+        logger.error('Measure HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ': failed: ' + str(e))
 
-        if 'ts_field_corrected' in weight_sensor and type(weight) in (float, int) and  'offset2' in weight_sensor and type(weight_sensor["offset2"]) in (float, int):
-            weight_corrected = weight - weight_sensor["offset2"]  
-            fields[weight_sensor["ts_field_corrected"]] = float("{0:.3f}".format(weight_corrected/1000))
+    return fields
 
+def group_by_clock(weight_sensors):
+    """ Indexes of the weight sensors which can be read together: same clock pin and channel, different data pins. """
+    groups = {}
+    for (i, weight_sensor) in enumerate(weight_sensors):
+        try:
+            key = (int(weight_sensor["pin_sck"]), weight_sensor.get("channel", 'A'))
+        except Exception as e:
+            continue
+        groups.setdefault(key, []).append(i)
+    result = []
+    for indexes in groups.values():
+        dout_pins = [int(weight_sensors[i]["pin_dt"]) for i in indexes]
+        if len(indexes) >= 2 and len(set(dout_pins)) == len(dout_pins):
+            result.append(indexes)
+    return result
+
+def init_hx711_multi(weight_sensors):
+    # HX711 boards sharing the clock pin, all with the same channel
+    pin_sck = int(weight_sensors[0]["pin_sck"])
+    channel = weight_sensors[0].get("channel", 'A')
+    dout_pins = [int(weight_sensor["pin_dt"]) for weight_sensor in weight_sensors]
+    try:
+        GPIO.setmode(GPIO.BCM) # set GPIO pin mode to BCM numbering
+        hx = HX711Multi(dout_pins=dout_pins, pd_sck_pin=pin_sck, select_channel=channel)
+        logger.debug('HX711 DT: ' + str(dout_pins) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' Init of synchronous reading finished')
+        return hx
     except Exception as e:
-        logger.error('Measure HX711 DT: ' + str(pin_dt) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ': failed: ' + str(e))
+        logger.error('HX711 DT: ' + str(dout_pins) + ' SCK: ' + str(pin_sck) + ' Channel: ' + channel + ' Initializing synchronous reading failed: ' + str(e))
+    return None
 
+def measure_weight_multi(weight_sensors, hx, num_measurements=None, budget_factor=1):
+    """
+    Weights in gram of boards sharing the clock, None for a board without enough valid samples.
+    Blocks are read for all boards until the confidence interval of every board is within its
+    tolerance, like estimate_weight, or the time budget is used up.
+    """
+    if not num_measurements:
+        num_measurements = 41
+    pin_sck = str(weight_sensors[0].get("pin_sck"))
+    estimates = []
+    for weight_sensor in weight_sensors:
+        try:
+            estimates.append({'reference_unit': float(weight_sensor.get("reference_unit", 1)), 'offset': int(weight_sensor.get("offset", 0)), 'filter': FILTERS.get(weight_sensor.get('filter', 'median'), FILTERS['median']), 'tolerance': float(weight_sensor.get('tolerance', TOLERANCE)), 'result': None, 'converged': False})
+        except Exception as e:
+            logger.error('HX711 DT: ' + str(weight_sensor.get("pin_dt")) + ' SCK: ' + pin_sck + ' synchronous reading failed: ' + str(e))
+            estimates.append(None)
+    time_budget = min(float(weight_sensor.get('time_budget', TIME_BUDGET)) for weight_sensor in weight_sensors) * budget_factor
+    max_samples = num_measurements * MAX_SAMPLES_FACTOR
+    series = [[] for weight_sensor in weight_sensors]
+    hx.power_up()
+    start = time.monotonic()
+    with realtime(enabled=weight_sensors[0].get('realtime', True)):
+        while not cancelled():
+            for (samples, block) in zip(series, hx.read_block(ESTIMATE_BLOCK)):
+                samples.extend(block)
+            for (estimate, samples) in zip(estimates, series):
+                if estimate is None or estimate['converged']:
+                    continue
+                estimate['result'] = confidence_estimate(samples, estimate['filter'], estimate['offset'], estimate['reference_unit'])
+                estimate['converged'] = estimate['result'] is not None and estimate['result']['uncertainty'] <= estimate['tolerance']
+            if all(estimate is None or estimate['converged'] for estimate in estimates):
+                break
+            if time.monotonic() - start >= time_budget or len(series[0]) >= max_samples:
+                break
+    for (name, value) in hx.get_read_statistics().items():
+        if value:
+            metrics.count('hx711.multi.' + pin_sck + '.' + name, value)
+    hx.reset_read_statistics()
+
+    weights = []
+    for (weight_sensor, estimate, samples) in zip(weight_sensors, estimates, series):
+        pin_dt = str(weight_sensor.get("pin_dt"))
+        weight = None
+        if estimate is not None and estimate['result'] is not None:
+            result = estimate['result']
+            weight = result['weight']
+            if 'invert' in weight_sensor and weight_sensor['invert'] == True:
+                weight = weight*-1
+            metrics.record('hx711.' + pin_dt + '.uncertainty', result['uncertainty'])
+            metrics.count('hx711.' + pin_dt + '.samples', result['samples'])
+            if estimate['converged']:
+                logger.debug('HX711 DT: ' + pin_dt + ' SCK: ' + pin_sck + ' Weight: ' + str(weight) + 'g +/- ' + str(result['uncertainty']) + 'g after ' + str(result['samples']) + ' samples (' + str(result['filtered_out']) + ' removed by filter)')
+            else:
+                logger.warning('HX711 DT: ' + pin_dt + ' SCK: ' + pin_sck + ' Weight: ' + str(weight) + 'g +/- ' + str(result['uncertainty']) + 'g did not reach the tolerance of ' + str(estimate['tolerance']) + 'g in synchronous reading with ' + str(result['samples']) + ' samples (' + str(result['filtered_out']) + ' removed by filter).')
+        elif estimate is not None:
+            metrics.count('hx711.' + pin_dt + '.failed')
+            logger.warning('HX711 DT: ' + pin_dt + ' SCK: ' + pin_sck + ' only ' + str(len(robust_stats.valid_samples(samples))) + ' of ' + str(len(samples)) + ' samples valid in synchronous reading.')
+        weights.append(weight)
+    return weights
+
+def measure_hx711_multi(weight_sensors, ts_fields, hx, num_measurements=None, budget_factor=1):
+    """ Fields of boards sharing the clock and the total weight in ts_field_total of any of them. """
+    fields = {}
+    try:
+        weights = measure_weight_multi(weight_sensors, hx, num_measurements, budget_factor)
+        total = 0
+        for (weight_sensor, weight) in zip(weight_sensors, weights):
+            if weight is None:
+                # read this board on its own
+                logger.info('HX711 DT: ' + str(weight_sensor.get("pin_dt")) + ' reading again on its own.')
+                weight = measure_weight(weight_sensor, num_measurements=num_measurements, budget_factor=budget_factor)
+            sensor_fields, weight = weight_fields(weight_sensor, weight, ts_fields)
+            fields.update(sensor_fields)
+            if total is not None and type(weight) in (float, int):
+                total += weight
+            else:
+                total = None
+        for weight_sensor in weight_sensors:
+            if weight_sensor.get('ts_field_total') and total is not None:
+                fields[weight_sensor["ts_field_total"]] = float("{0:.3f}".format(total/1000))
+                break
+    except Exception as e:
+        logger.error('Measure HX711 SCK: ' + str(weight_sensors[0].get("pin_sck")) + ' synchronous reading failed: ' + str(e))
     return fields
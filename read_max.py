@@ -6,6 +6,7 @@ from sensors.MAX6675 import MAX6675
 from sensors.MAX31855 import MAX31855
 import RPi.GPIO as GPIO
 import logging
+from realtime import realtime
 
 logger = logging.getLogger('HoneyPi.read_max')
 
@@ -39,7 +40,8 @@ def measure_tc(tc_sensor):
     if tc is not None:
         try:
             # get data
-            tc_temperature = tc.get()
+            with realtime(enabled=tc_sensor.get('realtime', True)):
+                tc_temperature = tc.get()
 
             if 'offset' in tc_sensor:
                 offset = float(tc_sensor["offset"])
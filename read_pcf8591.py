@@ -4,9 +4,8 @@
 
 # Main Source: http://www.diyblueprints.net/measuring-voltage-with-raspberry-pi/#Measure_Voltage_Python
 
-import smbus
 import time
-from sensors.sensor_utilities import get_smbus
+from sensors.i2c_bus import get_bus
 import logging
 
 logger = logging.getLogger('HoneyPi.read_pcf8591')
@@ -22,14 +21,13 @@ def measure(pin):
     i2c_addr = 0x48
 
     try:
-        # Create I2C instance and open the bus
-        PCF8591 = smbus.SMBus(get_smbus())
+        # shared I2C bus, locked so that no other thread switches the channel before the read
+        with get_bus() as PCF8591:
+            # set channel to AIN0, AIN1, AIN2 or AIN3
+            PCF8591.write_byte(i2c_addr, 0x40+pin)
 
-        # set channel to AIN0, AIN1, AIN2 or AIN3
-        PCF8591.write_byte(i2c_addr, 0x40+pin)
-
-        # i2cget -y 1 0x48
-        data_8bit = PCF8591.read_byte(i2c_addr)
+            # i2cget -y 1 0x48
+            data_8bit = PCF8591.read_byte(i2c_addr)
         logger.debug("PCF8591 PIN: AIN" + str(pin) + " measureed raw data: " + str(data_8bit))
         if isinstance(data_8bit, (int, float)):
             return data_8bit
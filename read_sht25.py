@@ -3,10 +3,9 @@
 # This code is designed to work with the SHT25_I2CS I2C Mini Module available from ControlEverything.com.
 # https://www.controleverything.com/content/Humidity?sku=SHT25_I2CS#tabs-0-product_tabset-2
 
-import smbus
 import time
 import logging
-from sensors.sensor_utilities import get_smbus
+from sensors.i2c_bus import get_bus
 
 logger = logging.getLogger('HoneyPi.read_sht25')
 
@@ -15,7 +14,7 @@ DEVICE=0x40
 
 def read_sht25(addr=DEVICE):
     # Get I2C bus
-    bus = smbus.SMBus(1)
+    bus = get_bus()
 
     # Send temperature measurement command
     #		0xF3(243)	NO HOLD master
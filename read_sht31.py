@@ -4,10 +4,9 @@
 # This code is designed to work with the SHT31_I2CS I2C Mini Module available from ControlEverything.com.
 # https://www.controleverything.com/content/Humidity?sku=SHT31_I2CS#tabs-0-product_tabset-2
 
-import smbus
 import time
 import logging
-from sensors.sensor_utilities import get_smbus
+from sensors.i2c_bus import get_bus
 
 logger = logging.getLogger('HoneyPi.read_sht31')
 
@@ -16,7 +15,7 @@ DEVICE=0x44
 
 def read_sht31(addr=DEVICE):
     # Get I2C bus
-    bus = smbus.SMBus(get_smbus())
+    bus = get_bus()
 
     # Send measurement command, 0x2C(44)
     #		0x06(06)	High repeatability measurement
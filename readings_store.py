@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Latest readings in shared memory.
+# The measurement (worker process or single measurement) writes every measured record into a
+# memory mapped ring buffer in /dev/shm. OLed, a CLI or the webinterface read the last records
+# without a lock, without measuring again and without parsing the offline CSV files.
+# There is only one writer at a time. Every slot is protected by a sequence number
+# (seqlock): it is odd while the slot is written, readers retry if it was odd or changed.
+#
+# Usage: python3 readings_store.py [-n N] [--json]
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+import logging
+
+from constant import readingsFile
+
+logger = logging.getLogger('HoneyPi.readings_store')
+
+MAGIC = b'HPRS'
+VERSION = 1
+SLOTS = 64 # records kept
+SLOT_SIZE = 2048 # bytes per record including the slot header
+HEADER = struct.Struct('<4sHHIQ') # magic, version, slots, slot size, number of written records
+HEADER_SIZE = 32
+COUNT_OFFSET = 12 # position of the number of written records in the header
+SLOT_HEADER = struct.Struct('<QdI') # sequence, unix time, payload length
+SLOT_HEADER_SIZE = 24
+READ_RETRIES = 20
+
+class ReadingsStore:
+    def __init__(self, file=readingsFile, writer=False, slots=SLOTS, slot_size=SLOT_SIZE):
+        self.file = file
+        self.writer = writer
+        self.slots = slots
+        self.slot_size = slot_size
+        self._mm = None
+
+    def _open(self):
+        if self._mm is not None:
+            return True
+        if self.writer:
+            size = HEADER_SIZE + self.slots * self.slot_size
+            fd = os.open(self.file, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size != size:
+                    os.ftruncate(fd, size)
+                self._mm = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+            magic, version, slots, slot_size, count = HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or version != VERSION or slots != self.slots or slot_size != self.slot_size:
+                # new or different layout: start empty
+                self._mm[:] = bytes(size)
+                HEADER.pack_into(self._mm, 0, MAGIC, VERSION, self.slots, self.slot_size, 0)
+            return True
+        try:
+            fd = os.open(self.file, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            if os.fstat(fd).st_size < HEADER_SIZE:
+                return False
+            self._mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        magic, version, self.slots, self.slot_size, count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or len(self._mm) < HEADER_SIZE + self.slots * self.slot_size:
+            logger.warning("Readings store '" + self.file + "' has an unknown layout.")
+            self.close()
+            return False
+        return True
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def count(self):
+        """ Number of records written since the store was created. """
+        if not self._open():
+            return 0
+        return struct.unpack_from('<Q', self._mm, COUNT_OFFSET)[0]
+
+    def write(self, ts_fields, timestamp=None):
+        """ Add a record, returns False if it does not fit into a slot. """
+        if timestamp is None:
+            timestamp = time.time()
+        payload = json.dumps(ts_fields, separators=(',', ':')).encode('utf-8')
+        if len(payload) > self.slot_size - SLOT_HEADER_SIZE:
+            logger.warning("Readings with " + str(len(payload)) + " bytes do not fit into the readings store.")
+            return False
+        self._open()
+        count = self.count()
+        offset = HEADER_SIZE + (count % self.slots) * self.slot_size
+        sequence = SLOT_HEADER.unpack_from(self._mm, offset)[0]
+        if sequence % 2:
+            sequence += 1 # previous writer died while writing
+        SLOT_HEADER.pack_into(self._mm, offset, sequence + 1, timestamp, len(payload))
+        self._mm[offset + SLOT_HEADER_SIZE:offset + SLOT_HEADER_SIZE + len(payload)] = payload
+        struct.pack_into('<Q', self._mm, offset, sequence + 2)
+        struct.pack_into('<Q', self._mm, COUNT_OFFSET, count + 1)
+        return True
+
+    def _read_slot(self, index):
+        offset = HEADER_SIZE + (index % self.slots) * self.slot_size
+        for retry in range(READ_RETRIES):
+            sequence, timestamp, length = SLOT_HEADER.unpack_from(self._mm, offset)
+            if sequence % 2 == 0 and length <= self.slot_size - SLOT_HEADER_SIZE:
+                payload = self._mm[offset + SLOT_HEADER_SIZE:offset + SLOT_HEADER_SIZE + length]
+                if SLOT_HEADER.unpack_from(self._mm, offset)[0] == sequence:
+                    try:
+                        return {'time': timestamp, 'fields': json.loads(payload.decode('utf-8'))}
+                    except ValueError:
+                        pass
+            time.sleep(0.001)
+        return None
+
+    def latest(self, n=1):
+        """ Last n records, newest first. Every record is a dict with 'time' and 'fields'. """
+        if not self._open():
+            return []
+        records = []
+        count = self.count()
+        for index in range(count - 1, max(count - min(n, self.slots), 0) - 1, -1):
+            record = self._read_slot(index)
+            if record is not None:
+                records.append(record)
+        return records
+
+_store = None # writer of this process
+
+def store_readings(ts_fields):
+    global _store
+    try:
+        if _store is None:
+            _store = ReadingsStore(writer=True)
+        _store.write(ts_fields)
+    except Exception as ex:
+        logger.exception("Exception in store_readings")
+
+def latest_readings(n=1):
+    store = ReadingsStore()
+    try:
+        return store.latest(n)
+    except Exception as ex:
+        logger.exception("Exception in latest_readings")
+        return []
+    finally:
+        store.close()
+
+def channel_readings(ts_channels):
+    """ Latest record per ThingSpeak channel in the format of utilities.offlinedata_prepare, None if nothing was stored. """
+    from utilities import clean_fields
+    records = latest_readings()
+    if not records:
+        return None
+    record = records[0]
+    date = time.localtime(record['time'])
+    channels = []
+    for (channelIndex, channel) in enumerate(ts_channels):
+        fields = clean_fields(record['fields'], channelIndex, False)
+        channeldata = {'channel_id': channel['ts_channel_id'], 'Date': time.strftime('%m-%d', date), 'Time': time.strftime('%H:%M', date)}
+        for i in range(1, 9):
+            channeldata['field' + str(i)] = str(fields.get('field' + str(i), ''))
+        channels.append(channeldata)
+    return channels
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the latest measured values.')
+    parser.add_argument('-n', type=int, default=1, help='number of records')
+    parser.add_argument('--json', action='store_true', help='print as json')
+    parser.add_argument('--file', default=readingsFile)
+    args = parser.parse_args()
+
+    store = ReadingsStore(args.file)
+    records = store.latest(args.n)
+    store.close()
+    if args.json:
+        print(json.dumps(records, indent=4))
+        return
+    if not records:
+        print('No readings stored in ' + args.file)
+    for record in records:
+        print(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record['time'])) + '  ' + ', '.join(str(key) + '=' + str(value) for (key, value) in sorted(record['fields'].items())))
+
+if __name__ == '__main__':
+    try:
+        main()
+    except (KeyboardInterrupt, SystemExit):
+        pass
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Real-time scheduling for bit-banged sensors (HX711, DHT, MAX6675/MAX31855).
+# realtime() raises the scheduling of the calling thread to SCHED_FIFO (nice -19 if that is not
+# permitted), pins it to one core on multi-core Pis, optionally locks the memory of the process
+# and restores everything afterwards. Only system calls of this process are used, no renice.
+#
+# Usage: python3 realtime.py (shows what is permitted for this process)
+
+import ctypes
+import ctypes.util
+import os
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger('HoneyPi.realtime')
+
+RT_PRIORITY = 40 # SCHED_FIFO priority, below the kernel interrupt threads (50)
+NICE = -19 # used if SCHED_FIFO is not permitted
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+_libc = None
+_memory_lock = threading.Lock()
+_memory_locks = 0 # active contexts with lock_memory, mlockall is process wide
+_warned = set()
+
+def _warn_once(message):
+    if message not in _warned:
+        _warned.add(message)
+        logger.warning(message)
+
+def default_cpu():
+    # the last core, core 0 handles most interrupts. None on single core Pis.
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) > 1:
+        return cpus[-1]
+    return None
+
+def _mlockall(lock):
+    global _libc, _memory_locks
+    with _memory_lock:
+        if _libc is None:
+            _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if lock:
+            _memory_locks += 1
+            if _memory_locks > 1:
+                return True
+            if _libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+                _memory_locks -= 1
+                _warn_once('Locking memory failed: ' + os.strerror(ctypes.get_errno()))
+                return False
+            return True
+        _memory_locks -= 1
+        if _memory_locks == 0:
+            _libc.munlockall()
+        return True
+
+@contextmanager
+def realtime(cpu=-1, priority=RT_PRIORITY, lock_memory=False, enabled=True):
+    """
+    Real-time scheduling of the calling thread within the context (nothing changes if not enabled).
+    cpu is the core to pin the thread to (-1 for default_cpu(), None to keep the affinity).
+    Yields a dict with the applied 'scheduling' ('fifo', 'nice' or None), 'cpu' and 'memory_locked'.
+    """
+    state = {'scheduling': None, 'cpu': None, 'memory_locked': False}
+    if not enabled:
+        yield state
+        return
+    policy = os.sched_getscheduler(0)
+    param = os.sched_getparam(0)
+    nice = os.getpriority(os.PRIO_PROCESS, 0)
+    affinity = os.sched_getaffinity(0)
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        state['scheduling'] = 'fifo'
+    except OSError as ex:
+        try:
+            os.setpriority(os.PRIO_PROCESS, 0, NICE)
+            state['scheduling'] = 'nice'
+        except OSError:
+            _warn_once('Real-time scheduling not permitted, bit-banged sensors are read with normal priority: ' + str(ex))
+    if cpu == -1:
+        cpu = default_cpu()
+    if cpu is not None:
+        try:
+            os.sched_setaffinity(0, {cpu})
+            state['cpu'] = cpu
+        except OSError as ex:
+            _warn_once('Pinning to CPU ' + str(cpu) + ' failed: ' + str(ex))
+    if lock_memory:
+        state['memory_locked'] = _mlockall(True)
+    try:
+        yield state
+    finally:
+        try:
+            if state['memory_locked']:
+                _mlockall(False)
+            if state['cpu'] is not None:
+                os.sched_setaffinity(0, affinity)
+            if state['scheduling'] == 'fifo':
+                os.sched_setscheduler(0, policy, param)
+            elif state['scheduling'] == 'nice':
+                os.setpriority(os.PRIO_PROCESS, 0, nice)
+        except OSError:
+            logger.exception('Restoring the scheduling failed')
+
+def main():
+    with realtime(lock_memory=True) as state:
+        print('scheduling:    ' + str(state['scheduling']))
+        print('cpu:           ' + str(state['cpu']))
+        print('memory locked: ' + str(state['memory_locked']))
+    print('restored:      policy ' + str(os.sched_getscheduler(0)) + ', nice ' + str(os.getpriority(os.PRIO_PROCESS, 0)) + ', cpus ' + str(sorted(os.sched_getaffinity(0))))
+
+if __name__ == '__main__':
+    try:
+        main()
+    except (KeyboardInterrupt, SystemExit):
+        pass
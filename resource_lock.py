@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Locks of the sensor buses shared by the daemon, measurement.py of the webinterface and maintenance.
+# A resource is a lock file in lockFolder locked with flock: a waiting process tries again every
+# POLL_MAX seconds at most, meanwhile a try without waiting leaves the lock to it (.wait file), and
+# the kernel releases the lock of a process which died. The .lock file contains
+# the PID of the holder for the log and for "python3 resource_lock.py".
+# Resources: every HX711 clock line (hx711_resource) below the shared lock of all HX711 (HX711),
+# each I2C bus (i2c_resource, locked per measurement by sensors/i2c_bus.py) and the 1-wire bus
+# (ONEWIRE, locked by read_ds18b20.measure_temperatures).
+#
+# Usage: python3 resource_lock.py
+
+import errno
+import fcntl
+import os
+import time
+import logging
+from contextlib import contextmanager
+
+from constant import lockFolder
+
+logger = logging.getLogger('HoneyPi.resource_lock')
+
+HX711 = 'hx711' # all HX711, shared while a single clock line is locked
+ONEWIRE = 'w1'
+LOCK_TIMEOUT = 2*60 # seconds, a measurement continues without the lock afterwards
+BUS_LOCK_TIMEOUT = 5 # seconds for the I2C and 1-wire bus, shorter than the budget of a sensor
+POLL_MIN = 0.002 # seconds between two tries to get a lock with timeout, doubled up to POLL_MAX
+POLL_MAX = 0.1
+
+_warned = set()
+
+def hx711_resource(pin_sck):
+    return 'hx711-sck' + str(pin_sck)
+
+def i2c_resource(number):
+    return 'i2c-' + str(number)
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class ResourceLock:
+    def __init__(self, name, shared=False, folder=lockFolder, keep_open=False):
+        self.name = name
+        self.shared = shared
+        self.path = folder + '/' + name + '.lock'
+        self.wait_path = folder + '/' + name + '.wait' # locked shared by the processes waiting for the lock
+        self.keep_open = keep_open # the lock file stays open after release, for a lock taken very often (I2C bus)
+        self._fd = None
+        self._file = None # lock file kept open
+
+    def _open_file(self, path=None):
+        folder = os.path.dirname(self.path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+            os.chmod(folder, 0o777) # the webinterface may run as another user
+        fd = os.open(path or self.path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            os.fchmod(fd, 0o666)
+        except OSError:
+            pass
+        return fd
+
+    def _open(self):
+        if self._file is not None:
+            return self._file
+        fd = self._open_file()
+        if self.keep_open:
+            self._file = fd
+        return fd
+
+    def _close(self, fd):
+        if fd != self._file:
+            os.close(fd)
+
+    def _mode(self):
+        return fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+
+    def holder(self):
+        """ PID of the process holding the lock exclusively, None if unknown. """
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def acquire(self, timeout=LOCK_TIMEOUT, quiet=False):
+        """
+        Wait until the lock is free (at most timeout seconds, forever if None, not at all if 0), returns True if locked.
+        quiet logs waiting for the lock only with DEBUG (e.g. for short bus transactions).
+        """
+        fd = self._open()
+        try:
+            locked = self._lock(fd, timeout, quiet)
+        except BaseException:
+            self._close(fd)
+            raise
+        if not locked:
+            self._close(fd)
+            return False
+        if not self.shared:
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, str(os.getpid()).encode(), 0)
+        self._fd = fd
+        return True
+
+    def _waiting(self):
+        # True if another process waits for the lock, see _lock
+        fd = self._open_file(self.wait_path)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return False
+        except OSError as ex:
+            if ex.errno in (errno.EAGAIN, errno.EACCES):
+                return True
+            raise
+        finally:
+            os.close(fd)
+
+    def _lock(self, fd, timeout, quiet):
+        if timeout == 0 and self._waiting():
+            # a holder taking the lock again right after the release (e.g. the HX711 sampler) leaves it to a waiting process
+            return False
+        try:
+            fcntl.flock(fd, self._mode() | fcntl.LOCK_NB)
+            return True
+        except OSError as ex:
+            if ex.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+        if timeout == 0:
+            return False
+        pid = self.holder()
+        if pid is not None and not pid_alive(pid):
+            # the holder died but a process forked by it still has the lock file open
+            logger.warning(self.name + ' is still locked although PID ' + str(pid) + ' holding it has ended.')
+        elif quiet:
+            logger.debug(self.name + ' is used by PID ' + str(pid) + ', waiting.')
+        else:
+            logger.info(self.name + ' is used by PID ' + str(pid) + ', waiting.')
+        wait_fd = self._open_file(self.wait_path)
+        try:
+            fcntl.flock(wait_fd, fcntl.LOCK_SH)
+            if timeout is None:
+                fcntl.flock(fd, self._mode())
+                return True
+            return _flock_timeout(fd, self._mode(), timeout)
+        finally:
+            os.close(wait_fd)
+
+    def release(self):
+        fd = self._fd
+        if fd is None:
+            return
+        self._fd = None
+        try:
+            if not self.shared:
+                os.ftruncate(fd, 0)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            self._close(fd)
+
+    def close(self):
+        """ Release the lock and close the lock file kept open. """
+        self.release()
+        fd = self._file
+        self._file = None
+        if fd is not None:
+            os.close(fd)
+
+    def forget(self):
+        """ Close the file of a lock inherited by a forked child without releasing the lock of the parent. """
+        for fd in set([self._fd, self._file]) - set([None]):
+            os.close(fd)
+        self._fd = None
+        self._file = None
+
+    def locked(self):
+        """ True if another holder prevents locking right now (also another lock of this process). """
+        fd = self._open_file()
+        try:
+            fcntl.flock(fd, self._mode() | fcntl.LOCK_NB)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            return False
+        except OSError as ex:
+            if ex.errno in (errno.EAGAIN, errno.EACCES):
+                return True
+            raise
+        finally:
+            os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+def _flock_timeout(fd, mode, timeout):
+    # flock has no timeout: try again without blocking, first often to get a short bus transaction right after the release
+    deadline = time.monotonic() + timeout
+    delay = POLL_MIN
+    while True:
+        try:
+            fcntl.flock(fd, mode | fcntl.LOCK_NB)
+            return True
+        except OSError as ex:
+            if ex.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, POLL_MAX)
+
+def hx711_locks(weight_sensors=None):
+    """ Locks of the clock lines of weight_sensors, of all HX711 if None. """
+    if not weight_sensors:
+        return [ResourceLock(HX711)]
+    pins = sorted(set(int(weight_sensor["pin_sck"]) for weight_sensor in weight_sensors))
+    return [ResourceLock(HX711, shared=True)] + [ResourceLock(hx711_resource(pin_sck)) for pin_sck in pins]
+
+def acquire_all(locks, timeout=LOCK_TIMEOUT, quiet=False):
+    """ Acquire the locks in the given order, returns the acquired ones. """
+    acquired = []
+    for lock in locks:
+        if lock.acquire(timeout, quiet):
+            acquired.append(lock)
+        else:
+            pid = lock.holder()
+            logger.warning('Continuing without ' + lock.name + ' after ' + str(timeout) + 's, held by PID ' + str(pid) + ('' if pid is None or pid_alive(pid) else ' which has ended') + '.')
+    return acquired
+
+def lock_all(locks, timeout=0):
+    """ Acquire all locks in the given order or none of them (timeout 0 does not wait), returns True if locked. """
+    acquired = []
+    for lock in locks:
+        if not lock.acquire(timeout, quiet=True):
+            release_all(acquired)
+            return False
+        acquired.append(lock)
+    return True
+
+def release_all(locks):
+    for lock in reversed(locks):
+        lock.release()
+
+@contextmanager
+def bus_lock(name, timeout=BUS_LOCK_TIMEOUT, quiet=False):
+    """ Lock of a bus within the context, continues without it after timeout or if the lock cannot be created. """
+    locks = []
+    try:
+        locks = acquire_all([ResourceLock(name)], timeout, quiet)
+    except OSError as ex:
+        if name not in _warned:
+            _warned.add(name)
+            logger.warning('Using ' + name + ' without lock: ' + repr(ex))
+    try:
+        yield
+    finally:
+        release_all(locks)
+
+def main():
+    if not os.path.isdir(lockFolder):
+        print('No locks in ' + lockFolder)
+        return
+    for file in sorted(os.listdir(lockFolder)):
+        if file.endswith('.lock'):
+            lock = ResourceLock(file[:-len('.lock')])
+            state = 'free'
+            if lock.locked():
+                pid = lock.holder()
+                state = 'shared' if pid is None else 'locked by PID ' + str(pid)
+            print(lock.name.ljust(16) + state)
+
+if __name__ == '__main__':
+    try:
+        main()
+    except (KeyboardInterrupt, SystemExit):
+        pass
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Deadline based scheduler used by the measurement routine.
+# All deadlines are kept on the monotonic clock so changes of the system time
+# (NTP, GPS or RTC sync) do not shift or skip jobs. Between two deadlines the
+# thread sleeps on the stop event, so setting it wakes the loop immediately.
+
+import heapq
+import itertools
+import threading
+import time
+import logging
+
+logger = logging.getLogger('HoneyPi.scheduler')
+
+MAX_SLEEP = 60 # seconds
+
+class Job:
+    def __init__(self, name, function, interval, args=(), kwargs=None):
+        self.name = name
+        self.function = function
+        self.interval = interval # seconds between two runs, None for a job which runs only once
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.deadline = None
+        self.cancelled = False
+        self.runs = 0
+        self.lateness_last = 0.0
+        self.lateness_max = 0.0
+        self.lateness_sum = 0.0
+
+    def record_lateness(self, lateness):
+        self.runs += 1
+        self.lateness_last = lateness
+        self.lateness_sum += lateness
+        if lateness > self.lateness_max:
+            self.lateness_max = lateness
+
+    def get_stats(self):
+        lateness_avg = 0.0
+        if self.runs > 0:
+            lateness_avg = self.lateness_sum / self.runs
+        return {'runs': self.runs, 'interval': self.interval, 'lateness_last': round(self.lateness_last, 4), 'lateness_avg': round(lateness_avg, 4), 'lateness_max': round(self.lateness_max, 4)}
+
+
+class Scheduler:
+    def __init__(self, stop_event=None, clock=time.monotonic):
+        self._stop_event = stop_event or threading.Event()
+        self._clock = clock
+        self._queue = [] # heap of (deadline, sequence, job)
+        self._sequence = itertools.count() # keeps jobs with the same deadline in insertion order
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def now(self):
+        return self._clock()
+
+    def add_job(self, name, function, interval=None, delay=0, args=(), kwargs=None):
+        """
+        Add a job which is called the first time after delay seconds and then every interval seconds.
+        A job with the same name replaces the existing one.
+        """
+        job = Job(name, function, interval, args, kwargs)
+        with self._lock:
+            if name in self._jobs:
+                self._jobs[name].cancelled = True
+            self._jobs[name] = job
+            self._push(job, self._clock() + max(0, delay))
+        return job
+
+    def call_later(self, name, delay, function, args=(), kwargs=None):
+        return self.add_job(name, function, None, delay, args, kwargs)
+
+    def cancel_job(self, name):
+        with self._lock:
+            job = self._jobs.pop(name, None)
+            if job is not None:
+                job.cancelled = True
+
+    def get_job(self, name):
+        return self._jobs.get(name, None)
+
+    def set_interval(self, name, interval):
+        """ Change the interval of a job. The next deadline is moved if the new interval ends earlier. """
+        with self._lock:
+            job = self._jobs.get(name, None)
+            if job is None or job.interval == interval:
+                return
+            logger.debug("Interval of job '" + name + "' changed from " + str(job.interval) + " to " + str(interval) + " seconds.")
+            old_interval = job.interval
+            job.interval = interval
+            if interval and old_interval and job.deadline is not None:
+                new_deadline = job.deadline - old_interval + interval
+                if new_deadline < job.deadline:
+                    job.cancelled = True
+                    job = self._clone(job)
+                    self._jobs[name] = job
+                    self._push(job, max(new_deadline, self._clock()))
+
+    def reschedule(self, name, delay):
+        """ Move the next deadline of a job to now + delay. """
+        with self._lock:
+            job = self._jobs.get(name, None)
+            if job is None:
+                return
+            job.cancelled = True
+            job = self._clone(job)
+            self._jobs[name] = job
+            self._push(job, self._clock() + max(0, delay))
+
+    def time_until(self, name):
+        job = self._jobs.get(name, None)
+        if job is None or job.deadline is None:
+            return None
+        return job.deadline - self._clock()
+
+    def get_stats(self):
+        return {name: job.get_stats() for (name, job) in self._jobs.items()}
+
+    def log_stats(self):
+        for (name, stats) in self.get_stats().items():
+            logger.debug("Job '" + name + "' runs: " + str(stats['runs']) + ", lateness last: " + str(stats['lateness_last']) + "s, avg: " + str(stats['lateness_avg']) + "s, max: " + str(stats['lateness_max']) + "s")
+
+    def run(self):
+        """ Run due jobs until the stop event is set. Sleeps until the next deadline in between. """
+        while not self._stop_event.is_set():
+            job = None
+            with self._lock:
+                while self._queue and self._queue[0][2].cancelled:
+                    heapq.heappop(self._queue)
+                if self._queue:
+                    deadline = self._queue[0][0]
+                    timeout = deadline - self._clock()
+                    if timeout <= 0:
+                        job = heapq.heappop(self._queue)[2]
+                else:
+                    timeout = None
+
+            if job is None:
+                # sleep until the next deadline or the stop event
+                self._sleep(timeout)
+                continue
+
+            self._run_job(job)
+
+    def _sleep(self, timeout):
+        # jobs are added and changed from within jobs, so the next deadline is known here
+        # changes from other threads are picked up after MAX_SLEEP seconds at the latest
+        if timeout is None or timeout > MAX_SLEEP:
+            timeout = MAX_SLEEP
+        self._stop_event.wait(timeout)
+
+    def _run_job(self, job):
+        started = self._clock()
+        lateness = started - job.deadline
+        job.record_lateness(lateness)
+        if lateness > 1:
+            logger.warning("Job '" + job.name + "' started " + str(round(lateness, 3)) + " seconds late.")
+        else:
+            logger.debug("Job '" + job.name + "' started " + str(round(lateness * 1000, 1)) + " ms after deadline.")
+
+        # schedule next run before running the job, so the job itself can change interval or cancel
+        with self._lock:
+            if not job.cancelled:
+                if job.interval:
+                    next_deadline = job.deadline + job.interval
+                    if next_deadline <= started:
+                        # skip runs which were missed completely but keep the phase of the deadlines
+                        missed = int((started - job.deadline) // job.interval)
+                        logger.warning("Job '" + job.name + "' missed " + str(missed) + " deadline(s).")
+                        next_deadline = job.deadline + (missed + 1) * job.interval
+                    self._push(job, next_deadline)
+                elif self._jobs.get(job.name, None) is job:
+                    del self._jobs[job.name]
+        try:
+            job.function(*job.args, **job.kwargs)
+        except Exception as ex:
+            logger.exception("Unhandled Exception in scheduled job '" + job.name + "'")
+
+    def _push(self, job, deadline):
+        job.deadline = deadline
+        heapq.heappush(self._queue, (deadline, next(self._sequence), job))
+
+    def _clone(self, job):
+        clone = Job(job.name, job.function, job.interval, job.args, job.kwargs)
+        clone.runs = job.runs
+        clone.lateness_last = job.lateness_last
+        clone.lateness_max = job.lateness_max
+        clone.lateness_sum = job.lateness_sum
+        return clone
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Sensor drivers keyed by the sensor type of settings.json.
+# A driver holds all configured sensors of its type, initializes them once (init),
+# creates the acquisition tasks for every measurement (tasks / measure) and releases them (close).
+# To add a new sensor type, add a driver class and register it in DRIVERS.
+# The read_* modules are imported by the drivers only when a sensor of their type is configured,
+# because some of them load heavy libraries (numpy, bme680, timezonefinder) or open the I2C bus.
+
+import importlib
+import logging
+from contextlib import nullcontext
+
+from acquisition import Task
+
+logger = logging.getLogger('HoneyPi.sensor_drivers')
+
+def sensor_fields(sensor):
+    # all ts_fields a sensor writes (keys starting with ts_field)
+    return [value for (key, value) in sensor.items() if key.startswith('ts_field') and value]
+
+
+class SensorDriver:
+    type_id = None
+    name = 'sensor'
+    bus = 'i2c' # resource the sensors are connected to, sensors on the same resource are read one after another
+    duration = 1 # expected seconds for one sensor
+    max_sensors = None # some sensors can only be connected once or twice (fixed I2C address)
+    exclusive = False # run while no other sensor is read
+    budget = 10 # seconds per sensor until the measurement is cancelled
+    order = 0 # order within the resource
+    isolated = False # bit-banged sensors are read in an own process (driver_host.py)
+    lock_bus = True # the I2C bus is locked against other processes for a whole measurement
+
+    def __init__(self, sensors):
+        if self.max_sensors is not None and len(sensors) > self.max_sensors:
+            logger.warning(str(len(sensors)) + " " + self.name + " sensors configured but only " + str(self.max_sensors) + " supported.")
+            sensors = sensors[:self.max_sensors]
+        self.sensors = sensors
+
+    def init(self):
+        pass
+
+    def resource(self, sensor):
+        return self.bus
+
+    def produces(self, sensor):
+        return sensor_fields(sensor)
+
+    def requires(self, sensor):
+        return []
+
+    def all_produces(self):
+        return [field for sensor in self.sensors for field in self.produces(sensor)]
+
+    def all_requires(self):
+        return [field for sensor in self.sensors for field in self.requires(sensor)]
+
+    def measure(self, ts_fields, sensorIndex, sensor):
+        raise NotImplementedError
+
+    def bus_lock(self):
+        # one flock of the I2C bus for all transactions of a measurement instead of one per transaction
+        if self.bus == 'i2c' and self.lock_bus:
+            from sensors.i2c_bus import get_bus
+            return get_bus()
+        return nullcontext()
+
+    def measure_locked(self, ts_fields, sensorIndex, sensor):
+        with self.bus_lock():
+            return self.measure(ts_fields, sensorIndex, sensor)
+
+    def tasks(self, cycle_data):
+        """ Acquisition tasks for one measurement. cycle_data holds values from the main process (e.g. filtered_temperature). """
+        return [Task(self.name + '-' + str(sensorIndex), self.resource(sensor), self.measure_locked, (sensorIndex, sensor), self.produces(sensor), self.requires(sensor), self.exclusive, self.order, self.duration, self.get_budget(sensor)) for (sensorIndex, sensor) in enumerate(self.sensors)]
+
+    def get_budget(self, sensor):
+        return self.budget
+
+    def close(self):
+        pass
+
+
+class SimpleSensorDriver(SensorDriver):
+    # driver for all sensors which only need their settings to be read
+    module = None # read_* module, imported when the driver is initialized
+    function = None # name of the measure function within module
+
+    def init(self):
+        self.measure_function = getattr(importlib.import_module(self.module), self.function)
+
+    def measure(self, ts_fields, sensorIndex, sensor):
+        return self.measure_function(sensor)
+
+
+class DS18B20Driver(SensorDriver):
+    type_id = 0
+    name = 'ds18b20'
+    bus = 'w1'
+    budget = 5
+
+    def init(self):
+        from read_ds18b20 import init_resolutions
+        init_resolutions(self.sensors)
+
+    def tasks(self, cycle_data):
+        return [Task(self.name, self.bus, self.measure_all, (cycle_data.get('ds18b20_estimates'),), self.all_produces(), expected=self.duration * len(self.sensors), budget=self.budget * len(self.sensors))]
+
+    def measure_all(self, ts_fields, estimates):
+        from read_ds18b20 import measure_temperatures
+        ds18b20_fields = {}
+        try:
+            # sensors without a filtered value of the sampler (ds18b20_sampler.py) are measured directly
+            direct = [sensorIndex for (sensorIndex, sensor) in enumerate(self.sensors) if 'ts_field' in sensor and (estimates is None or estimates[sensorIndex] is None)]
+            measured = dict(zip(direct, measure_temperatures([self.sensors[sensorIndex] for sensorIndex in direct])))
+            for (sensorIndex, sensor) in enumerate(self.sensors):
+                if sensorIndex in measured:
+                    ds18b20_temperature = measured[sensorIndex]
+                elif 'ts_field' in sensor:
+                    ds18b20_temperature = estimates[sensorIndex]
+                else:
+                    continue
+                if sensor["ts_field"] and ds18b20_temperature is not None:
+                    if 'offset' in sensor and sensor["offset"] is not None:
+                        ds18b20_temperature = ds18b20_temperature-float(sensor["offset"])
+                    ds18b20_temperature = float("{0:.2f}".format(ds18b20_temperature)) # round to two decimals
+                    ds18b20_fields.update({sensor["ts_field"]: ds18b20_temperature})
+        except Exception as ex:
+            logger.exception("Unhandled Exception in DS18B20Driver")
+        return ds18b20_fields
+
+
+class BME680Driver(SensorDriver):
+    type_id = 1
+    name = 'bme680'
+    max_sensors = 2
+    duration = 2
+
+    def init(self):
+        from read_bme680 import initBME680FromMain, burn_in_bme680, burn_in_time
+        self.inits = []
+        for (sensorIndex, bme680Sensor) in enumerate(self.sensors):
+            bme680Init = {'burn_in_time': burn_in_time}
+            if 'burn_in_time' in bme680Sensor:
+                bme680Init['burn_in_time'] = bme680Sensor["burn_in_time"]
+            sensor = initBME680FromMain(bme680Sensor)
+            bme680Init['sensor'] = sensor
+            if sensor is not None and 'ts_field_air_quality' in bme680Sensor:
+                gas_baseline = burn_in_bme680(sensor, bme680Init['burn_in_time'])
+            else:
+                gas_baseline = None
+            bme680Init['gas_baseline'] = gas_baseline
+            self.inits.append(bme680Init)
+
+    def tasks(self, cycle_data):
+        return [task for task in SensorDriver.tasks(self, cycle_data) if self.inits[task.args[0]]['sensor'] is not None]
+
+    def measure(self, ts_fields, sensorIndex, sensor):
+        # the gas baseline is kept for the next measurement
+        from read_bme680 import measure_bme680
+        bme680Init = self.inits[sensorIndex]
+        bme680_values, bme680Init['gas_baseline'] = measure_bme680(bme680Init['sensor'], bme680Init['gas_baseline'], sensor, bme680Init['burn_in_time'])
+        return bme680_values
+
+
+class HX711Fields(dict):
+    # fields of several scales, the quality notes in 'status' are joined
+    def update(self, fields):
+        if fields.get('status') and self.get('status'):
+            fields = dict(fields, status=self['status'] + '; ' + fields['status'])
+        dict.update(self, fields)
+
+
+class HX711Driver(SensorDriver):
+    type_id = 2
+    name = 'hx711'
+    bus = 'hx711'
+    duration = 10
+    budget = 45
+    exclusive = True # a thread switch while SCK is high powers down the HX711
+    isolated = True
+
+    def init(self):
+        from read_hx711 import get_hx711
+        # the HX711 stay in the pool of read_hx711, a measurement takes them from there (again initialized if needed)
+        self.samplers = []
+        for sensor in self.sensors:
+            hx = get_hx711(sensor)
+            sampler = None
+            if sensor.get('sampler') and hx:
+                # opt-in: read continuously in the background
+                from hx711_sampler import start_sampler
+                sampler = start_sampler(sensor, hx)
+            self.samplers.append(sampler)
+        # boards sharing the clock pin are read together
+        from read_hx711 import group_by_clock, init_hx711_multi
+        self.multi = []
+        unsampled = [i for (i, sampler) in enumerate(self.samplers) if sampler is None]
+        for group in group_by_clock([self.sensors[i] for i in unsampled]):
+            indexes = [unsampled[j] for j in group]
+            hx = init_hx711_multi([self.sensors[i] for i in indexes])
+            if hx:
+                self.multi.append((indexes, hx))
+
+    def produces(self, sensor):
+        # ts_field_temperature is an input for the temperature compensation
+        return [value for (key, value) in sensor.items() if key.startswith('ts_field') and key != 'ts_field_temperature' and value]
+
+    def requires(self, sensor):
+        if sensor.get('ts_field_temperature'):
+            return [sensor['ts_field_temperature']]
+        return []
+
+    def tasks(self, cycle_data):
+        # all HX711 are read in one task, they need the temperature fields for compensation
+        return [Task(self.name, self.bus, self.measure_all, (cycle_data.get('hx711_readings'), cycle_data.get('hx711_budget_factor', 1)), self.all_produces(), self.all_requires(), self.exclusive, expected=self.duration * len(self.sensors), budget=self.budget * len(self.sensors))]
+
+    def measure_all(self, ts_fields, readings=None, budget_factor=1):
+        from read_hx711 import measure_hx711, measure_hx711_multi
+        from utilities import start_single, stop_single
+        hx711_fields = HX711Fields()
+        # sampled scales only need their buffer, the others are read while their clock lines are locked
+        for (i, sensor) in enumerate(self.sensors):
+            if self.samplers[i] is not None:
+                hx711_fields.update(measure_hx711(sensor, ts_fields, num_measurements=readings, sampler=self.samplers[i], budget_factor=budget_factor))
+        if all(self.samplers):
+            return dict(hx711_fields)
+        if any(self.samplers):
+            # a sampled HX711 may share the clock with the other ones
+            from hx711_sampler import pause_samplers, resume_samplers
+            pause_samplers()
+        start_single([sensor for (i, sensor) in enumerate(self.sensors) if self.samplers[i] is None])
+        try:
+            grouped = []
+            for (indexes, hx) in self.multi:
+                hx711_fields.update(measure_hx711_multi([self.sensors[i] for i in indexes], ts_fields, hx, readings, budget_factor))
+                grouped.extend(indexes)
+            for (i, sensor) in enumerate(self.sensors):
+                if self.samplers[i] is None and i not in grouped:
+                    hx711_fields.update(measure_hx711(sensor, ts_fields, num_measurements=readings, budget_factor=budget_factor))
+        finally:
+            stop_single()
+            if any(self.samplers):
+                resume_samplers()
+        return dict(hx711_fields)
+
+    def close(self):
+        if any(getattr(self, 'samplers', [])):
+            from hx711_sampler import stop_samplers
+            stop_samplers()
+
+
+class DHTDriver(SensorDriver):
+    type_id = 3
+    name = 'dht'
+    duration = 2
+    budget = 20 # up to 8 retries
+    isolated = True
+
+    def resource(self, sensor):
+        return 'gpio-' + str(sensor.get('pin'))
+
+    def init(self):
+        from utilities import is_zero
+        if is_zero():
+            from read_dht_zero import measure_dht_zero
+            self.measure_function = measure_dht_zero
+        else:
+            from read_dht import measure_dht
+            self.measure_function = measure_dht
+
+    def measure(self, ts_fields, sensorIndex, sensor):
+        return self.measure_function(sensor)
+
+
+class MAXDriver(SimpleSensorDriver):
+    type_id = 4
+    name = 'max'
+    module = 'read_max'
+    function = 'measure_tc'
+    isolated = True
+
+    def resource(self, sensor):
+        return 'gpio-' + str(sensor.get('pin_clock'))
+
+
+class BME280Driver(SimpleSensorDriver):
+    type_id = 5
+    name = 'bme280'
+    max_sensors = 2
+    module = 'read_bme280'
+    function = 'measure_bme280'
+
+
+class PCF8591Driver(SimpleSensorDriver):
+    type_id = 6
+    name = 'pcf8591'
+    module = 'read_pcf8591'
+    function = 'measure_pcf8591'
+
+
+class EE895Driver(SimpleSensorDriver):
+    type_id = 7
+    name = 'ee895'
+    max_sensors = 1
+    module = 'read_ee895'
+    function = 'measure_ee895'
+
+
+class HDC1008Driver(SimpleSensorDriver):
+    type_id = 8
+    name = 'hdc1008'
+    module = 'read_hdc1008'
+    function = 'measure_hdc1008'
+
+
+class SHT31Driver(SimpleSensorDriver):
+    type_id = 9
+    name = 'sht31'
+    module = 'read_sht31'
+    function = 'measure_sht31'
+
+
+class AHT10Driver(SimpleSensorDriver):
+    type_id = 10
+    name = 'aht10'
+    module = 'read_aht10'
+    function = 'measure_aht10'
+
+
+class BH1750Driver(SimpleSensorDriver):
+    type_id = 11
+    name = 'bh1750'
+    max_sensors = 1
+    module = 'read_bh1750'
+    function = 'measure_bh1750'
+
+
+class SHT25Driver(SimpleSensorDriver):
+    type_id = 12
+    name = 'sht25'
+    module = 'read_sht25'
+    function = 'measure_sht25'
+
+
+class GPSDriver(SimpleSensorDriver):
+    type_id = 99
+    name = 'gps'
+    max_sensors = 1
+    duration = 10
+    order = 1 # waits for a fix up to its timeout, so it is read last on the bus
+    lock_bus = False # waits for a fix, PA1010D locks the bus per sentence
+    module = 'read_gps'
+    function = 'measure_gps'
+
+    def init(self):
+        SimpleSensorDriver.init(self)
+        from read_gps import init_gps
+        for gpsSensor in self.sensors:
+            init_gps(gpsSensor)
+
+    def produces(self, sensor):
+        return ['latitude', 'longitude', 'elevation']
+
+    def get_budget(self, sensor):
+        # waits for a fix up to its configured timeout
+        timeout = sensor.get('timeout')
+        if timeout is None:
+            timeout = 10
+        return float(timeout) + self.budget
+
+
+# registry of all sensor types, the order is the order the sensors are read on a shared bus
+DRIVERS = {}
+for driver in (DS18B20Driver, BME680Driver, HX711Driver, DHTDriver, MAXDriver, BME280Driver, PCF8591Driver, EE895Driver, HDC1008Driver, SHT31Driver, AHT10Driver, BH1750Driver, SHT25Driver, GPSDriver):
+    DRIVERS[driver.type_id] = driver
+
+def partition_sensors(settings):
+    """ Split the configured sensors by type in a single pass. Returns a dict type -> list of sensors. """
+    partitions = {}
+    try:
+        all_sensors = settings["sensors"]
+    except:
+        # Key doesn't exist => no sensors
+        return partitions
+    for sensor in all_sensors:
+        if "type" in sensor:
+            partitions.setdefault(sensor["type"], []).append(sensor)
+    return partitions
+
+def create_drivers(settings, partitions=None, isolate=True):
+    """ Create drivers for the configured sensor types only. Isolated drivers get an own process if isolate is set. """
+    if partitions is None:
+        partitions = partition_sensors(settings)
+    isolate = isolate and settings.get('driver_host', True)
+    drivers = []
+    for (type_id, driver) in DRIVERS.items():
+        if partitions.get(type_id):
+            if isolate and driver.isolated:
+                from driver_host import HostedDriver
+                drivers.append(HostedDriver(driver(partitions[type_id])))
+            else:
+                drivers.append(driver(partitions[type_id]))
+    for type_id in partitions:
+        if type_id not in DRIVERS:
+            logger.warning("Unknown sensor type '" + str(type_id) + "' in settings.")
+    return drivers
+
+def init_drivers(drivers):
+    for driver in drivers:
+        try:
+            driver.init()
+        except Exception as ex:
+            logger.exception("Unhandled Exception while initializing " + driver.name)
+    return drivers
+
+def close_drivers(drivers):
+    for driver in drivers:
+        try:
+            driver.close()
+        except Exception as ex:
+            logger.exception("Unhandled Exception while closing " + driver.name)
@@ -6,13 +6,47 @@ This file holds HX711 class
 # Source: https://github.com/gandalf15/HX711/blob/master/HX711_Python3/hx711.py
 # Changelog:
 # 2020-01-04: added readLock like https://github.com/tatobari/hx711py/blob/master/hx711.py
+# 2026-10-18: read lock per sample instead of per bit, block read and read statistics
+# 2026-10-18: robust statistics of the whole sample block in sensors/robust_stats.py
 
 import statistics as stat
+import sys
 import time
 import threading
+from contextlib import contextmanager
 
-import RPi.GPIO as GPIO
+from sensors.gpio_backend import GPIO
 
+from sensors import robust_stats
+
+# seconds a thread may run before the interpreter switches to another thread while a block is read
+BLOCK_SWITCH_INTERVAL = 0.05
+
+# the switch interval is process wide: several threads may read blocks at the same time
+_switch_lock = threading.Lock()
+_switch_readers = 0
+_switch_interval = None
+
+@contextmanager
+def block_switch_interval():
+    """
+    block_switch_interval sets BLOCK_SWITCH_INTERVAL while at least one block
+    is read. The first thread entering saves the interval, the last one leaving
+    restores it.
+    """
+    global _switch_readers, _switch_interval
+    with _switch_lock:
+        if _switch_readers == 0:
+            _switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(BLOCK_SWITCH_INTERVAL)
+        _switch_readers += 1
+    try:
+        yield
+    finally:
+        with _switch_lock:
+            _switch_readers -= 1
+            if _switch_readers == 0:
+                sys.setswitchinterval(_switch_interval)
 
 class HX711:
     """
@@ -65,8 +99,11 @@ class HX711:
         self._scale_ratio_A_64 = 1  # scale ratio for channel A and gain 64
         self._scale_ratio_B = 1  # scale ratio for channel B
         self._debug_mode = False     # init debug mode to True
-        self._data_filter = outliers_filter  # default it is used outliers_filter
+        self._data_filter = robust_stats.median_filter  # default it is used outliers_filter (vectorized with numpy)
         self._num_data_filtered_out =  0 # number of data filtered out by the data_filter
+        self._num_aborted_reads = 0  # reads aborted because pd_sck was HIGH for too long
+        self._num_invalid_reads = 0  # reads with the highest or lowest possible value
+        self._num_not_ready = 0  # reads where the data was not ready in time
 
         GPIO.setup(self._pd_sck, GPIO.OUT)  # pin _pd_sck is output only
         GPIO.setup(self._dout, GPIO.IN)  # pin _dout is input only
@@ -327,46 +364,82 @@ class HX711:
         else:
             return False
 
-    def _set_channel_gain(self, num):
+    def _gain_pulses(self):
         """
-        _set_channel_gain is called only from _read method.
-        It finishes the data transmission for HX711 which sets
-        the next required gain and channel.
+        _gain_pulses returns the number of additional clock pulses after
+        the 24 data bits which select channel and gain for the next reading.
 
-        Args:
-            num(int): how many ones it sends to HX711
-                options (1 || 2 || 3)
+        Returns: int (1 || 2 || 3)
+        """
+        if self._wanted_channel == 'A' and self._gain_channel_A == 128:
+            return 1
+        elif self._wanted_channel == 'A' and self._gain_channel_A == 64:
+            return 3
+        else:
+            return 2
 
-        Returns: bool True if HX711 is ready for the next reading
-            False if HX711 is not ready for the next reading
+    def _wait_ready(self, timeout=0.4):
         """
-        for _ in range(num):
-            # Wait for and get the Read Lock, incase another thread is already
-            # driving the HX711 serial interface.
-            self.readLock.acquire()
+        _wait_ready waits until the HX711 has finished the conversion.
 
-            start_counter = time.perf_counter()
-            GPIO.output(self._pd_sck, True)
-            GPIO.output(self._pd_sck, False)
-            end_counter = time.perf_counter()
+        Args:
+            timeout(float): seconds to wait. At 10 SPS a conversion takes 100 ms.
 
-            # Release the Read Lock, now that we've finished driving the HX711
-            # serial interface.
-            self.readLock.release()
+        Returns: bool True if data is ready, False on timeout
+        """
+        if self._ready():
+            return True
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            time.sleep(0.001)
+            if self._ready():
+                return True
+        return False
+
+    def _read_sample(self):
+        """
+        _read_sample clocks out one sample (24 data bits and the gain pulses).
+        The read lock is held for the whole sample, the time pd_sck is HIGH is
+        measured around the two output calls of every clock pulse.
 
-            # check if hx 711 did not turn off...
-            if end_counter - start_counter >= 0.00006:
+        Returns: (tuple) (data_in, gain_ok) where data_in is the 24 bit raw value
+            or None if pd_sck was HIGH for too long while reading the data
+        """
+        output = GPIO.output
+        gpio_input = GPIO.input
+        perf_counter = time.perf_counter
+        pd_sck = self._pd_sck
+        dout = self._dout
+        slow = False
+        gain_ok = True
+        data_in = 0  # 2's complement data from hx 711
+        # Wait for and get the Read Lock, incase another thread is already
+        # driving the HX711 serial interface.
+        with self.readLock:
+            for _ in range(24):
+                # request next bit from hx 711
+                start_counter = perf_counter()
+                output(pd_sck, True)
+                output(pd_sck, False)
                 # if pd_sck pin is HIGH for 60 us and more than the HX 711 enters power down mode.
-                if self._debug_mode:
-                    print('Not enough fast while setting gain and channel')
-                    print(
-                        'Time elapsed: {}'.format(end_counter - start_counter))
-                # hx711 has turned off. First few readings are inaccurate.
-                # Despite it, this reading was ok and data can be used.
-                result = self.get_raw_data_mean(6)  # set for the next reading.
-                if result == False:
-                    return False
-        return True
+                if perf_counter() - start_counter >= 0.00006:
+                    slow = True
+                # Shift the bits as they come to data_in variable.
+                # Left shift by one bit then bitwise OR with the new bit.
+                data_in = (data_in << 1) | gpio_input(dout)
+            # finish the data transmission, this sets the next required gain and channel
+            for _ in range(self._gain_pulses()):
+                start_counter = perf_counter()
+                output(pd_sck, True)
+                output(pd_sck, False)
+                if perf_counter() - start_counter >= 0.00006:
+                    gain_ok = False
+        if slow:
+            self._num_aborted_reads += 1
+            if self._debug_mode:
+                print('Not enough fast while reading data')
+            return None, gain_ok
+        return data_in, gain_ok
 
     def _read(self):
         """
@@ -377,61 +450,25 @@ class HX711:
             if it returns int then the reading was correct
         """
         GPIO.output(self._pd_sck, False)  # start by setting the pd_sck to 0
-        ready_counter = 0
-        while (not self._ready() and ready_counter <= 40):
-            time.sleep(0.01)  # sleep for 10 ms because data is not ready
-            ready_counter += 1
-            if ready_counter == 40:  # if counter reached max value then return False
-                if self._debug_mode:
-                    print('self._read() not ready after 40 trials')
-                return False
-
-        # read first 24 bits of data
-        data_in = 0  # 2's complement data from hx 711
-        for _ in range(24):
-            # Wait for and get the Read Lock, incase another thread is already
-            # driving the HX711 serial interface.
-            self.readLock.acquire()
-
-            start_counter = time.perf_counter()
-            # request next bit from hx 711
-            GPIO.output(self._pd_sck, True)
-            GPIO.output(self._pd_sck, False)
-            end_counter = time.perf_counter()
-
-            # Release the Read Lock, now that we've finished driving the HX711
-            # serial interface.
-            self.readLock.release()
-
-            if end_counter - start_counter >= 0.00006:  # check if the hx 711 did not turn off...
-                # if pd_sck pin is HIGH for 60 us and more than the HX 711 enters power down mode.
-                if self._debug_mode:
-                    print('Not enough fast while reading data')
-                    print(
-                        'Time elapsed: {}'.format(end_counter - start_counter))
-                return False
-            # Shift the bits as they come to data_in variable.
-            # Left shift by one bit then bitwise OR with the new bit.
-            data_in = (data_in << 1) | GPIO.input(self._dout)
-
-        if self._wanted_channel == 'A' and self._gain_channel_A == 128:
-            if not self._set_channel_gain(1):  # send only one bit which is 1
-                return False  # return False because channel was not set properly
-            else:
-                self._current_channel = 'A'  # else set current channel variable
-                self._gain_channel_A = 128  # and gain
-        elif self._wanted_channel == 'A' and self._gain_channel_A == 64:
-            if not self._set_channel_gain(3):  # send three ones
-                return False  # return False because channel was not set properly
-            else:
-                self._current_channel = 'A'  # else set current channel variable
-                self._gain_channel_A = 64
-        else:
-            if not self._set_channel_gain(2):  # send two ones
-                return False  # return False because channel was not set properly
-            else:
-                self._current_channel = 'B'  # else set current channel variable
+        if not self._wait_ready():
+            self._num_not_ready += 1
+            if self._debug_mode:
+                print('self._read() not ready after 400 ms')
+            return False
 
+        data_in, gain_ok = self._read_sample()
+        if data_in is None:
+            return False
+        if not gain_ok:
+            # hx711 has turned off while setting gain and channel. First few readings are inaccurate.
+            # Despite it, this reading was ok and data can be used.
+            if self._debug_mode:
+                print('Not enough fast while setting gain and channel')
+            for _ in range(6):  # set for the next reading.
+                GPIO.output(self._pd_sck, False)
+                if self._wait_ready():
+                    self._read_sample()
+        self._current_channel = self._wanted_channel
         if self._debug_mode:  # print 2's complement value
             print('Binary value as received: {}'.format(bin(data_in)))
 
@@ -440,6 +477,7 @@ class HX711:
                 or  # 0x7fffff is the highest possible value from hx711
                 data_in == 0x800000
            ):  # 0x800000 is the lowest possible value from hx711
+            self._num_invalid_reads += 1
             if self._debug_mode:
                 print('Invalid data detected: {}'.format(data_in))
             return False  # rturn false because the data is invalid
@@ -458,6 +496,33 @@ class HX711:
 
         return signed_data
 
+    def read_block(self, readings):
+        """
+        read_block reads consecutive samples as fast as the HX711 delivers them
+        (10 or 80 SPS). While reading, the interpreter switches less often to other
+        threads so the clock pulses are not interrupted.
+
+        Args:
+            readings(int): Number of samples
+
+        Returns: list of (bool || int) samples, False for invalid or aborted reads
+        """
+        with block_switch_interval():
+            return [self._read() for _ in range(readings)]
+
+    def get_read_statistics(self):
+        """
+        get_read_statistics returns the number of reads which were thrown away.
+
+        Returns: dict with 'aborted' (clock too slow), 'invalid' (out of range) and 'not_ready' (timeout)
+        """
+        return {'aborted': self._num_aborted_reads, 'invalid': self._num_invalid_reads, 'not_ready': self._num_not_ready}
+
+    def reset_read_statistics(self):
+        self._num_aborted_reads = 0
+        self._num_invalid_reads = 0
+        self._num_not_ready = 0
+
     def get_raw_data_mean(self, readings=30):
         """
         get_raw_data_mean returns mean value of readings.
@@ -471,10 +536,8 @@ class HX711:
         # do backup of current channel befor reading for later use
         backup_channel = self._current_channel
         backup_gain = self._gain_channel_A
-        data_list = []
         # do required number of readings
-        for _ in range(readings):
-            data_list.append(self._read())
+        data_list = self.read_block(readings)
         data_mean = False
         if readings > 2 and self._data_filter:
             filtered_data = self._data_filter(data_list)
@@ -485,8 +548,8 @@ class HX711:
                 print('data_list: {}'.format(data_list))
                 print('filtered_data list: {}'.format(filtered_data))
                 print('number of elements removed by filter: ' + str(self._num_data_filtered_out))
-                print('data_mean:', stat.mean(filtered_data))
-            data_mean = stat.mean(filtered_data)
+                print('data_mean:', robust_stats.mean(filtered_data))
+            data_mean = robust_stats.mean(filtered_data)
         else:
             data_mean = stat.mean(data_list)
         self._save_last_raw_data(backup_channel, backup_gain, data_mean)
@@ -705,33 +768,6 @@ def outliers_filter(data_list):
 
     Returns: list of filtered data. Excluding outliers.
     """
-    data = []
-    for num in data_list:
-        if num:
-            data.append(num)
     # set 'm' to lower value to remove more outliers
     # set 'm' to higher value to keep more data samples (also some outliers)
-    m = 2.0
-    # It calculates the absolute distance to the median.
-    # Then it scales the distances by their median value (again)
-    # so they are on a relative scale to 'm'.
-    if len(data) != 0:
-        data_median = stat.median(data)
-        abs_distance = []
-        for num in data:
-            abs_distance.append(abs(num - data_median))
-        mdev = stat.median(abs_distance)
-        s = []
-        if mdev:
-            for num in abs_distance:
-                s.append(num / mdev)
-        else:
-            # mdev is 0. Therefore all data samples in the list data have the same value.
-            return data
-        filtered_data = []
-        for i in range(len(data)):
-            if s[i] < m:
-                filtered_data.append(data[i])
-        return filtered_data
-    else:
-        return data #data is empty!
+    return list(robust_stats.median_filter(data_list, m=2.0))
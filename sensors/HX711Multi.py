@@ -0,0 +1,196 @@
+"""
+This file holds HX711Multi class
+"""
+#!/usr/bin/env python3
+
+# Several HX711 boards with a common PD_SCK line are clocked together and every DOUT pin
+# is sampled on each clock pulse, so N load cells are read in the time of one.
+# Based on the HX711 class (sensors/HX711.py).
+
+import time
+import threading
+
+from sensors.gpio_backend import GPIO
+
+from sensors.HX711 import block_switch_interval
+
+
+class HX711Multi:
+    """
+    HX711Multi represents several HX711 chips sharing the clock pin.
+    """
+
+    def __init__(self,
+                 dout_pins,
+                 pd_sck_pin,
+                 gain_channel_A=128,
+                 select_channel='A'):
+        """
+        Init a new instance of HX711Multi
+
+        Args:
+            dout_pins([int]): Raspberry Pi pin numbers where the Data pins of the HX711 are connected.
+            pd_sck_pin(int): Raspberry Pi pin number where the common Clock pin is connected.
+            gain_channel_A(int): Optional, by default value 128. Options (128 || 64)
+            select_channel(str): Optional, by default 'A'. Options ('A' || 'B')
+
+        Raises:
+            TypeError: if pd_sck_pin or dout_pins are not int type
+            ValueError: if channel or gain are not valid
+        """
+        if not isinstance(pd_sck_pin, int):
+            raise TypeError('pd_sck_pin must be type int. '
+                            'Received pd_sck_pin: {}'.format(pd_sck_pin))
+        for dout_pin in dout_pins:
+            if not isinstance(dout_pin, int):
+                raise TypeError('dout_pin must be type int. '
+                                'Received dout_pin: {}'.format(dout_pin))
+        channel = select_channel.capitalize()
+        if channel == 'A' and gain_channel_A == 128:
+            self._gain_pulses = 1
+        elif channel == 'A' and gain_channel_A == 64:
+            self._gain_pulses = 3
+        elif channel == 'B':
+            self._gain_pulses = 2
+        else:
+            raise ValueError('Channel has to be "A" or "B" and gain 128 or 64. '
+                             'Received: {} {}'.format(select_channel, gain_channel_A))
+
+        # Mutex for reading from the HX711, in case multiple threads in client
+        # software try to access get values from the class at the same time.
+        self.readLock = threading.Lock()
+        self._pd_sck = pd_sck_pin
+        self._douts = list(dout_pins)
+        self._channel = channel
+        self._num_aborted_reads = 0  # reads aborted because pd_sck was HIGH for too long
+        self._num_invalid_reads = 0  # samples with the highest or lowest possible value
+        self._num_not_ready = 0  # reads where the data of a chip was not ready in time
+
+        GPIO.setup(self._pd_sck, GPIO.OUT)  # pin _pd_sck is output only
+        for dout in self._douts:
+            GPIO.setup(dout, GPIO.IN)  # pins _douts are input only
+        # the first conversion after a channel or gain change is garbage
+        self._read()
+        time.sleep(0.1)
+        if not self._ready():  # settling time after channel/resoulution change
+            time.sleep(0.4)
+
+    def get_dout_pins(self):
+        return list(self._douts)
+
+    def _ready(self):
+        """
+        _ready method check if data of all chips is prepared for reading
+
+        Returns: bool True if ready else False when not ready
+        """
+        for dout in self._douts:
+            if GPIO.input(dout) != 0:
+                return False
+        return True
+
+    def _wait_ready(self, timeout=0.4):
+        if self._ready():
+            return True
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            time.sleep(0.001)
+            if self._ready():
+                return True
+        return False
+
+    def _read_sample(self):
+        """
+        _read_sample clocks out one sample of every chip. All DOUT pins are read
+        while pd_sck is LOW, only the HIGH time is limited to 60 us.
+
+        Returns: list of 24 bit raw values (one per chip) or None if
+            pd_sck was HIGH for too long
+        """
+        output = GPIO.output
+        gpio_input = GPIO.input
+        perf_counter = time.perf_counter
+        pd_sck = self._pd_sck
+        douts = self._douts
+        data_in = [0] * len(douts)
+        slow = False
+        with self.readLock:
+            for _ in range(24):
+                start_counter = perf_counter()
+                output(pd_sck, True)
+                output(pd_sck, False)
+                if perf_counter() - start_counter >= 0.00006:
+                    # if pd_sck pin is HIGH for 60 us and more than the HX 711 enters power down mode.
+                    slow = True
+                for (i, dout) in enumerate(douts):
+                    data_in[i] = (data_in[i] << 1) | gpio_input(dout)
+            # set channel and gain for the next reading
+            for _ in range(self._gain_pulses):
+                output(pd_sck, True)
+                output(pd_sck, False)
+        if slow:
+            self._num_aborted_reads += 1
+            return None
+        return data_in
+
+    def _read(self):
+        """
+        _read reads one sample of every chip.
+
+        Returns: list of (bool || int) per chip, False for an invalid value.
+            False if the read failed for all chips.
+        """
+        GPIO.output(self._pd_sck, False)  # start by setting the pd_sck to 0
+        if not self._wait_ready():
+            self._num_not_ready += 1
+            return False
+        data_in = self._read_sample()
+        if data_in is None:
+            return False
+        values = []
+        for raw in data_in:
+            # 0x7fffff and 0x800000 are the highest and lowest possible values
+            if raw == 0x7fffff or raw == 0x800000:
+                self._num_invalid_reads += 1
+                values.append(False)
+            elif raw & 0x800000:
+                values.append(-((raw ^ 0xffffff) + 1))  # convert from 2's complement to int
+            else:
+                values.append(raw)
+        return values
+
+    def read_block(self, readings):
+        """
+        read_block reads consecutive samples of all chips.
+
+        Args:
+            readings(int): Number of samples
+
+        Returns: list with one list of (bool || int) samples per chip
+        """
+        series = [[] for _ in self._douts]
+        with block_switch_interval():
+            for _ in range(readings):
+                values = self._read()
+                if values is False:
+                    values = [False] * len(self._douts)
+                for (i, value) in enumerate(values):
+                    series[i].append(value)
+        return series
+
+    def get_read_statistics(self):
+        return {'aborted': self._num_aborted_reads, 'invalid': self._num_invalid_reads, 'not_ready': self._num_not_ready}
+
+    def reset_read_statistics(self):
+        self._num_aborted_reads = 0
+        self._num_invalid_reads = 0
+        self._num_not_ready = 0
+
+    def power_down(self):
+        GPIO.output(self._pd_sck, False)
+        GPIO.output(self._pd_sck, True)
+        time.sleep(0.01)
+
+    def power_up(self):
+        GPIO.output(self._pd_sck, False)
+        time.sleep(0.01)
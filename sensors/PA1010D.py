@@ -1,5 +1,5 @@
 import time
-import smbus
+from sensors.i2c_bus import get_bus
 
 
 import pynmea2
@@ -59,7 +59,7 @@ class PA1010D():
 
     def __init__(self, i2c_addr=PA1010D_ADDR, debug=False):
         self._i2c_addr = i2c_addr
-        self._i2c = smbus.SMBus(1)
+        self._i2c = get_bus()
 
         self._debug = debug
 
@@ -112,8 +112,9 @@ class PA1010D():
 
         """
         try:
-            for char_index in bytestring:
-                self._i2c.write_byte(self._i2c_addr, char_index)
+            with self._i2c:
+                for char_index in bytestring:
+                    self._i2c.write_byte(self._i2c_addr, char_index)
         except IOError as ex:
             raise IOError(str(ex))
         except Exception as ex:
@@ -156,19 +157,21 @@ class PA1010D():
             buf = []
             timeout += time.time()
 
-            while time.time() < timeout:
-                char = self._i2c.read_byte_data(self._i2c_addr, 0x00)
+            # one sentence is read while the bus is locked, the characters are a stream
+            with self._i2c:
+                while time.time() < timeout:
+                    char = self._i2c.read_byte_data(self._i2c_addr, 0x00)
 
-                if len(buf) == 0 and char != ord("$"):
-                    continue
+                    if len(buf) == 0 and char != ord("$"):
+                        continue
 
-                buf += [char]
+                    buf += [char]
 
-                # Check for end of line
-                # Should be a full \r\n since the GPS emits spurious newlines
-                if buf[-2:] == [ord("\r"), ord("\n")]:
-                    # Remove line ending and spurious newlines from the sentence
-                    return bytearray(buf).decode("ascii").strip().replace("\n","")
+                    # Check for end of line
+                    # Should be a full \r\n since the GPS emits spurious newlines
+                    if buf[-2:] == [ord("\r"), ord("\n")]:
+                        # Remove line ending and spurious newlines from the sentence
+                        return bytearray(buf).decode("ascii").strip().replace("\n","")
 
             raise TimeoutError("Timeout waiting for readline")
 
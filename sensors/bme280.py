@@ -18,20 +18,17 @@
 # https://www.raspberrypi-spy.co.uk/
 #
 #--------------------------------------
-import smbus
 import time
 from ctypes import c_short
 from ctypes import c_byte
 from ctypes import c_ubyte
-from sensors.sensor_utilities import get_smbus
+from sensors.i2c_bus import get_bus
 import logging
 
 logger = logging.getLogger('HoneyPi.bme280')
 
 DEVICE = 0x76 # Default device I2C address
 
-bus = smbus.SMBus(get_smbus())
-
 def getShort(data, index):
   # return two bytes from data as a signed 16-bit value
   return c_short((data[index+1] << 8) + data[index]).value
@@ -55,7 +52,7 @@ def getUChar(data,index):
 def readBME280ID(addr=DEVICE):
   # Chip ID Register Address
   REG_ID     = 0xD0
-  (chip_id, chip_version) = bus.read_i2c_block_data(addr, REG_ID, 2)
+  (chip_id, chip_version) = get_bus().read_i2c_block_data(addr, REG_ID, 2)
   return (chip_id, chip_version)
 
 def readBME280All(addr=DEVICE):
@@ -76,16 +73,16 @@ def readBME280All(addr=DEVICE):
 
       # Oversample setting for humidity register - page 26
       OVERSAMPLE_HUM = 2
-      bus.write_byte_data(addr, REG_CONTROL_HUM, OVERSAMPLE_HUM)
+      get_bus().write_byte_data(addr, REG_CONTROL_HUM, OVERSAMPLE_HUM)
 
       control = OVERSAMPLE_TEMP<<5 | OVERSAMPLE_PRES<<2 | MODE
-      bus.write_byte_data(addr, REG_CONTROL, control)
+      get_bus().write_byte_data(addr, REG_CONTROL, control)
 
       # Read blocks of calibration data from EEPROM
       # See Page 22 data sheet
-      cal1 = bus.read_i2c_block_data(addr, 0x88, 24)
-      cal2 = bus.read_i2c_block_data(addr, 0xA1, 1)
-      cal3 = bus.read_i2c_block_data(addr, 0xE1, 7)
+      cal1 = get_bus().read_i2c_block_data(addr, 0x88, 24)
+      cal2 = get_bus().read_i2c_block_data(addr, 0xA1, 1)
+      cal3 = get_bus().read_i2c_block_data(addr, 0xE1, 7)
 
       # Convert byte data to word values
       dig_T1 = getUShort(cal1, 0)
@@ -121,7 +118,7 @@ def readBME280All(addr=DEVICE):
       time.sleep(wait_time/1000)  # Wait the required time
 
       # Read temperature/pressure/humidity
-      data = bus.read_i2c_block_data(addr, REG_DATA, 8)
+      data = get_bus().read_i2c_block_data(addr, REG_DATA, 8)
       pres_raw = (data[0] << 12) | (data[1] << 4) | (data[2] >> 4)
       temp_raw = (data[3] << 12) | (data[4] << 4) | (data[5] >> 4)
       hum_raw = (data[6] << 8) | data[7]
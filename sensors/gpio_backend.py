@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# GPIO backend of the bit-banged sensors (HX711).
+# GPIO forwards to RPi.GPIO on the Raspberry Pi. With use_simulation() or the environment
+# variable HONEYPI_GPIO=simulation it forwards to SimulatedGPIO instead, where simulated
+# chips are attached to the pins, so the weight pipeline also runs on an ordinary Linux box.
+
+import os
+import random
+import time
+import logging
+
+logger = logging.getLogger('HoneyPi.gpio_backend')
+
+class GPIOBackend:
+    """ Forwards to the selected backend, RPi.GPIO is imported on first use. """
+    def __init__(self):
+        self.__dict__['_backend'] = None
+
+    def __getattr__(self, name):
+        if self._backend is None:
+            if os.environ.get('HONEYPI_GPIO') == 'simulation':
+                set_backend(SimulatedGPIO())
+            else:
+                import RPi.GPIO
+                set_backend(RPi.GPIO)
+        return getattr(self._backend, name)
+
+GPIO = GPIOBackend()
+
+def set_backend(backend):
+    GPIO.__dict__['_backend'] = backend
+
+def get_backend():
+    return GPIO._backend
+
+def use_simulation():
+    """ Switch to a new SimulatedGPIO and return it to attach simulated chips. """
+    backend = SimulatedGPIO()
+    set_backend(backend)
+    return backend
+
+
+class SimulatedGPIO:
+    """ The part of RPi.GPIO used by the sensors, the pins are driven by attached devices. """
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    HIGH = 1
+    LOW = 0
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self):
+        self._inputs = {} # pin -> device driving the pin
+        self._outputs = {} # pin -> devices listening to the pin
+        self._levels = {}
+
+    def attach(self, device):
+        for pin in device.output_pins():
+            self._inputs[pin] = device
+        for pin in device.input_pins():
+            self._outputs.setdefault(pin, []).append(device)
+        return device
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None, initial=None):
+        if direction == self.OUT and initial is not None:
+            self.output(pin, initial)
+
+    def output(self, pin, value):
+        value = 1 if value else 0
+        self._levels[pin] = value
+        for device in self._outputs.get(pin, ()):
+            device.pin_changed(pin, value)
+
+    def input(self, pin):
+        device = self._inputs.get(pin)
+        if device is not None:
+            return device.read_pin(pin)
+        return self._levels.get(pin, 0)
+
+    def cleanup(self, pins=None):
+        pass
+
+
+class SimulatedHX711:
+    """
+    HX711 on the bit level: conversions with sps samples per second, 24 bit two's complement
+    data MSB first on the rising edges of PD_SCK, 1-3 additional pulses select channel and gain
+    of the next conversion and PD_SCK HIGH for 60 us or more powers the chip down.
+
+    raw is the noiseless value (or a function of the time returning it), noise the standard
+    deviation, spike_rate the share of conversions with a spike of spike_size, drop_rate the
+    share of bits read with the wrong level and slow_clock_rate the share of clock pulses
+    stretched to more than 60 us (a busy host).
+    """
+    POWER_DOWN = 0.00006
+
+    def __init__(self, dout_pin, pd_sck_pin, raw=100000, noise=0, spike_rate=0, spike_size=50000, drop_rate=0, slow_clock_rate=0, sps=80, seed=None):
+        self.dout_pin = dout_pin
+        self.pd_sck_pin = pd_sck_pin
+        self.raw = raw
+        self.noise = noise
+        self.spike_rate = spike_rate
+        self.spike_size = spike_size
+        self.drop_rate = drop_rate
+        self.slow_clock_rate = slow_clock_rate
+        self.sps = sps
+        self.random = random.Random(seed)
+        self.conversions = 0
+        self.power_downs = 0
+        self._sck = 0
+        self._rise = None
+        self._pulses = 0 # clock pulses of the running transfer
+        self._data = 0
+        self._dout = 1
+        self._ready_at = time.perf_counter() + 1.0 / sps
+
+    def output_pins(self):
+        return [self.dout_pin]
+
+    def input_pins(self):
+        return [self.pd_sck_pin]
+
+    def _value(self):
+        raw = self.raw(time.monotonic()) if callable(self.raw) else self.raw
+        value = int(round(raw + self.random.gauss(0, self.noise))) if self.noise else int(raw)
+        if self.spike_rate and self.random.random() < self.spike_rate:
+            value += self.random.choice((-1, 1)) * self.spike_size
+        # the chip saturates at the highest and lowest 24 bit value
+        return max(-0x800000, min(0x7fffff, value))
+
+    def read_pin(self, pin):
+        now = time.perf_counter()
+        if self._sck and now - self._rise >= self.POWER_DOWN:
+            return 1 # powered down
+        if self._pulses == 0 or self._pulses > 24:
+            # DOUT goes LOW when the next conversion is ready
+            if now < self._ready_at:
+                return 1
+            self._pulses = 0
+            return 0
+        if self.drop_rate and self.random.random() < self.drop_rate:
+            return 1 - self._dout
+        return self._dout
+
+    def pin_changed(self, pin, value):
+        now = time.perf_counter()
+        if value:
+            self._sck = 1
+            self._rise = now
+            if self.slow_clock_rate and self.random.random() < self.slow_clock_rate:
+                # the host was interrupted while PD_SCK is HIGH
+                time.sleep(2 * self.POWER_DOWN)
+            if self._pulses > 24 and now >= self._ready_at:
+                self._pulses = 0 # the gain pulses ended with the last conversion
+            if self._pulses == 0:
+                if now < self._ready_at:
+                    return # clocked while no data is ready: ignored by the chip
+                self._data = self._value() & 0xffffff
+            if self._pulses < 27:
+                self._pulses += 1
+            if self._pulses <= 24:
+                self._dout = (self._data >> (24 - self._pulses)) & 1
+            else:
+                self._dout = 1 # DOUT goes HIGH after the 25th pulse
+            return
+        # falling edge
+        self._sck = 0
+        if self._rise is not None and now - self._rise >= self.POWER_DOWN:
+            # the chip was powered down and powers up now, the first conversion needs the settling time
+            self.power_downs += 1
+            self._pulses = 0
+            self._ready_at = now + 4.0 / self.sps
+        elif self._pulses == 25:
+            # the next conversion starts with the 25th pulse, further pulses only change the gain
+            self.conversions += 1
+            self._ready_at = now + 1.0 / self.sps
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# I2C buses shared by all drivers of a process.
+# get_bus() returns one I2CBus per bus number. It has the methods of smbus.SMBus, opens the bus
+# on first use (again in a forked child, with new locks), serializes the transactions with a
+# thread lock and counts the transactions and errors per address.
+# "with get_bus() as bus:" keeps the thread lock for several transactions and also locks the bus
+# against other processes (e.g. measurement.py of the webinterface) with the flock of
+# resource_lock.i2c_resource, sensor_drivers takes it once per measurement. A single transaction
+# is atomic in the kernel. With use_fake() or the environment variable HONEYPI_I2C=fake the
+# buses are FakeSMBus, where fake devices are attached to the addresses.
+#
+# Usage: python3 -m sensors.i2c_bus [bus] (scan the bus like i2cdetect)
+
+import errno
+import os
+import sys
+import threading
+import logging
+
+from resource_lock import ResourceLock, i2c_resource, BUS_LOCK_TIMEOUT
+
+logger = logging.getLogger('HoneyPi.i2c_bus')
+
+_backend = None # module or object with the class SMBus: smbus, smbus2 or FakeI2C
+_buses = {} # bus number -> I2CBus
+_buses_lock = threading.Lock()
+_default_number = None
+
+def set_backend(backend):
+    global _backend
+    with _buses_lock:
+        for bus in _buses.values():
+            bus.close()
+        _buses.clear()
+        _backend = backend
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if os.environ.get('HONEYPI_I2C') == 'fake':
+            _backend = FakeI2C()
+        else:
+            try:
+                import smbus
+                _backend = smbus
+            except ImportError:
+                import smbus2
+                _backend = smbus2
+    return _backend
+
+def use_fake():
+    """ Switch to a new FakeI2C and return it to attach fake devices. """
+    backend = FakeI2C()
+    set_backend(backend)
+    return backend
+
+def default_number():
+    global _default_number
+    if _default_number is None:
+        from sensors.sensor_utilities import get_smbus
+        _default_number = get_smbus()
+        if _default_number is None:
+            _default_number = 1
+    return _default_number
+
+def get_bus(number=None):
+    """ The shared I2CBus of bus number (0 on a Raspberry Pi 1, otherwise 1 if None). """
+    if number is None:
+        number = default_number()
+    with _buses_lock:
+        if number not in _buses:
+            _buses[number] = I2CBus(number)
+        return _buses[number]
+
+def _after_fork():
+    # a thread of the parent may have held a lock while forking, it does not exist in the child
+    global _buses_lock
+    _buses_lock = threading.Lock()
+    for bus in _buses.values():
+        bus._reset()
+
+os.register_at_fork(after_in_child=_after_fork)
+
+def take_statistics():
+    """ Transactions and errors per (bus number, address) since the last call. """
+    statistics = {}
+    with _buses_lock:
+        buses = list(_buses.values())
+    for bus in buses:
+        for (address, counters) in bus.take_statistics().items():
+            statistics[(bus.number, address)] = counters
+    return statistics
+
+
+class I2CBus:
+    """ smbus.SMBus shared by the threads of a process, every method locks the bus for the threads. """
+    def __init__(self, number):
+        self.number = number
+        self._lock = threading.RLock()
+        self._depth = 0 # nested entries of the lock, the resource is locked by the outermost one
+        self._resource = ResourceLock(i2c_resource(number), keep_open=True)
+        self._warned = False
+        self._bus = None
+        self._counters = {} # address -> [transactions, errors] in total
+        self._taken = {} # address -> [transactions, errors] of the last take_statistics
+
+    def _open(self):
+        if self._bus is None:
+            self._bus = get_backend().SMBus(self.number)
+        return self._bus
+
+    def _reset(self):
+        # in a forked child: new locks, the file descriptor of the parent is not used (the slave address is set on it)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._resource.forget()
+        if self._bus is not None:
+            try:
+                self._bus.close() # only the copy of the child
+            except Exception:
+                pass
+            self._bus = None
+
+    def _acquire(self):
+        self._lock.acquire()
+        self._depth += 1
+        if self._depth > 1:
+            return
+        try:
+            if not self._resource.acquire(BUS_LOCK_TIMEOUT, quiet=True):
+                logger.warning('Using I2C bus ' + str(self.number) + ' without lock after ' + str(BUS_LOCK_TIMEOUT) + 's, held by PID ' + str(self._resource.holder()) + '.')
+        except OSError as ex:
+            if not self._warned:
+                self._warned = True
+                logger.warning('Using I2C bus ' + str(self.number) + ' without lock: ' + repr(ex))
+
+    def _release(self):
+        try:
+            if self._depth == 1:
+                self._resource.release()
+        finally:
+            self._depth -= 1
+            self._lock.release()
+
+    def _call(self, name, address, *args):
+        with self._lock:
+            counters = self._counters.setdefault(address, [0, 0])
+            counters[0] += 1
+            try:
+                return getattr(self._open(), name)(address, *args)
+            except OSError:
+                counters[1] += 1
+                raise
+
+    def __getattr__(self, name):
+        # read_byte, write_byte_data, read_i2c_block_data, ... of SMBus, address is the first argument
+        if name.startswith('_'):
+            raise AttributeError(name)
+        def method(address, *args):
+            return self._call(name, address, *args)
+        method.__name__ = name
+        return method
+
+    def open(self):
+        """ Open the bus now (e.g. to check that I2C is enabled), raises the error of SMBus. """
+        with self._lock:
+            self._open()
+        return self
+
+    def __enter__(self):
+        self._acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._release()
+
+    def close(self):
+        with self._lock:
+            if self._depth == 0:
+                self._resource.close()
+            if self._bus is not None:
+                try:
+                    self._bus.close()
+                except Exception as ex:
+                    logger.warning('Closing I2C bus ' + str(self.number) + ' failed: ' + repr(ex))
+            self._bus = None
+
+    def statistics(self):
+        """ Transactions, errors and error rate per address since the start. """
+        with self._lock:
+            return {address: {'transactions': counters[0], 'errors': counters[1], 'error_rate': counters[1] / counters[0]} for (address, counters) in self._counters.items() if counters[0]}
+
+    def take_statistics(self):
+        with self._lock:
+            statistics = {}
+            for (address, counters) in self._counters.items():
+                taken = self._taken.setdefault(address, [0, 0])
+                if counters[0] > taken[0]:
+                    statistics[address] = {'transactions': counters[0] - taken[0], 'errors': counters[1] - taken[1]}
+                taken[:] = counters
+            return statistics
+
+
+class FakeI2C:
+    """ Backend with the SMBus class of smbus, the attached devices answer on their address. """
+    def __init__(self):
+        self.devices = {} # (bus number, address) -> device
+
+    def attach(self, address, device, number=None):
+        if number is None:
+            number = default_number()
+        self.devices[(number, address)] = device
+        return device
+
+    def SMBus(self, number):
+        return FakeSMBus(self, number)
+
+class FakeSMBus:
+    def __init__(self, backend, number):
+        self.backend = backend
+        self.number = number
+
+    def __getattr__(self, name):
+        def method(address, *args):
+            device = self.backend.devices.get((self.number, address))
+            if device is None:
+                # like a real bus without a device on the address
+                raise OSError(errno.EREMOTEIO, os.strerror(errno.EREMOTEIO))
+            return getattr(device, name)(*args)
+        return method
+
+    def close(self):
+        pass
+
+class FakeI2CDevice:
+    """ Device with 8 bit registers, write_byte and read_byte use the register pointer. """
+    def __init__(self, registers=None):
+        self.registers = dict(registers or {})
+        self.pointer = 0
+
+    def write_quick(self):
+        pass
+
+    def read_byte(self):
+        return self.registers.get(self.pointer, 0)
+
+    def write_byte(self, value):
+        self.pointer = value
+
+    def read_byte_data(self, register):
+        return self.registers.get(register, 0)
+
+    def write_byte_data(self, register, value):
+        self.registers[register] = value & 0xff
+
+    def read_word_data(self, register):
+        # SMBus words are little endian
+        return self.read_byte_data(register) | (self.read_byte_data(register + 1) << 8)
+
+    def write_word_data(self, register, value):
+        self.write_byte_data(register, value)
+        self.write_byte_data(register + 1, value >> 8)
+
+    def read_i2c_block_data(self, register, length=32):
+        return [self.read_byte_data(register + i) for i in range(length)]
+
+    def write_i2c_block_data(self, register, data):
+        for (i, value) in enumerate(data):
+            self.write_byte_data(register + i, value)
+
+def main():
+    bus = get_bus(int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    found = []
+    for address in range(0x03, 0x78):
+        try:
+            bus.read_byte(address)
+            found.append(address)
+        except OSError:
+            pass
+    print('I2C bus ' + str(bus.number) + ': ' + (', '.join(format(address, '#04x') for address in found) if found else 'no devices'))
+
+if __name__ == '__main__':
+    try:
+        main()
+    except (KeyboardInterrupt, SystemExit):
+        pass
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# This file is part of HoneyPi [honey-pi.de] which is released under Creative Commons License Attribution-NonCommercial-ShareAlike 3.0 Unported (CC BY-NC-SA 3.0).
+# See file LICENSE or go to http://creativecommons.org/licenses/by-nc-sa/3.0/ for full license details.
+
+# Robust statistics for blocks of raw HX711 samples.
+# Every filter takes the whole sample buffer (False marks an invalid read) and returns the
+# samples to average. With numpy the buffer is processed at once, without numpy the same
+# results are calculated with plain Python (sudo apt-get install python3-numpy).
+
+import math
+import statistics
+import logging
+
+logger = logging.getLogger('HoneyPi.robust_stats')
+
+try:
+    import numpy as np
+except ImportError as ex:
+    np = None
+    logger.debug("numpy not installed, using plain Python statistics: " + str(ex))
+
+MAD_SCALE = 1.4826 # MAD to standard deviation for normal distributed samples
+
+def valid_samples(data_list):
+    """ Samples without invalid reads (False, None and 0 like the original outliers_filter). """
+    if np is not None:
+        if isinstance(data_list, np.ndarray):
+            return data_list[data_list != 0]
+        return np.fromiter((num for num in data_list if num), dtype=np.float64)
+    return [num for num in data_list if num]
+
+def median_filter(data_list, m=2.0):
+    """
+    Removes samples whose distance to the median is m times the median
+    absolute deviation (MAD) or more. Same result as HX711.outliers_filter.
+    """
+    data = valid_samples(data_list)
+    if len(data) == 0:
+        return data
+    if np is not None:
+        abs_distance = np.abs(data - np.median(data))
+        mdev = np.median(abs_distance)
+        if not mdev:
+            # all data samples have the same value
+            return data
+        return data[abs_distance < m * mdev]
+    data_median = statistics.median(data)
+    abs_distance = [abs(num - data_median) for num in data]
+    mdev = statistics.median(abs_distance)
+    if not mdev:
+        return data
+    return [num for (num, distance) in zip(data, abs_distance) if distance < m * mdev]
+
+def trimmed_mean_filter(data_list, proportion=0.1):
+    """ Removes the lowest and highest proportion of the samples, the mean of the rest is the trimmed mean. """
+    data = valid_samples(data_list)
+    cut = int(len(data) * proportion)
+    if cut == 0:
+        return data
+    if np is not None:
+        return np.sort(data)[cut:len(data) - cut]
+    return sorted(data)[cut:len(data) - cut]
+
+def hampel_filter(data_list, half_window=3, n_sigmas=3.0):
+    """
+    Replaces samples which differ more than n_sigmas (estimated with the MAD) from
+    the median of their neighbours by this median. Keeps the number of samples,
+    removes spikes but follows a slowly changing weight.
+    """
+    data = valid_samples(data_list)
+    size = len(data)
+    if size == 0:
+        return data
+    if np is not None:
+        window = 2 * half_window + 1
+        padded = np.pad(data, half_window, mode='edge')
+        # view of all windows without copying the samples
+        windows = np.lib.stride_tricks.as_strided(padded, shape=(size, window), strides=(padded.strides[0], padded.strides[0]))
+        medians = np.median(windows, axis=1)
+        sigmas = MAD_SCALE * np.median(np.abs(windows - medians[:, None]), axis=1)
+        outliers = np.abs(data - medians) > n_sigmas * sigmas
+        return np.where(outliers, medians, data)
+    result = list(data)
+    for i in range(size):
+        window = [data[min(max(j, 0), size - 1)] for j in range(i - half_window, i + half_window + 1)]
+        window_median = statistics.median(window)
+        sigma = MAD_SCALE * statistics.median([abs(num - window_median) for num in window])
+        if abs(data[i] - window_median) > n_sigmas * sigma:
+            result[i] = window_median
+    return result
+
+def mean(data):
+    if len(data) == 0:
+        # same message as statistics.mean, checked by read_hx711
+        raise statistics.StatisticsError('mean requires at least one data point')
+    if np is not None and isinstance(data, np.ndarray):
+        return float(np.mean(data))
+    return math.fsum(data) / len(data)
+
+def stdev(data):
+    """ Sample standard deviation, 0 for less than two samples. """
+    if len(data) < 2:
+        return 0.0
+    if np is not None and isinstance(data, np.ndarray):
+        return float(np.std(data, ddof=1))
+    average = math.fsum(data) / len(data)
+    return math.sqrt(math.fsum((num - average) ** 2 for num in data) / (len(data) - 1))
+
+def mad_sigma(data_list):
+    """ Standard deviation estimated with the MAD of the valid samples, not shrunk by removing outliers. """
+    data = valid_samples(data_list)
+    if len(data) < 2:
+        return 0.0
+    if np is not None:
+        return float(MAD_SCALE * np.median(np.abs(data - np.median(data))))
+    data_median = statistics.median(data)
+    return MAD_SCALE * statistics.median([abs(num - data_median) for num in data])
+
+FILTERS = {'median': median_filter, 'trimmed': trimmed_mean_filter, 'hampel': hampel_filter}
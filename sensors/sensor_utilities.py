@@ -1,5 +1,4 @@
 #!/usr/bin/env python3
-import smbus
 import time
 import re
 import math
@@ -41,7 +40,8 @@ def get_smbus():
 
 def isSMBusConnected():
     try:
-        bus = smbus.SMBus(get_smbus())
+        from sensors.i2c_bus import get_bus
+        get_bus().open()
         return 1
     except Exception as ex:
         logger.exception("Unhandled Exception in isSMBusConnected")
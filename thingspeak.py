@@ -5,6 +5,7 @@ import logging
 import struct
 import math
 import json
+import metrics
 
 logger = logging.getLogger('HoneyPi.thingspeak')
 
@@ -26,7 +27,8 @@ def transfer_all_channels_to_ts(ts_channels, ts_fields, server_url, debug, ts_da
                 logger.info('Channel ' + str(channelIndex) + ' with ID ' + str(channel_id) + ' transfer with source IP ' + defaultgatewayinterfaceip + ' using default gateway on ' + str(defaultgatewayinterface))
                 ts_fields_cleaned = clean_fields(ts_fields, channelIndex, False)
                 if ts_fields_cleaned:
-                    connectionError = upload_single_channel(write_key, ts_fields_cleaned, server_url, debug, ts_datetime)
+                    with metrics.timer('upload.' + str(channel_id)):
+                        connectionError = upload_single_channel(write_key, ts_fields_cleaned, server_url, debug, ts_datetime)
                     connectionErrorWithinAnyChannel.append(connectionError)
                 else:
                     logger.warning('No ThingSpeak data transfer because no fields defined for Channel ' + str(channelIndex) + ' with ID ' + str(channel_id))
@@ -68,6 +70,7 @@ def upload_single_channel(write_key, ts_fields_cleaned, server_url, debug, ts_da
         finally:
             if isConnectionError:
                 retries+=1
+                metrics.count('upload.retries')
                 # Break after 3 retries
                 if retries > MAX_RETRIES:
                     break
@@ -8,6 +8,7 @@ import pwd
 import grp
 import sys
 import time
+import threading
 from datetime import datetime
 import urllib.request
 import json
@@ -20,6 +21,7 @@ import subprocess
 import re
 
 from constant import scriptsFolder, settingsFile, local_tz
+from resource_lock import hx711_locks, acquire_all
 
 logger = logging.getLogger('HoneyPi.utilities')
 
@@ -615,53 +617,29 @@ def shutdown(settings):
         logger.info('HoneyPi is shutting down...')
     os.system("sudo shutdown -h now")
 
-def decrease_nice():
-    pid = os.getpid()
-    os.system("sudo renice -n -19 -p " + str(pid) + " >/dev/null")
+_single = threading.local() # HX711 locks of start_single per thread
 
-def normal_nice():
-    pid = os.getpid()
-    os.system("sudo renice -n 0 -p " + str(pid) + " >/dev/null")
-
-def start_single(file_path=".isActive"):
-    file = scriptsFolder + '/' + file_path
+def start_single(weight_sensors=None):
+    # lock the clock lines of weight_sensors (all HX711 if None) to block HX711 readings of
+    # other processes and threads, waits until the current holder has finished
     try:
-        time_to_wait = 2*60 # 2 Minutes
-        # wait as long as the file exists to block further measurements
-        # because there is another HX711 process already running
-        # but skip if the file is too old (time_to_wait)
-        while os.path.exists(file):
-            # skip waiting if file is older than 2 minutes
-            # this is because the last routine could be canceled irregular
-            # and the file could be still existing
-            filetime = os.stat(file).st_mtime
-            if filetime < time.time()-time_to_wait:
-                logger.warning("Skiped waiting because the measurement process we are waiting for was likely not properly finished.")
-                os.remove(file) # remove the old file
-                break
-            time.sleep(1)
-            logger.info("Measurement waits for a process to finish. Another measurement job is running at the moment.")
-        # create file to stop other HX711 readings
-        if not os.path.exists(file):
-            f = open(file, "x")
+        locks = getattr(_single, 'locks', [])
+        locks.extend(acquire_all(hx711_locks(weight_sensors)))
+        _single.locks = locks
     except Exception as ex:
         logger.exception("Exception in start_single")
         pass
-    finally:
-        decrease_nice()
 
-def stop_single(file_path=".isActive"):
-    file = scriptsFolder + '/' + file_path
+def stop_single():
     try:
-        # remove file because reading HX711 finished
-        if os.path.exists(file):
-            os.remove(file)
-        else:
-            logger.warning('stop_single: File does not exists.')
+        # release the locks because reading HX711 finished
+        locks = getattr(_single, 'locks', [])
+        if not locks:
+            logger.warning('stop_single: No HX711 lock held.')
+        while locks:
+            locks.pop().release()
     except Exception as ex:
         logger.exception("Exception in stop_single")
-    finally:
-        normal_nice()
 
 def miliseconds():
     return int(round(time.time() * 1000))
@@ -753,7 +731,7 @@ def clean_fields(ts_fields, countChannels, debug):
     ts_fields_cleaned = {}
     fieldNew = {};
     for field in ts_fields:
-        if field in ('latitude', 'longitude', 'elevation', 'created_at'):
+        if field in ('latitude', 'longitude', 'elevation', 'created_at', 'status'):
             ts_fields_cleaned[field]=ts_fields[field]
             continue
         fieldNumber = int(field.replace('field',''))
@@ -33,7 +33,18 @@ local_tz = dt.datetime.utcnow().astimezone().tzinfo
 #local_tz = pytz.timezone('Europe/Stockholm')
 utc_tz = pytz.timezone('UTC')
 
-from smbus2 import SMBus
+try:
+    # shared and locked I2C bus of HoneyPi (sensors/i2c_bus.py), it is already open and
+    # "with open_bus() as bus" only locks it, so no delay is needed
+    from sensors.i2c_bus import get_bus
+    def open_bus(delay=1):
+        return get_bus()
+except ImportError:
+    from smbus2 import SMBus
+    def open_bus(delay=1):
+        bus = SMBus(1) # does not work on Raspberry 1 as SMBus(0) is needed on Raspberry 1
+        time.sleep(delay) # short delay after SMBus(1) might help connection tinemout issues
+        return bus
 import RPi.GPIO as GPIO
 
 #WittyPi 3
@@ -93,8 +104,7 @@ SYSUP_PIN=17  # output SYS_UP signal on GPIO-17 (BCM naming)
 
 # Check if a WittyP Pi 4 is connected via I2C
 try:
-    with SMBus(1) as bus: # does not work on Raspberry 1 as SMBus(0) is needed on Raspberry 1
-        time.sleep(1) # short delay
+    with open_bus() as bus:
         bus.read_byte(0x08) # Check I2C address from Witty Pi 4
 
     # No exception?
@@ -208,8 +218,7 @@ def dec2bcd(dec):
 def is_rtc_connected():
     try:
         out=[]
-        with SMBus(1) as bus:
-            time.sleep(2) # short delay
+        with open_bus(2) as bus:
             b = bus.read_byte(RTC_ADDRESS)
             out.append(b)
         logger.debug("RTC is connected")
@@ -223,8 +232,7 @@ def is_rtc_connected():
             os.system('sudo rmmod rtc-ds1307')
             try:
                 out=[]
-                with SMBus(1) as bus:
-                    time.sleep(1) # short delay
+                with open_bus() as bus:
                     b = bus.read_byte(RTC_ADDRESS)
                     out.append(b)
                 logger.debug("RTC is connected")
@@ -243,8 +251,7 @@ def is_rtc_connected():
 def is_mc_connected():
     try:
         out=[]
-        with SMBus(1) as bus:
-            time.sleep(1) # short delay
+        with open_bus() as bus:
             b = bus.read_byte(I2C_MC_ADDRESS)
             out.append(b)
         logger.debug("MC is connected")
@@ -282,8 +289,7 @@ def get_firmwareversion():
     try:
         out=[]
         if mc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 b = bus.read_byte_data(I2C_MC_ADDRESS, I2C_ID)
                 out.append(b)
             firmwareversion =  dec2hex(out)[0]
@@ -298,8 +304,7 @@ def get_rtc_timestamp():
     UTCtime,localtime,timestamp = None, None, None
     try:
         if rtc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 data = [I2C_RTC_SECONDS, I2C_RTC_MINUTES, I2C_RTC_HOURS, I2C_RTC_WEEKDAYS, I2C_RTC_DAYS, I2C_RTC_MONTHS, I2C_RTC_YEARS]
                 for ele in data:
                     b = bus.read_byte_data(RTC_ADDRESS, ele)
@@ -320,8 +325,7 @@ def get_input_voltage():
     res = 0
     try:
         if mc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 i = bus.read_byte_data(I2C_MC_ADDRESS, I2C_VOLTAGE_IN_I)
                 d = bus.read_byte_data(I2C_MC_ADDRESS, I2C_VOLTAGE_IN_D)
             res = i + float(d)/100.
@@ -334,8 +338,7 @@ def get_startup_time(): # [?? 07:00:00], ignore: [?? ??:??:00] and [?? ??:??:??]
     try:
         if rtc_connected:
             out = []
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 for ele in [I2C_CONF_SECOND_ALARM1 ,I2C_CONF_MINUTE_ALARM1 ,I2C_CONF_HOUR_ALARM1 ,I2C_CONF_DAY_ALARM1 ]:
                     b = bus.read_byte_data(RTC_ADDRESS, ele)
                     out.append(b)
@@ -463,8 +466,7 @@ def get_shutdown_time(): # [?? 07:00:00], ignore: [?? ??:??:00] and [?? ??:??:??
     try:
         if rtc_connected:
             out = []
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 for ele in [I2C_CONF_MINUTE_ALARM2,I2C_CONF_HOUR_ALARM2,I2C_CONF_DAY_ALARM2]: #[0x0B, 0x0C, 0x0D]
                     b = bus.read_byte_data(RTC_ADDRESS, ele)
                     out.append(b)
@@ -540,8 +542,7 @@ def system_to_rtc():
                 date=sys_ts.strftime("%d")
                 month=sys_ts.strftime("%m")
                 year=sys_ts.strftime("%y")
-                with SMBus(1) as bus:
-                    time.sleep(1) # short delay after SMBus(1) might help connection tinemout issues
+                with open_bus() as bus:
                     bus.write_byte_data(RTC_ADDRESS, I2C_RTC_SECONDS, dec2bcd(second))
                     bus.write_byte_data(RTC_ADDRESS, I2C_RTC_MINUTES, dec2bcd(minute))
                     bus.write_byte_data(RTC_ADDRESS, I2C_RTC_HOURS, dec2bcd(hour))
@@ -576,8 +577,7 @@ def set_shutdown_time(stringtime='?? 20:00'):
         if rtc_connected:
             minute,hour,day = stringtime2timetuple(stringtime)
             if (day is not None ) and (hour is not None) and (minute is not None):
-                with SMBus(1) as bus:
-                    time.sleep(1) # short delay
+                with open_bus() as bus:
                     bus.write_byte_data(RTC_ADDRESS, 14,7) # write_byte_data(i2c_addr, register, value, force=None) #WittyPi Mini and 3 only
                     #bus.write_byte_data(RTC_ADDRESS, I2C_CONF_SECOND_ALARM2 ,dec2bcd(minute)) #WittyPi 4 only
                     bus.write_byte_data(RTC_ADDRESS, I2C_CONF_MINUTE_ALARM2 ,dec2bcd(minute))
@@ -595,8 +595,7 @@ def set_startup_time(stringtime='?? 20:00:00'):
         if rtc_connected:
             second,minute,hour,day = stringtime2timetuple(stringtime)
             if (day is not None ) and (hour is not None) and (minute is not None) and (second is not None):
-                with SMBus(1) as bus:
-                    time.sleep(1) # short delay
+                with open_bus() as bus:
                     bus.write_byte_data(RTC_ADDRESS, 14,7) # write_byte_data(i2c_addr, register, value, force=None)#WittyPi Mini and 3 only
                     bus.write_byte_data(RTC_ADDRESS, I2C_CONF_SECOND_ALARM1 ,dec2bcd(second))
                     bus.write_byte_data(RTC_ADDRESS, I2C_CONF_MINUTE_ALARM1 ,dec2bcd(minute))
@@ -612,8 +611,7 @@ def set_startup_time(stringtime='?? 20:00:00'):
 def clear_startup_time():
     try:
         if rtc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 bus.write_byte_data(RTC_ADDRESS, I2C_CONF_SECOND_ALARM1 ,0) # write_byte_data(i2c_addr, register, value, force=None)
                 bus.write_byte_data(RTC_ADDRESS, I2C_CONF_MINUTE_ALARM1 ,0) # write_byte_data(i2c_addr, register, value, force=None)
                 bus.write_byte_data(RTC_ADDRESS, I2C_CONF_HOUR_ALARM1 ,0) # write_byte_data(i2c_addr, register, value, force=None)
@@ -626,8 +624,7 @@ def clear_startup_time():
 def clear_shutdown_time():
     try:
         if rtc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 #bus.write_byte_data(RTC_ADDRESS, I2C_CONF_SECOND_ALARM2,0) # write_byte_data(i2c_addr, register, value, force=None) #WittyPi 4 only
                 bus.write_byte_data(RTC_ADDRESS, I2C_CONF_MINUTE_ALARM2,0) # write_byte_data(i2c_addr, register, value, force=None)
                 bus.write_byte_data(RTC_ADDRESS, I2C_CONF_HOUR_ALARM2,0) # write_byte_data(i2c_addr, register, value, force=None)
@@ -640,8 +637,7 @@ def clear_shutdown_time():
 def get_power_mode():
     try:
         if mc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 b = bus.read_byte_data(I2C_MC_ADDRESS, I2C_POWER_MODE)
             return b # int 0 or 1
     except Exception as ex:
@@ -650,8 +646,7 @@ def get_power_mode():
 def get_output_voltage():
     try:
         if mc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 i = bus.read_byte_data(I2C_MC_ADDRESS, I2C_VOLTAGE_OUT_I)
                 d = bus.read_byte_data(I2C_MC_ADDRESS, I2C_VOLTAGE_OUT_D)
             return float(i) + float(d)/100.
@@ -661,8 +656,7 @@ def get_output_voltage():
 def get_output_current():
     try:
         if mc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 i = bus.read_byte_data(I2C_MC_ADDRESS, I2C_CURRENT_OUT_I)
                 d = bus.read_byte_data(I2C_MC_ADDRESS, I2C_CURRENT_OUT_D)
             return float(i) + float(d)/100.
@@ -672,8 +666,7 @@ def get_output_current():
 def get_low_voltage_threshold():
     try:
         if mc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 i = bus.read_byte_data(I2C_MC_ADDRESS, I2C_CONF_LOW_VOLTAGE)
             if i == 255: thresh = 'disabled'
             else: thresh = float(i)/10.
@@ -684,8 +677,7 @@ def get_low_voltage_threshold():
 def get_recovery_voltage_threshold():
     try:
         if mc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 i = bus.read_byte_data(I2C_MC_ADDRESS, I2C_CONF_RECOVERY_VOLTAGE)
             if i == 255: thresh = 'disabled'
             else: thresh = float(i)/10.
@@ -701,8 +693,7 @@ def set_low_voltage_threshold(volt='11.5'):
                 if not (50 < volt < 254): volt = 255 # clear threshold if threshold is not between 5V and 25.4V
                 else: print(' setting threshold to ',volt)
                 try:
-                    with SMBus(1) as bus:
-                        time.sleep(1) # short delay
+                    with open_bus() as bus:
                         bus.write_byte_data(I2C_MC_ADDRESS, I2C_CONF_LOW_VOLTAGE,volt)
                     return True
                 except Exception as e:
@@ -723,8 +714,7 @@ def set_recovery_voltage_threshold(volt='12.8'):
                     volt = 255 # clear threshold if threshold is not between 5V and 25.4V
                 else:
                     print(' setting threshold to ',volt)
-                    with SMBus(1) as bus:
-                        time.sleep(1) # short delay
+                    with open_bus() as bus:
                         bus.write_byte_data(I2C_MC_ADDRESS, I2C_CONF_RECOVERY_VOLTAGE,volt)
                     return True
             else:
@@ -736,8 +726,7 @@ def set_recovery_voltage_threshold(volt='12.8'):
 def clear_low_voltage_threshold():
     try:
         if mc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 bus.write_byte_data(I2C_MC_ADDRESS, I2C_CONF_LOW_VOLTAGE, 0xFF)
             return True
     except Exception as ex:
@@ -747,8 +736,7 @@ def clear_low_voltage_threshold():
 def clear_recovery_voltage_threshold():
     try:
         if mc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 bus.write_byte_data(I2C_MC_ADDRESS, I2C_CONF_RECOVERY_VOLTAGE, 0xFF)
             return True
     except Exception as ex:
@@ -758,8 +746,7 @@ def clear_recovery_voltage_threshold():
 def get_temperature():
     try:
         if rtc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 ctrl = bus.read_byte_data(RTC_ADDRESS, 14)
                 ctrl2 = 7|0x20 #39 bitwise or
                 bus.write_byte_data(RTC_ADDRESS, 14,ctrl2)
@@ -780,14 +767,12 @@ def clear_alarm_flags(byte_F=0x0):
     try:
         if rtc_connected:
             if byte_F==0x0:
-                with SMBus(1) as bus:
-                    time.sleep(1) # short delay
+                with open_bus() as bus:
                     byte_F=bus.read_byte_data(RTC_ADDRESS, I2C_RTC_CTRL2)
             #print(format(byte_F, '0>8b')) #((byte_F)))
             byte_F=(byte_F&0xFC)
             #print(format(byte_F, '0>8b')) #((byte_F)))
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 bus.write_byte_data(RTC_ADDRESS, I2C_RTC_CTRL2, byte_F)
     except Exception as ex:
         logger.exception("Exception in clear_alarm_flags")
@@ -795,8 +780,7 @@ def clear_alarm_flags(byte_F=0x0):
 def get_alarm_flags(RTC_ALARM_ADDRESS=I2C_RTC_CTRL2):
     try:
         if rtc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 byte_F=bus.read_byte_data(RTC_ADDRESS, RTC_ALARM_ADDRESS)
             #print(format(byte_F, '0>8b')) #((byte_F)))
             return byte_F
@@ -828,8 +812,7 @@ def do_shutdown():
             # clear alarm flags
             clear_alarm_flags()
             # only enable alarm 1 (startup)
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 bus.write_byte_data(RTC_ADDRESS, 0x0E,0x05)
             os.system("sudo shutdown -h now")
     except Exception as ex:
@@ -838,8 +821,7 @@ def do_shutdown():
 def get_power_cut_delay():
     try:
         if mc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 pcd = bus.read_byte_data(I2C_MC_ADDRESS, I2C_CONF_POWER_CUT_DELAY)
             pcd=pcd/10
             return pcd
@@ -854,8 +836,7 @@ def set_power_cut_delay(delay=8):
                 maxVal=25
             if delay >= 0 and delay <= maxVal:
                 d=delay*10
-                with SMBus(1) as bus:
-                    time.sleep(1) # short delay
+                with open_bus() as bus:
                     bus.write_byte_data(I2C_MC_ADDRESS, I2C_CONF_POWER_CUT_DELAY, d)
                 logger.debug("Power cut delay set to " + str(delay) + " seconds!")
                 return True
@@ -868,8 +849,7 @@ def set_power_cut_delay(delay=8):
 def get_dummy_load_duration():
     try:
         if mc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 dummy_load_duration = bus.read_byte_data(I2C_MC_ADDRESS, I2C_CONF_DUMMY_LOAD)
             return dummy_load_duration #[0]
     except Exception as ex:
@@ -879,8 +859,7 @@ def set_dummy_load_duration(duration=0):
     try:
         if mc_connected:
             if duration >=- 0 and duration <= 254:
-                with SMBus(1) as bus:
-                    time.sleep(1) # short delay
+                with open_bus() as bus:
                     bus.write_byte_data(I2C_MC_ADDRESS, I2C_CONF_DUMMY_LOAD, duration)
                 logger.debug("Dummy load duration set to " + str(duration) + " !")
                 return True
@@ -905,8 +884,7 @@ def set_pulsing_interval(interval):
             else:
                 logger.error('wrong input for pulsing invterval' +str(interval) + ' Please input 1,2,4 or 8 seconds')
             if pi is not None:
-                with SMBus(1) as bus:
-                    time.sleep(1) # short delay
+                with open_bus() as bus:
                     bus.write_byte_data(I2C_MC_ADDRESS, I2C_CONF_PULSE_INTERVAL, pi)
                 logger.debug("Pulsing interval set to " + str(interval) + "seconds")
                 return True
@@ -918,8 +896,7 @@ def get_pulsing_interval():
     try:
         if mc_connected:
             interval = None
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 pi = bus.read_byte_data(I2C_MC_ADDRESS, I2C_CONF_PULSE_INTERVAL)
             if pi == 0x09:
                 interval=8
@@ -937,8 +914,7 @@ def set_white_led_duration(duration):
     try:
         if mc_connected:
             if duration >=- 0 and duration <= 254:
-                    with SMBus(1) as bus:
-                        time.sleep(1) # short delay
+                    with open_bus() as bus:
                         bus.write_byte_data(I2C_MC_ADDRESS, I2C_CONF_BLINK_LED, duration)
                         logger.debug("White LED duration set to "+ str(duration) + " !")
             else:
@@ -950,8 +926,7 @@ def set_white_led_duration(duration):
 def get_white_led_duration():
     try:
         if mc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 duration = bus.read_byte_data(I2C_MC_ADDRESS, I2C_CONF_BLINK_LED)
             return duration
     except Exception as ex:
@@ -966,8 +941,7 @@ def set_default_state(state):
                     hexstate = 0x01
                 elif int(state)==0:
                     hexstate = 0x00
-                with SMBus(1) as bus:
-                    time.sleep(1) # short delay
+                with open_bus() as bus:
                     bus.write_byte_data(I2C_MC_ADDRESS, I2C_CONF_DEFAULT_ON, hexstate)
                 if hexstate == 0x01:
                     logger.debug('Default state when powered set to "ON"!')
@@ -983,8 +957,7 @@ def set_default_state(state):
 def get_default_state(): #1=ON, 0=OFF
     try:
         if mc_connected:
-            with SMBus(1) as bus:
-                time.sleep(1) # short delay
+            with open_bus() as bus:
                 hexstate = bus.read_byte_data(I2C_MC_ADDRESS, I2C_CONF_DEFAULT_ON)
             if hexstate == 0x01:
                 state=1